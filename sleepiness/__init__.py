@@ -11,5 +11,4 @@ _\ \ |  __/  __/ |_) | | | | |  __/\__ \__ \\
 \__/_|\___|\___| .__/|_|_| |_|\___||___/___/
                |_|                          
 ------------Version: {__version__}-----------------
-"""
-print(__greeting__)
\ No newline at end of file
+"""
\ No newline at end of file
@@ -0,0 +1,275 @@
+"""
+Classifies all images in a directory tree with a pool of
+worker processes.
+
+Every worker builds its pipeline once and receives the images
+in chunks. Results are appended to a CSV or JSONL file (chosen
+by its suffix) as soon as a chunk is done, so an interrupted
+run can be continued with `--resume`, which skips all images
+already classified in the output file and retries the failed
+ones. Their error records are removed from the file.
+
+Usage:
+    python -m sleepiness.classify_dir <image dir> <results.csv|.jsonl>
+"""
+from __future__ import annotations
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Iterable, TYPE_CHECKING
+
+from sleepiness import __greeting__
+
+if TYPE_CHECKING:
+    from sleepiness.pipelines import FullPipeline
+
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".bmp")
+FIELDS = ("path", "state", "decided_by", "ms", "error")
+
+# Pipeline of the worker process, set by `_init_worker`
+_pipeline: FullPipeline | None = None
+
+def _init_worker(kind: str,
+                 eye_model_confidence: float,
+                 hand_model_confidence: float,
+                 threads: int) -> None:
+    """
+    Builds the pipeline of a worker process and loads its
+    models, so that the recorded timings of the first images
+    do not include the loading.
+    """
+    import cv2
+    import torch
+    from sleepiness import pipelines
+
+    # One process per core already; avoid oversubscription
+    cv2.setNumThreads(threads)
+    torch.set_num_threads(threads)
+
+    global _pipeline
+    if kind == "noeye":
+        _pipeline = pipelines.NoEyePipeline()
+        models = ("face_detection", "face_classification")
+    else:
+        _pipeline = pipelines.FullPipeline(
+            eye_model_confidence=eye_model_confidence,
+            hand_model_confidence=hand_model_confidence
+        )
+        models = ("face_model", "eye_model", "eye_frontend", "hand_model")
+    for name in models:
+        getattr(_pipeline, name)
+
+def _classify_chunk(root: str, paths: list[str]) -> list[dict]:
+    """
+    Classifies a chunk of images, given relative to `root`.
+    Failures are recorded instead of aborting the chunk.
+    """
+    records = []
+    for path in paths:
+        try:
+            result = _pipeline.analyze(os.path.join(root, path), viz=False)
+            records.append({
+                "path": path,
+                "state": result.state.name,
+                "decided_by": result.decided_by or "",
+                "ms": round(1e3 * result.total, 2),
+                "error": "",
+            })
+        except Exception as e:
+            records.append({
+                "path": path, "state": "", "decided_by": "", "ms": "",
+                "error": f"{type(e).__name__}: {e}",
+            })
+    return records
+
+def find_images(root: Path) -> list[str]:
+    """
+    Returns the paths of all images below `root`,
+    relative to it and sorted.
+    """
+    return sorted(
+        str(path.relative_to(root)) for path in root.rglob("*")
+        if path.suffix.lower() in IMAGE_SUFFIXES and path.is_file()
+    )
+
+def read_records(output: Path) -> list[dict]:
+    """
+    Returns the records of an existing output file. Lines that
+    cannot be parsed, like the last one of an interrupted run,
+    are skipped.
+    """
+    if not output.exists():
+        return []
+    records = []
+    with open(output, newline="") as f:
+        if output.suffix == ".jsonl":
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(record, dict) and "path" in record:
+                    records.append(record)
+        else:
+            # Truncated rows miss their last fields, garbled ones have extra fields
+            records = [
+                r for r in csv.DictReader(f)
+                if None not in r and all(r.get(field) is not None for field in FIELDS)
+            ]
+    return records
+
+def completed_paths(output: Path) -> set[str]:
+    """
+    Keeps only the records of images classified without
+    error in an existing output file, so that retried images
+    do not appear twice, and returns their paths.
+    """
+    records = [r for r in read_records(output) if not r.get("error")]
+    if output.exists():
+        tmp = output.with_suffix(".tmp" + output.suffix)
+        tmp.unlink(missing_ok=True)
+        writer = _Writer(tmp)
+        writer.write(records)
+        writer.close()
+        os.replace(tmp, output)
+    return {r["path"] for r in records}
+
+class _Writer:
+    """
+    Appends records to a CSV or JSONL file and flushes after every batch.
+    """
+    def __init__(self, output: Path):
+        self.jsonl = output.suffix == ".jsonl"
+        new = not output.exists() or output.stat().st_size == 0
+        self.file = open(output, "a", newline="")
+        if not self.jsonl:
+            self.writer = csv.DictWriter(self.file, fieldnames=FIELDS)
+            if new:
+                self.writer.writeheader()
+
+    def write(self, records: Iterable[dict]) -> None:
+        for record in records:
+            if self.jsonl:
+                self.file.write(json.dumps(record) + "\n")
+            else:
+                self.writer.writerow(record)
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+def classify_dir(root: Path,
+                 output: Path,
+                 kind: str = "full",
+                 eye_model_confidence: float = 0.2,
+                 hand_model_confidence: float = 0.5,
+                 workers: int | None = None,
+                 chunksize: int = 16,
+                 threads: int = 1,
+                 resume: bool = False) -> Counter:
+    """
+    Classifies all images below `root` and appends the results to `output`.
+
+    Args:
+        root: Directory to search for images.
+        output: Result file, `.csv` or `.jsonl`.
+        kind: Pipeline to use, "full" or "noeye".
+        workers: Number of worker processes, defaults to the number of cores.
+        chunksize: Number of images sent to a worker at once.
+        threads: Number of torch and cv2 threads per worker.
+        resume: Skip images already classified in `output` and 
+            retry the failed ones, dropping their records. Without it, an existing output file is overwritten.
+
+    Returns:
+        The number of images per state, "ERROR" for failures.
+    """
+    root, output = Path(root), Path(output)
+    if output.suffix not in (".csv", ".jsonl"):
+        raise ValueError(f"The output file must be .csv or .jsonl, got '{output.name}'.")
+
+    paths = find_images(root)
+    if resume:
+        done = completed_paths(output)
+        paths = [path for path in paths if path not in done]
+        print(f"Resuming: {len(done)} images done, {len(paths)} remaining.")
+    elif output.exists():
+        output.unlink()
+
+    chunks = [paths[i:i + chunksize] for i in range(0, len(paths), chunksize)]
+    workers = workers or os.cpu_count()
+    counts = Counter()
+    writer = _Writer(output)
+
+    initargs = (kind, eye_model_confidence, hand_model_confidence, threads)
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=initargs) as pool:
+
+        # Keep a few chunks per worker in flight
+        pending, todo = set(), iter(chunks)
+        def refill() -> None:
+            while len(pending) < 2 * workers:
+                chunk = next(todo, None)
+                if chunk is None:
+                    return
+                pending.add(pool.submit(_classify_chunk, str(root), chunk))
+        refill()
+
+        start, processed = None, 0
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                records = future.result()
+                writer.write(records)
+                for r in records:
+                    counts[r["state"] or "ERROR"] += 1
+
+                # Throughput is measured from the first finished
+                # chunk on, excluding the model loading
+                if start is None:
+                    start = time.perf_counter()
+                else:
+                    processed += len(records)
+                    rate = processed / (time.perf_counter() - start)
+                    print(
+                        f"{sum(counts.values())}/{len(paths)} images, {rate:.1f} img/s",
+                        end="\r", flush=True
+                    )
+            refill()
+
+    writer.close()
+    elapsed = time.perf_counter() - start if start is not None else 0.
+    print()
+    if elapsed > 0 and processed > 0:
+        print(f"Classified {len(paths)} images, {processed / elapsed:.1f} img/s.")
+    for state, n in sorted(counts.items()):
+        print(f"{state + ':':10s}{n} of {len(paths)} images.")
+    return counts
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("root", type=Path, help="Directory with the images.")
+    parser.add_argument("output", type=Path, help="Result file, .csv or .jsonl.")
+    parser.add_argument("--pipeline", choices=["full", "noeye"], default="full")
+    parser.add_argument("--eye-confidence", type=float, default=0.2)
+    parser.add_argument("--hand-confidence", type=float, default=0.5)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunksize", type=int, default=16)
+    parser.add_argument("--threads", type=int, default=1, help="Threads per worker.")
+    parser.add_argument("--resume", action="store_true")
+    args = parser.parse_args(argv)
+
+    print(__greeting__)
+    counts = classify_dir(
+        args.root, args.output, args.pipeline,
+        args.eye_confidence, args.hand_confidence,
+        args.workers, args.chunksize, args.threads, args.resume
+    )
+    sys.exit(1 if counts["ERROR"] else 0)
+
+if __name__ == "__main__":
+    main()
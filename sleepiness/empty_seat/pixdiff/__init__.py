@@ -1 +1,11 @@
-from ._pixdiff import preprocess, is_empty
\ No newline at end of file
+from ._pixdiff import (
+    preprocess, is_empty, 
+    preprocess_cv2, preprocess_mask, pixdiff_cv2, is_empty_cv2
+)
+from ._seats import SeatMaps, pixdiff_many
+from ._background import BackgroundModel
+from ._change import ChangeDetector
+from ._artifact import (
+    AvgMapArtifact, DEFAULT_ARTIFACT,
+    save_artifact, load_artifact, default_artifact
+)
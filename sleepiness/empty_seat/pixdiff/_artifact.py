@@ -0,0 +1,131 @@
+"""
+File format for pixdiff background maps.
+
+An artifact consists of
+    - the magic bytes `PXDMAP`,
+    - the format version as little-endian uint16,
+    - the length of the header as little-endian uint32,
+    - a UTF-8 JSON header, padded with spaces so that
+      the data starts at a multiple of 64 bytes,
+    - the raw C-ordered array data.
+
+The header holds the shape and dtype of the array, the
+preprocessing parameters the map was built with and the
+emptiness threshold. The data is opened with `np.memmap`,
+so all worker processes share one page-cached copy.
+"""
+from __future__ import annotations
+import json
+import struct
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+from ._pixdiff import CROP_BOTTOM, CROP_SIDES, IMAGE_HEIGHT, IMAGE_WIDTH
+
+MAGIC = b"PXDMAP"
+VERSION = 1
+ALIGNMENT = 64
+
+# Artifact shipped with the package
+DEFAULT_ARTIFACT = Path(__file__).parent / "avgmap.pxmap"
+
+class AvgMapArtifact:
+    """
+    A loaded pixdiff background map.
+
+    Attributes:
+        map: Array of shape (..., IMAGE_HEIGHT, IMAGE_WIDTH),
+            a read-only memmap unless loaded with `mmap=False`.
+        threshold: Emptiness threshold, a float or one per map.
+        meta: The full header.
+    """
+    def __init__(self, map: np.ndarray, meta: dict):
+        self.map = map
+        self.meta = meta
+        self.threshold = meta["threshold"]
+
+def save_artifact(path: str | Path,
+                  map: np.ndarray,
+                  threshold: float | list[float],
+                  **meta) -> Path:
+    """
+    Writes a map and its metadata as an artifact.
+    Extra keyword arguments are stored in the header.
+    """
+    map = np.ascontiguousarray(map)
+    header = {
+        "shape": list(map.shape),
+        "dtype": map.dtype.str,
+        "image_width": IMAGE_WIDTH,
+        "image_height": IMAGE_HEIGHT,
+        "crop_bottom": CROP_BOTTOM,
+        "crop_sides": CROP_SIDES,
+        "threshold": threshold,
+        **meta,
+    }
+    raw = json.dumps(header).encode("utf-8")
+    prefix = len(MAGIC) + struct.calcsize("<HI")
+    raw += b" " * (-(prefix + len(raw)) % ALIGNMENT)
+
+    path = Path(path)
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<HI", VERSION, len(raw)))
+        f.write(raw)
+        f.write(map.tobytes())
+    return path
+
+def read_header(path: str | Path) -> tuple[dict, int]:
+    """
+    Reads and validates the header of an artifact.
+
+    Returns the header and the offset of the array data.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a pixdiff map artifact.")
+        version, length = struct.unpack("<HI", f.read(struct.calcsize("<HI")))
+        if version > VERSION:
+            raise ValueError(
+                f"{path} has format version {version}, "
+                f"but only versions up to {VERSION} are supported."
+            )
+        header = json.loads(f.read(length))
+        offset = f.tell()
+
+    expected = {
+        "image_width": IMAGE_WIDTH,
+        "image_height": IMAGE_HEIGHT,
+        "crop_bottom": CROP_BOTTOM,
+        "crop_sides": CROP_SIDES,
+    }
+    for key, value in expected.items():
+        if header[key] != value:
+            raise ValueError(
+                f"{path} was built with {key}={header[key]}, "
+                f"but the current preprocessing uses {key}={value}."
+            )
+    return header, offset
+
+def load_artifact(path: str | Path, mmap: bool = True) -> AvgMapArtifact:
+    """
+    Opens an artifact. With `mmap`, the map is a read-only
+    memory map; otherwise it is read into memory.
+    """
+    header, offset = read_header(path)
+    dtype, shape = np.dtype(header["dtype"]), tuple(header["shape"])
+    if mmap:
+        map = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape)
+    else:
+        map = np.fromfile(path, dtype=dtype, offset=offset).reshape(shape)
+    return AvgMapArtifact(map, header)
+
+@lru_cache(maxsize=None)
+def default_artifact() -> AvgMapArtifact:
+    """
+    Returns the artifact shipped with the package.
+    It is opened on the first call only.
+    """
+    return load_artifact(DEFAULT_ARTIFACT)
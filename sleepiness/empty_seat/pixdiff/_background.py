@@ -0,0 +1,169 @@
+"""
+Online background model for the pixdiff empty-seat detection.
+
+Instead of building the average map offline from a
+directory of images, this model keeps a per-pixel mean
+and variance that is updated from every frame that has
+been classified as empty. The first updates are exact
+Welford updates; once the update weight 1/n drops below
+`decay`, the model turns into an exponentially weighted
+one, so it follows slow lighting changes during a flight.
+
+The model may hold a stack of backgrounds, e.g. one per
+seat, by using a shape with leading dimensions.
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+
+from sleepiness.utility.pstate import PassengerState
+from ._pixdiff import IMAGE_HEIGHT, IMAGE_WIDTH
+
+class BackgroundModel:
+    """
+    Per-pixel running mean and variance of empty-seat thumbnails.
+
+    Args:
+        shape: Shape of the model. The last two dimensions are
+            the thumbnail dimensions, leading dimensions index
+            independent backgrounds (e.g. seats).
+        decay: Minimal update weight; the effective memory of
+            the model is roughly 1/decay frames.
+        min_var: Variance floor used for the z-scores.
+    """
+    def __init__(self,
+                 shape: tuple[int, ...] = (IMAGE_HEIGHT, IMAGE_WIDTH),
+                 decay: float = 0.01,
+                 min_var: float = 1e-4):
+
+        self.mean = np.zeros(shape, dtype=np.float32)
+        self.var = np.zeros(shape, dtype=np.float32)
+        self.count = np.zeros(shape[:-2], dtype=np.int64)
+        self.decay = decay
+        self.min_var = min_var
+
+        # Scratch buffer reused by `update` and `score`
+        self._buf = np.empty(shape, dtype=np.float32)
+
+    @classmethod
+    def from_map(cls,
+                 map: np.ndarray,
+                 var: float | np.ndarray = 0.,
+                 count: int = 1,
+                 **kwargs) -> BackgroundModel:
+        """
+        Creates a model from an existing average map,
+        e.g. the offline AVGMAP, and a prior variance.
+        """
+        model = cls(np.shape(map), **kwargs)
+        model.mean[...] = map
+        model.var[...] = var
+        model.count[...] = count
+        return model
+
+    def _weights(self, where: np.ndarray | None) -> np.ndarray:
+        """
+        Increments the counts and returns the update weights,
+        broadcastable against the thumbnails.
+        """
+        if where is None:
+            self.count += 1
+            w = np.maximum(1 / self.count, self.decay)
+        else:
+            where = np.asarray(where, dtype=bool)
+            self.count += where
+            w = np.where(where, np.maximum(1 / np.maximum(self.count, 1), self.decay), 0.)
+        return np.asarray(w, dtype=np.float32)[..., None, None]
+
+    def update(self,
+               thumbnail: np.ndarray,
+               where: np.ndarray | None = None) -> None:
+        """
+        Adds an empty-seat thumbnail to the model.
+
+        Args:
+            thumbnail: Preprocessed image(s) of the model's shape.
+            where: Boolean mask over the leading dimensions,
+                only the selected backgrounds are updated.
+        """
+        w = self._weights(where)
+        delta = np.subtract(thumbnail, self.mean, out=self._buf)
+
+        # mean <- mean + w * delta
+        # var  <- (1 - w) * (var + w * delta^2)
+        self.mean += w * delta
+        np.square(delta, out=delta)
+        delta *= w
+        self.var += delta
+        self.var *= 1 - w
+
+    def observe(self,
+                thumbnail: np.ndarray,
+                state: PassengerState | Sequence[PassengerState]) -> None:
+        """
+        Updates the model from thumbnail(s) that have been
+        classified, using only those classified as NOTTHERE.
+        """
+        if isinstance(state, PassengerState):
+            if state is PassengerState.NOTTHERE:
+                self.update(thumbnail)
+            return
+        where = np.array([s is PassengerState.NOTTHERE for s in state])
+        if where.any():
+            self.update(thumbnail, where=where.reshape(self.count.shape))
+
+    def score(self, thumbnail: np.ndarray) -> np.ndarray | float:
+        """
+        Mean absolute z-score of the thumbnail(s) with respect
+        to the background. Low scores indicate an empty seat.
+        """
+        z = np.subtract(thumbnail, self.mean, out=self._buf)
+        np.abs(z, out=z)
+        z /= np.sqrt(np.maximum(self.var, self.min_var))
+        return z.mean(axis=(-2, -1))
+
+    def is_empty(self,
+                 thumbnail: np.ndarray,
+                 threshold: float | np.ndarray) -> bool | np.ndarray:
+        """
+        Detect if the seat(s) are empty.
+        """
+        return self.score(thumbnail) <= threshold
+
+    def save(self, path: str | Path) -> None:
+        """
+        Saves a checkpoint of the model as a single `.npy`
+        file holding one structured record.
+        """
+        shape = self.mean.shape
+        record = np.zeros((), dtype=[
+            ("mean", np.float32, shape),
+            ("var", np.float32, shape),
+            ("count", np.int64, self.count.shape),
+            ("decay", np.float64),
+            ("min_var", np.float64),
+        ])
+        record["mean"] = self.mean
+        record["var"] = self.var
+        record["count"] = self.count
+        record["decay"] = self.decay
+        record["min_var"] = self.min_var
+        np.save(path, record)
+
+    @classmethod
+    def load(cls, path: str | Path) -> BackgroundModel:
+        """
+        Restores a model saved with `save`.
+        """
+        record = np.load(path, allow_pickle=False)
+        model = cls(
+            record["mean"].shape,
+            decay=float(record["decay"]),
+            min_var=float(record["min_var"]),
+        )
+        model.mean[...] = record["mean"]
+        model.var[...] = record["var"]
+        model.count[...] = record["count"]
+        return model
@@ -0,0 +1,89 @@
+"""
+Per-seat change detection for continuous monitoring.
+
+A seat that looks the same as when it was last classified
+does not need to run through the whole pipeline again.
+The detector keeps, for every seat, the pixdiff thumbnail
+of the last classified frame together with its state, and
+compares new thumbnails against it with the same mean
+absolute pixel difference used for the empty-seat check.
+Since the thumbnails are min-max normalized, global
+brightness changes do not count as a change.
+"""
+from __future__ import annotations
+from typing import Hashable
+
+import numpy as np
+
+from sleepiness.utility.pstate import PassengerState
+from ._pixdiff import pixdiff_cv2
+
+class _SeatEntry:
+    __slots__ = ("thumbnail", "state", "age")
+
+    def __init__(self, thumbnail: np.ndarray, state: PassengerState):
+        self.thumbnail = thumbnail
+        self.state = state
+        self.age = 0
+
+class ChangeDetector:
+    """
+    Remembers the last classified thumbnail and state per seat.
+
+    Args:
+        threshold: Pixel difference to the last classified
+            thumbnail above which a seat counts as changed.
+        max_age: Number of frames after which a seat is
+            re-classified even if it has not changed.
+    """
+    def __init__(self, threshold: float = 0.02, max_age: int = 30):
+        if max_age < 1:
+            raise ValueError("'max_age' must be at least 1.")
+        self.threshold = threshold
+        self.max_age = max_age
+        self._seats: dict[Hashable, _SeatEntry] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._seats)
+
+    def __contains__(self, seat_id: Hashable) -> bool:
+        return seat_id in self._seats
+
+    def lookup(self,
+               seat_id: Hashable,
+               thumbnail: np.ndarray) -> PassengerState | None:
+        """
+        Returns the cached state of the seat if the thumbnail
+        has not changed and the state is not too old,
+        otherwise None, in which case the frame has to be
+        classified and passed to `store`.
+        """
+        entry = self._seats.get(seat_id)
+        if (entry is None
+            or entry.age + 1 >= self.max_age
+            or pixdiff_cv2(thumbnail, entry.thumbnail) > self.threshold):
+            self.misses += 1
+            return None
+        entry.age += 1
+        self.hits += 1
+        return entry.state
+
+    def store(self,
+              seat_id: Hashable,
+              thumbnail: np.ndarray,
+              state: PassengerState) -> None:
+        """
+        Stores the thumbnail and state of a classified frame.
+        """
+        self._seats[seat_id] = _SeatEntry(thumbnail, state)
+
+    def forget(self, seat_id: Hashable | None = None) -> None:
+        """
+        Drops the cached state of a seat, or of all seats.
+        """
+        if seat_id is None:
+            self._seats.clear()
+        else:
+            self._seats.pop(seat_id, None)
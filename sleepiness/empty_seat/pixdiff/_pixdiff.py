@@ -9,18 +9,26 @@ the average pixel values of the test set. If
 the difference is greater than a certain
 threshold, the seat is considered empty.
 """
+from __future__ import annotations
 from pathlib import Path
-from typing import Generator
+from typing import Generator, TYPE_CHECKING
+import cv2
 import numpy as np
-from PIL import Image
-import matplotlib.pyplot as plt
 from itertools import pairwise
 
+if TYPE_CHECKING:
+    from PIL import Image
+
 from sleepiness.utility.misc import Loader
 
 IMAGE_WIDTH = 100 // 2
 IMAGE_HEIGHT = 116 // 2
 
+# Fraction of the image height cropped from the bottom
+# and fraction of the image width cropped from each side
+CROP_BOTTOM = 0.3
+CROP_SIDES = 0.2
+
 AVGMAP = np.zeros((IMAGE_HEIGHT, IMAGE_WIDTH))
 
 def crop_bottom(image: Image.Image, percent: float) -> Image.Image:
@@ -54,6 +62,7 @@ def dataloader(path:Path) -> Generator[np.ndarray, None, None]:
     """
     Load images from a directory.
     """
+    from PIL import Image
     for image_path in path.glob('*.jpg'):
         image = Image.open(image_path)
         yield preprocess(image)
@@ -62,9 +71,46 @@ def preprocess(image: Image.Image) -> np.ndarray:
     """
     Preprocess an image.
     """
-    image = crop_bottom(image, 0.3)
-    image = crop_sides(image, 0.2)
+    image = crop_bottom(image, CROP_BOTTOM)
+    image = crop_sides(image, CROP_SIDES)
     return rescale_greyscale_normalize(image)
+
+def preprocess_cv2(image: np.ndarray) -> np.ndarray:
+    """
+    Preprocess a BGR image using OpenCV only.
+    
+    Same steps as `preprocess`, but the crops are
+    slicing views, the image is greyscaled before it
+    is resized with area interpolation, and the result
+    is float32. Scores agree with the PIL version up
+    to interpolation differences.
+    """
+    height, width = image.shape[:2]
+    sides = int(width * CROP_SIDES)
+    image = image[:height - int(height * CROP_BOTTOM), sides:width - sides]
+    image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    image = cv2.resize(
+        image, (IMAGE_WIDTH, IMAGE_HEIGHT), interpolation=cv2.INTER_AREA
+    )
+    # Max-min normalization
+    lo, hi, _, _ = cv2.minMaxLoc(image)
+    scale = 1 / (hi - lo) if hi > lo else 0.
+    return (image.astype(np.float32) - lo) * np.float32(scale)
+
+def preprocess_mask(mask: np.ndarray) -> np.ndarray:
+    """
+    Crop and resize a boolean (H, W) mask of an image
+    like `preprocess_cv2` does with the image.
+
+    Returns the float32 fraction of masked pixels
+    in every pixel of the thumbnail.
+    """
+    height, width = mask.shape[:2]
+    sides = int(width * CROP_SIDES)
+    mask = mask[:height - int(height * CROP_BOTTOM), sides:width - sides]
+    return cv2.resize(
+        mask.astype(np.float32), (IMAGE_WIDTH, IMAGE_HEIGHT), interpolation=cv2.INTER_AREA
+    )
         
 def running_average(image: np.ndarray, n: int) -> np.ndarray:
     """
@@ -110,6 +156,14 @@ def paiwise_pixdiff_distribution(path: Path) -> np.ndarray:
             diff_distribution.append(np.abs(image1 - image2).mean())
     return np.array(diff_distribution)
 
+def pixdiff_cv2(image: np.ndarray, map: np.ndarray) -> float:
+    """
+    Calculate the pixel difference between a float32
+    image from `preprocess_cv2` and a map.
+    """
+    map = np.asarray(map, dtype=np.float32)
+    return cv2.norm(image, map, cv2.NORM_L1) / image.size
+
 def populate_avg_map(train_path: Path) -> bool:
     """
     Detect if a seat is empty.
@@ -132,6 +186,15 @@ def is_empty(image: np.ndarray,
         return False
     return True
 
+def is_empty_cv2(image: np.ndarray,
+                 threshold: float,
+                 map: np.ndarray) -> bool:
+    """
+    Detect if a seat is empty from a float32
+    image from `preprocess_cv2`.
+    """
+    return pixdiff_cv2(image, map) <= threshold
+
 def save_avg_map() -> None:
     """
     Save the average map.
@@ -145,6 +208,7 @@ def plot_distribution(distr: np.ndarray,
     """
     Plot the pixel difference distribution.
     """
+    import matplotlib.pyplot as plt
     plt.hist(distr, bins=100)
     plt.title(f"Pixel difference distribution {title}")
     plt.xlabel("Pixel difference")
@@ -153,12 +217,19 @@ def plot_distribution(distr: np.ndarray,
     plt.close()
 
 if __name__ == "__main__":
+    import matplotlib.pyplot as plt
+
     # Define the paths
     train_path = Path("pictures/empty_seat_dataset/train/not there")
     #test_path = Path("pictures/empty_seat_dataset/test/awake")
     
-    populate_avg_map(train_path)
-    save_avg_map()
+    from sleepiness.empty_seat.pixdiff.build import build_avg_map
+    from sleepiness.empty_seat.pixdiff import DEFAULT_ARTIFACT, save_artifact
+    AVGMAP, count = build_avg_map(train_path, backend="pil")
+    save_artifact(
+        DEFAULT_ARTIFACT, AVGMAP, threshold=0.08,
+        count=count, backend="pil", source=str(train_path)
+    )
     plt.imshow(AVGMAP, cmap='gray')
     plt.savefig("average_empty.png", dpi=300)
     plt.close()
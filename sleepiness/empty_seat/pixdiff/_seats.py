@@ -0,0 +1,165 @@
+"""
+Seat-indexed store of average pixel maps.
+
+Every seat of a cabin camera has its own background,
+so instead of one global AVGMAP we keep one map per
+seat, all stacked into a single (n_seats, H, W) float32
+array. This allows to compare the thumbnails of many
+seats against their own maps in a single reduction.
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Hashable, Iterable, Sequence
+
+import numpy as np
+
+from ._artifact import load_artifact, save_artifact
+from ._pixdiff import IMAGE_HEIGHT, IMAGE_WIDTH
+
+def pixdiff_many(thumbnails: np.ndarray, maps: np.ndarray) -> np.ndarray:
+    """
+    Calculate the pixel difference between a stack of
+    thumbnails and a stack of maps of the same shape.
+
+    Returns an array of shape (n,) with the mean absolute
+    difference of every thumbnail to its map.
+    """
+    diff = np.subtract(thumbnails, maps, dtype=np.float32)
+    np.abs(diff, out=diff)
+    return diff.mean(axis=(1, 2))
+
+class SeatMaps:
+    """
+    Average pixel maps and emptiness thresholds per seat.
+
+    Args:
+        seat_ids: Identifiers of the seats, one per map.
+        maps: Array of shape (n_seats, IMAGE_HEIGHT, IMAGE_WIDTH).
+        thresholds: Pixel difference threshold, either one for
+            all seats or one per seat.
+    """
+    def __init__(self,
+                 seat_ids: Sequence[Hashable],
+                 maps: np.ndarray,
+                 thresholds: float | Sequence[float] = 0.08):
+
+        self.maps = np.ascontiguousarray(maps, dtype=np.float32)
+        if self.maps.shape != (len(seat_ids), IMAGE_HEIGHT, IMAGE_WIDTH):
+            raise ValueError(
+                f"Expected maps of shape {(len(seat_ids), IMAGE_HEIGHT, IMAGE_WIDTH)}, "
+                f"got {self.maps.shape}."
+            )
+        self.thresholds = np.array(
+            np.broadcast_to(thresholds, (len(seat_ids),)), dtype=np.float32
+        )
+        self._index = {seat_id: i for i, seat_id in enumerate(seat_ids)}
+        if len(self._index) != len(seat_ids):
+            raise ValueError("Seat IDs must be unique.")
+
+    @classmethod
+    def from_dict(cls,
+                  maps: dict[Hashable, np.ndarray],
+                  thresholds: float | dict[Hashable, float] = 0.08) -> SeatMaps:
+        """
+        Creates a store from a mapping of seat IDs to maps
+        and optionally to thresholds.
+        """
+        seat_ids = list(maps)
+        if isinstance(thresholds, dict):
+            thresholds = [thresholds[seat_id] for seat_id in seat_ids]
+        return cls(seat_ids, np.stack([maps[s] for s in seat_ids]), thresholds)
+
+    @classmethod
+    def load(cls, path: str | Path) -> SeatMaps:
+        """
+        Loads a store saved with `save`. The maps are read
+        into memory, so that they can be updated.
+        """
+        artifact = load_artifact(path, mmap=False)
+        return cls(artifact.meta["seat_ids"], artifact.map, artifact.threshold)
+
+    def save(self, path: str | Path) -> Path:
+        """
+        Saves the store as a map artifact. Seat IDs 
+        must be JSON serializable.
+        """
+        return save_artifact(
+            path, self.maps, self.thresholds.tolist(), seat_ids=self.seat_ids
+        )
+
+    @property
+    def seat_ids(self) -> list[Hashable]:
+        return list(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, seat_id: Hashable) -> bool:
+        return seat_id in self._index
+
+    def __getitem__(self, seat_id: Hashable) -> np.ndarray:
+        return self.maps[self._index[seat_id]]
+
+    def index(self, seat_ids: Iterable[Hashable]) -> np.ndarray:
+        """
+        Returns the row indices of the given seats.
+        """
+        try:
+            return np.fromiter(
+                (self._index[s] for s in seat_ids), dtype=np.intp
+            )
+        except KeyError as e:
+            raise KeyError(f"Unknown seat ID {e.args[0]!r}.") from None
+
+    def set_map(self,
+                seat_id: Hashable,
+                map: np.ndarray,
+                threshold: float | None = None) -> None:
+        """
+        Replaces the map of a seat, or adds a new seat.
+        """
+        if seat_id in self._index:
+            i = self._index[seat_id]
+            self.maps[i] = map
+            if threshold is not None:
+                self.thresholds[i] = threshold
+            return
+        if threshold is None:
+            raise ValueError(f"A threshold is required for the new seat {seat_id!r}.")
+        self._index[seat_id] = len(self._index)
+        self.maps = np.concatenate([self.maps, np.asarray(map, np.float32)[None]])
+        self.thresholds = np.append(self.thresholds, np.float32(threshold))
+
+    def pixdiff_many(self,
+                     thumbnails: np.ndarray | Sequence[np.ndarray],
+                     seat_ids: Sequence[Hashable]) -> np.ndarray:
+        """
+        Calculate the pixel difference of every thumbnail
+        to the map of its seat.
+        """
+        return pixdiff_many(
+            np.asarray(thumbnails, dtype=np.float32), self.maps[self.index(seat_ids)]
+        )
+
+    def is_empty_many(self,
+                      thumbnails: np.ndarray | Sequence[np.ndarray],
+                      seat_ids: Sequence[Hashable],
+                      thresholds: float | Sequence[float] | None = None
+                      ) -> np.ndarray:
+        """
+        Detect for many seats at once whether they are empty.
+
+        Args:
+            thumbnails: Preprocessed images, one per entry of `seat_ids`.
+            seat_ids: Seat of each thumbnail.
+            thresholds: Overrides the stored per-seat thresholds;
+                either one for all or one per thumbnail.
+
+        Returns:
+            Boolean array, True where the seat is empty.
+        """
+        idx = self.index(seat_ids)
+        if thresholds is None:
+            thresholds = self.thresholds[idx]
+        diffs = pixdiff_many(np.asarray(thumbnails, dtype=np.float32), self.maps[idx])
+        return diffs <= thresholds
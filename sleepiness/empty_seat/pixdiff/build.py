@@ -0,0 +1,132 @@
+"""
+Parallel builder for the pixdiff average map.
+
+The list of training images is split into shards which
+are processed by a pool of worker processes. Every worker
+returns the sum of its preprocessed images together with
+their count, and the partial sums are reduced into the
+final average map. The map is written as a `.npy` file
+(which can be opened with `np.load(..., mmap_mode="r")`)
+next to a JSON file with its metadata, and as a map
+artifact (`.pxmap`) as read by the pipelines.
+
+Usage:
+    python -m sleepiness.empty_seat.pixdiff.build <image dir> <output stem>
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from sleepiness.utility.misc import Loader
+from ._artifact import save_artifact
+from ._pixdiff import (
+    CROP_BOTTOM, CROP_SIDES, IMAGE_HEIGHT, IMAGE_WIDTH,
+    preprocess, preprocess_cv2
+)
+
+def _init_worker() -> None:
+    # One process per core already; avoid oversubscription by cv2
+    cv2.setNumThreads(1)
+
+def _sum_shard(paths: list[Path], backend: str) -> tuple[np.ndarray, int]:
+    """
+    Returns the sum of the preprocessed images of a shard and their count.
+    """
+    total = np.zeros((IMAGE_HEIGHT, IMAGE_WIDTH), dtype=np.float64)
+    count = 0
+    for path in paths:
+        if backend == "cv2":
+            img = cv2.imread(str(path))
+            if img is None:
+                continue
+            total += preprocess_cv2(img)
+        else:
+            from PIL import Image
+            total += preprocess(Image.open(path))
+        count += 1
+    return total, count
+
+def build_avg_map(train_path: Path,
+                  n_workers: int | None = None,
+                  shard_size: int = 512,
+                  backend: str = "cv2") -> tuple[np.ndarray, int]:
+    """
+    Builds the average map over all jpg images in `train_path`.
+
+    Args:
+        train_path: Directory with images of empty seats.
+        n_workers: Number of worker processes, defaults to the number of cores.
+        shard_size: Number of images per shard.
+        backend: Preprocessing to use, "cv2" (`preprocess_cv2`,
+            as used by the pipelines) or "pil" (`preprocess`).
+
+    Returns:
+        The float32 average map and the number of images it is built from.
+    """
+    if backend not in ("cv2", "pil"):
+        raise ValueError(f"Unknown backend '{backend}'.")
+
+    paths = sorted(Path(train_path).glob("*.jpg"))
+    shards = [paths[i:i + shard_size] for i in range(0, len(paths), shard_size)]
+
+    total = np.zeros((IMAGE_HEIGHT, IMAGE_WIDTH), dtype=np.float64)
+    count = 0
+    with Loader(f"Averaging {len(paths)} images in {len(shards)} shards") as loader:
+        with ProcessPoolExecutor(n_workers, initializer=_init_worker) as pool:
+            futures = [pool.submit(_sum_shard, shard, backend) for shard in shards]
+            for n, future in enumerate(futures):
+                shard_total, shard_count = future.result()
+                total += shard_total
+                count += shard_count
+                loader.desc = f"Averaging shard {n + 1}/{len(shards)}"
+
+    if count == 0:
+        raise FileNotFoundError(f"No readable jpg images found in {train_path}.")
+    return (total / count).astype(np.float32), count
+
+def save_avg_map_npy(avgmap: np.ndarray,
+                     stem: Path,
+                     **metadata) -> tuple[Path, Path]:
+    """
+    Saves the map as `<stem>.npy` and its metadata
+    (preprocessing parameters and any extra fields)
+    as `<stem>.json`.
+    """
+    stem = Path(stem)
+    npy_path, json_path = stem.with_suffix(".npy"), stem.with_suffix(".json")
+    np.save(npy_path, np.ascontiguousarray(avgmap))
+    meta = {
+        "shape": list(avgmap.shape),
+        "dtype": str(avgmap.dtype),
+        "image_width": IMAGE_WIDTH,
+        "image_height": IMAGE_HEIGHT,
+        "crop_bottom": CROP_BOTTOM,
+        "crop_sides": CROP_SIDES,
+        **metadata,
+    }
+    with open(json_path, "w") as f:
+        json.dump(meta, f, indent=2)
+    return npy_path, json_path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("train_path", type=Path)
+    parser.add_argument("stem", type=Path)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--shard-size", type=int, default=512)
+    parser.add_argument("--backend", choices=["cv2", "pil"], default="cv2")
+    parser.add_argument("--threshold", type=float, default=0.08)
+    args = parser.parse_args()
+
+    avgmap, count = build_avg_map(
+        args.train_path, args.workers, args.shard_size, args.backend
+    )
+    meta = dict(count=count, backend=args.backend, source=str(args.train_path))
+    save_avg_map_npy(avgmap, args.stem, threshold=args.threshold, **meta)
+    save_artifact(args.stem.with_suffix(".pxmap"), avgmap, args.threshold, **meta)
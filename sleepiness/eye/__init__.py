@@ -1 +1,11 @@
-from .detection import *
\ No newline at end of file
+from .detection import *
+
+def __getattr__(name):
+    # The model classes require torch and are imported on first access
+    if name == "CustomCNN":
+        from .CNN.model import CustomCNN
+        return CustomCNN
+    if name == "FFNN":
+        from .FFNN.model import FFNN
+        return FFNN
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,28 +1,40 @@
+from __future__ import annotations
 import cv2
 import numpy as np
-import torch
-import supervision as spv
+import threading
 
-from torch import Tensor
-from torchvision import models
-from joblib import load
 from pathlib import Path
-from sklearn.pipeline import Pipeline
-from ultralytics import YOLO
+from typing import TYPE_CHECKING
 from sleepiness import __path__ as p
 
-from sleepiness.eye.FFNN.model import FFNN
 from sleepiness.eye.FFNN.weights import __path__ as ffnn_WeightPath
-from sleepiness.eye.CNN.model import CustomCNN
 from sleepiness.eye.CNN.weights import __path__ as cnn_WeightPath
-
-
-def load_model() -> YOLO:
-    """Loads and returns the eye model."""
+from sleepiness.utility.onnxbackend import OrtYOLO
+
+# torch, ultralytics, supervision and sklearn are expensive
+# to import and are only imported once they are needed.
+if TYPE_CHECKING:
+    import torch
+    from torchvision import models
+    from sklearn.pipeline import Pipeline
+    from ultralytics import YOLO
+
+MODEL_PATH = Path(p[0]) / "eye" / "eye_yolov8n.pt"
+CNN_CLASSIFIER_PATH = Path(cnn_WeightPath[0]) / "eye_epoch_13.pt"
+FFNN_CLASSIFIER_PATH = Path(ffnn_WeightPath[0]) / "eye_epoch_26.pt"
+RESNET_CLASSIFIER_PATH = Path(p[0]) / "eye" / "eye_classifier.pt"
+
+def load_model(backend : str = "torch") -> YOLO | OrtYOLO:
+    """Loads and returns the eye model, for the "onnx" 
+    backend its export (see `sleepiness.utility.onnxbackend`)."""
+    from sleepiness.utility.onnxbackend import load_yolo
 
     try:
-        model_path = Path(p[0]) / "eye" / "eye_yolov8n.pt"
-        eye_model = YOLO(model_path)
+        if backend == "onnx":
+            eye_model = load_yolo(MODEL_PATH)
+        else:
+            from ultralytics import YOLO
+            eye_model = YOLO(MODEL_PATH)
     except:
         raise FileNotFoundError(f"Error: Could not load the eye model.")
 
@@ -31,6 +43,7 @@ def load_model() -> YOLO:
 
 def load_clustering_model() -> Pipeline:
     """Loads and returns the clustering model for open-eye detection."""
+    from joblib import load
 
     try:
         model_path = Path(p[0]) / "eye" / "eye_clustering_model.joblib"
@@ -42,11 +55,12 @@ def load_clustering_model() -> Pipeline:
     return clustering_model
 
 def load_classifier_resnet() -> models.ResNet:
-    """Loads and returns the ResNet18 model for open-eye detection."""
+    """Loads and returns the ResNet18 model for open-eye detection.
+    A TorchScript export (see `sleepiness.utility.export`) is preferred."""
+    from sleepiness.utility.export import load
 
     try:
-        model_path = Path(p[0]) / "eye" / "eye_classifier.pt"
-        model: models.ResNet = torch.load(model_path)
+        model: models.ResNet = load(RESNET_CLASSIFIER_PATH)
     except:
         raise FileNotFoundError(f"Error: Could not load the eye classification model.")
 
@@ -54,59 +68,143 @@ def load_classifier_resnet() -> models.ResNet:
     return model
 
 def load_classifier_ffnn() -> torch.nn.Module:
-    """Loads and returns the FFNN model for open-eye detection."""
+    """Loads and returns the FFNN model for open-eye detection.
+    A TorchScript export (see `sleepiness.utility.export`) is preferred."""
+    from sleepiness.utility.export import load
+    from sleepiness.eye.FFNN.model import FFNN # needed to unpickle the model
 
     try:
-        model_path = Path(ffnn_WeightPath[0]) / "eye_epoch_26.pt"
-        model: torch.nn.Module = torch.load(model_path,map_location=torch.device('cpu'))
+        model: torch.nn.Module = load(FFNN_CLASSIFIER_PATH)
     except Exception as e:
         raise FileNotFoundError(
             f"Error: Could not load the eye classification model.",e
         )
 
     print("Feed-Forward eye classification model loaded.")
-    model.eval()
-    model.to("cpu")
     return model
 
-def load_classifier_cnn() -> torch.nn.Module:
-    """Loads and returns the CNN model for open-eye detection."""
-
+def load_classifier_cnn(variant : str | None = None, backend : str = "torch") -> torch.nn.Module:
+    """Loads and returns the CNN model for open-eye detection.
+    A TorchScript export (see `sleepiness.utility.export`) is preferred,
+    'variant' selects e.g. the "int8" one (see `sleepiness.utility.quantize`).
+    The "onnx" backend loads the ONNX export instead."""
+    from sleepiness.utility.export import load
+    from sleepiness.utility.onnxbackend import load_classifier
+    from sleepiness.eye.CNN.model import CustomCNN # needed to unpickle the model
+
+    if backend == "onnx" and variant:
+        raise ValueError("Variants are only available for the torch backend.")
     try:
-        model_path = Path(cnn_WeightPath[0]) / "eye_epoch_13.pt"
-        model: torch.nn.Module = torch.load(model_path, map_location=torch.device('cpu'))
+        if backend == "onnx":
+            model = load_classifier(CNN_CLASSIFIER_PATH)
+        else:
+            model: torch.nn.Module = load(CNN_CLASSIFIER_PATH, variant)
     except Exception as e:
         raise FileNotFoundError(
             f"Error: Could not load the eye classification model.", e
         )
 
     print("Convolutional eye classification model loaded.")
-    model.eval()
-    model.to("cpu")
     return model
 
-def detect(faceImg : np.ndarray, eye_model : YOLO, confidence: float = 0.5) -> tuple:
+class EyeClassifierFrontend:
+    """Batched front-end for the open-eye classifiers.
+    
+    All eye regions are resized with cv2 into one preallocated 
+    (N, 3, 20, 50) float32 tensor, which is classified in a single 
+    forward pass under `torch.inference_mode`. The buffer grows 
+    when more than `capacity` eyes are classified at once.
+    
+    The color channels are passed through in their given order,
+    matching the former `Image.fromarray(r, mode='RGB')` conversion.
+    """
+    HEIGHT, WIDTH = 20, 50
+
+    def __init__(self, classifier : torch.nn.Module, capacity : int = 16):
+        self.classifier = classifier
+        self._lock = threading.Lock()
+        self._allocate(capacity)
+
+    def _allocate(self, capacity : int) -> None:
+        import torch
+        self._tensor = torch.empty((capacity, 3, self.HEIGHT, self.WIDTH), dtype=torch.float32)
+        # NumPy view sharing memory with the tensor
+        self._buffer = self._tensor.numpy()
+
+    def _fill(self, eye_regions : list[np.ndarray]) -> None:
+        """Writes the preprocessed eye regions into the buffer. Needs the lock."""
+        if len(eye_regions) > len(self._buffer):
+            self._allocate(max(len(eye_regions), 2 * len(self._buffer)))
+
+        for r, out in zip(eye_regions, self._buffer):
+            h, w = r.shape[:2]
+            interpolation = cv2.INTER_AREA if h >= self.HEIGHT and w >= self.WIDTH else cv2.INTER_LINEAR
+            resized = cv2.resize(r, (self.WIDTH, self.HEIGHT), interpolation=interpolation)
+
+            # HWC uint8 -> CHW float in [0, 1], written into the buffer
+            np.multiply(resized.transpose(2, 0, 1), 1 / 255, out=out, casting="unsafe")
+
+    def preprocess(self, eye_regions : list[np.ndarray]) -> torch.Tensor:
+        """Returns the classifier input for the eye regions as a new tensor."""
+        with self._lock:
+            self._fill(eye_regions)
+            return self._tensor[:len(eye_regions)].clone()
+
+    def __call__(self, eye_regions : list[np.ndarray]) -> np.ndarray:
+        """Classifies the eye regions.
+        
+        Returns an int64 array with one label per region, open eyes have label 1."""
+        n = len(eye_regions)
+        if n == 0:
+            return np.empty(0, dtype=np.int64)
+
+        with self._lock:
+            self._fill(eye_regions)
+
+            import torch
+            with torch.inference_mode():
+                logprobs = self.classifier(self._tensor[:n])
+            return logprobs.argmax(dim=1).numpy()
+
+def detect(faceImg : np.ndarray, eye_model : YOLO | OrtYOLO, confidence: float = 0.5) -> tuple:
     """Processes an image and tries to detect eyes. 
     
     Returns a 2-tuple:
         list of eye regions (np.ndarrays), list of bounding boxes (tuples) 
     If there are no eyes, the list will be empty."""
-    # Rescale face image
-    faceImg = maxmin_scaling(faceImg)
+    return detect_batch([faceImg], eye_model, confidence)[0]
+
+def detect_batch(faceImgs : list[np.ndarray], eye_model : YOLO | OrtYOLO, confidence: float = 0.5) -> list[tuple]:
+    """Detects eyes on a list of face images using a single batched forward pass.
+    
+    Returns a list of 2-tuples in the same order as `faceImgs`, 
+    each formatted like the output of `detect`."""
+    if len(faceImgs) == 0:
+        return []
+
+    # Rescale face images
+    faceImgs = [maxmin_scaling(f) for f in faceImgs]
 
     # Inference
-    result = eye_model(faceImg, agnostic_nms=True, verbose=False, conf=confidence)[0]
-    detections = spv.Detections.from_yolov8(result)
+    if isinstance(eye_model, OrtYOLO):
+        detections = eye_model.predict(faceImgs, conf=confidence, agnostic=True)
+    else:
+        import supervision as spv
+        results = eye_model(faceImgs, agnostic_nms=True, verbose=False, conf=confidence)
+        detections = [spv.Detections.from_yolov8(r) for r in results]
+    return [_eye_regions(f, d.xyxy, d.class_id) for f, d in zip(faceImgs, detections)]
+
+def _eye_regions(faceImg : np.ndarray, xyxy : np.ndarray, class_id : np.ndarray) -> tuple:
+    """Extracts the eye regions and bounding boxes from the detections of a single face image."""
 
     # Keep only those detections associated with eyes
     eye_regions = []
     eye_xxyy = []
 
-    for detection in detections:
+    for (x_min, y_min, x_max, y_max), c in zip(xyxy, class_id):
 
         # Class index of eyes is 0
-        if detection[2] == 0:
-            x_min, y_min, x_max, y_max = detection[0]
+        if c == 0:
             eye_regions.append(faceImg[int(y_min):int(y_max), int(x_min):int(x_max)])
             eye_xxyy.append((int(x_min), int(x_max), int(y_min), int(y_max)))
     return eye_regions, eye_xxyy
@@ -1,10 +1,9 @@
 import cv2
-import supervision as spv
 import numpy as np
 
-from sleepiness.face.detectFace import load_face_model, detect_face
+import sleepiness.face.yoloface as facedetect
 import sleepiness.eye as eye
-from sleepiness.main import open_eye_classify
+from sleepiness.utility.engine import latest_frames
 
 
 def viz_pipeline(original_img : np.ndarray, face_xxyy : tuple, eyes_xxyy : list, eye_labels : list) -> None:
@@ -37,25 +36,26 @@ def viz_pipeline(original_img : np.ndarray, face_xxyy : tuple, eyes_xxyy : list,
 if __name__ == "__main__":
 
     # Loading the model
-    face_model = load_face_model()
+    face_model = facedetect.load_model()
     eye_model  = eye.load_model()
-    eye_classifier = eye.load_classifier_resnet()
+    eye_classifier = eye.EyeClassifierFrontend(eye.load_classifier_cnn())
 
-    # Reading frames from the webcam
+    # Reading frames from the webcam on its own thread, only the latest frame is processed
     cap = cv2.VideoCapture(0)
+    frames = latest_frames(cap)
 
-    while True:
-        ret, img = cap.read()
+    for img in frames:
+        eye_xxyy, eye_labels = [], []
 
         # Detect Face
-        face_detected, faceImg, face_xxyy = detect_face(img=img, face_model=face_model, with_xyxy=True)
+        face_detected, faceImg, face_xxyy = facedetect.detect(img=img, face_model=face_model, with_xyxy=True)
 
         # Detect eyes
         if face_detected:
             eye_regions, eye_xxyy = eye.detect(faceImg=faceImg, eye_model=eye_model)
 
             if len(eye_regions) > 0:
-                eye_labels = open_eye_classify(eye_regions=eye_regions, eye_classifier=eye_classifier)
+                eye_labels = eye_classifier(eye_regions)
                 eye_labels = ["closed" if l == 0 else "open" for l in eye_labels]
 
         # Viz
@@ -68,5 +68,6 @@ if __name__ == "__main__":
         if cv2.waitKey(10) & 0xFF == ord('q'):
             break
 
+    frames.close()
     cv2.destroyAllWindows()
     cap.release()
@@ -2,6 +2,7 @@ import cv2
 import supervision as spv
 
 from sleepiness.eye import load_model
+from sleepiness.utility.engine import latest_frames
 
 if __name__ == "__main__":
 
@@ -20,8 +21,9 @@ if __name__ == "__main__":
     # Reading frames from the webcam
     cap = cv2.VideoCapture(0)
 
-    while True:
-        ret, frame = cap.read()
+    # The camera is read on its own thread, only the latest frame is processed
+    frames = latest_frames(cap)
+    for frame in frames:
 
         # Inference
         result = eye_model(frame, agnostic_nms=True, verbose=False)[0]
@@ -54,5 +56,6 @@ if __name__ == "__main__":
         if cv2.waitKey(10) & 0xFF == ord('q'):
             break
 
+    frames.close()
     cv2.destroyAllWindows()
     cap.release()
@@ -1,25 +1,37 @@
-import torch
+from __future__ import annotations
 import numpy as np
-from PIL import Image
 from pathlib import Path
+from typing import TYPE_CHECKING
 from .weights import __path__ as p
-from .transforms import val_transform
-from sleepiness.face.smallCNN.model import smallCNN
 
+# torch and torchvision are imported on first use
+if TYPE_CHECKING:
+    import torch
 
-def load_model() -> torch.nn.Module:
-    """Loads and returns the face model."""
+MODEL_PATH = Path(p[0]) / "small_face_epoch_1.pt"
 
+def load_model(variant : str | None = None, backend : str = "torch") -> torch.nn.Module:
+    """Loads and returns the face model.
+    A TorchScript export (see `sleepiness.utility.export`) is preferred,
+    'variant' selects e.g. the "int8" one (see `sleepiness.utility.quantize`).
+    The "onnx" backend loads the ONNX export instead."""
+    from sleepiness.utility.export import load
+    from sleepiness.utility.onnxbackend import load_classifier
+    from sleepiness.face.smallCNN.model import smallCNN # needed to unpickle the model
+
+    if backend == "onnx" and variant:
+        raise ValueError("Variants are only available for the torch backend.")
     try:
-        model_path = Path(p[0]) / "small_face_epoch_1.pt"
-        face_model = torch.load(model_path, map_location=torch.device('cpu'))
+        if backend == "onnx":
+            face_model = load_classifier(MODEL_PATH)
+        else:
+            face_model = load(MODEL_PATH, variant)
     except:
         raise FileNotFoundError(
             "Error: Could not load the face classification model. Check the paths."
         )
 
     print("Face detection model loaded.")
-    face_model.eval()
     return face_model
 
 def classify(img : np.ndarray, face_model : torch.nn.Module) -> int:
@@ -30,8 +42,17 @@ def classify(img : np.ndarray, face_model : torch.nn.Module) -> int:
             - 0: Awake
             - 1: Sleepy
     """ 
-    pil_img = Image.fromarray(img, mode="RGB")
-    timg = val_transform(pil_img).unsqueeze(0)
+    import torch
+
+    timg = preprocess(img).unsqueeze(0)
     with torch.no_grad():
         logps = face_model(timg)
         return torch.argmax(logps).item()
+
+def preprocess(img : np.ndarray) -> torch.Tensor:
+    """Returns the classifier input for a face image."""
+    from PIL import Image
+    from .transforms import val_transform
+
+    pil_img = Image.fromarray(img, mode="RGB")
+    return val_transform(pil_img)
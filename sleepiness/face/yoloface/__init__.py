@@ -1 +1,3 @@
-from .detection import *
\ No newline at end of file
+from .detection import *
+from .tracking import FaceTracker, TrackedFaceDetector
+from .engine import FaceEngine, largest_box
@@ -1,22 +1,34 @@
-from ultralytics import YOLO
+from __future__ import annotations
 import numpy as np
 from pathlib import Path
+from typing import TYPE_CHECKING
 from sleepiness import __path__ as p
+from sleepiness.utility.onnxbackend import OrtYOLO
+from .engine import FaceEngine, largest_box
 
+if TYPE_CHECKING:
+    from ultralytics import YOLO
 
-def load_model() -> YOLO:
-    """Loads and returns the face model."""
+MODEL_PATH = Path(p[0]) / "face" / "yolov8n-face.pt"
+
+def load_model(backend : str = "torch") -> YOLO | FaceEngine:
+    """Loads and returns the face model, for the "onnx" backend a `FaceEngine` 
+    running its export (see `sleepiness.utility.onnxbackend`)."""
+    from sleepiness.utility.onnxbackend import onnx_path
 
     try:
-        model_path = Path(p[0]) / "face" / "yolov8n-face.pt"
-        face_model = YOLO(model_path)
+        if backend == "onnx":
+            face_model = FaceEngine(onnx_path(MODEL_PATH))
+        else:
+            from ultralytics import YOLO
+            face_model = YOLO(MODEL_PATH)
     except:
         raise FileNotFoundError("Error: Could not load the face model. Check the paths.")
 
     print("Face model loaded.")
     return face_model
 
-def detect(img : np.ndarray, face_model : YOLO, with_xyxy : bool = False) -> tuple:
+def detect(img : np.ndarray, face_model : YOLO | OrtYOLO | FaceEngine, with_xyxy : bool = False) -> tuple:
     """Detects faces on an image.
     
     Returns: 
@@ -25,37 +37,48 @@ def detect(img : np.ndarray, face_model : YOLO, with_xyxy : bool = False) -> tup
     The bool is 'True' if at least one face is detected. 
     The Image is then the (reduced-size) image containing the face with the largest bounding box, otherwise the original image. 
     """ 
-    results = face_model.predict(img, stream=False, verbose=False)[0]
+    return detect_batch([img], face_model, with_xyxy)[0]
 
-    # No image detected
-    if len(results.boxes) == 0:
-        if with_xyxy:
-            return False, img, None
-        else:
-            return False, img
+def detect_batch(imgs : list[np.ndarray], face_model : YOLO | OrtYOLO | FaceEngine, with_xyxy : bool = False) -> list[tuple]:
+    """Detects faces on a list of images using a single batched forward pass.
+    
+    Returns:
+        List of tuples in the same order as `imgs`, each formatted like the output of `detect`.
+    """
+    boxes = detect_all_batch(imgs, face_model)
+    return [_select_largest_face(img, b, with_xyxy) for img, b in zip(imgs, boxes)]
 
-    # Select image with largest bounding box
-    largest_face_area  = 0
-    largest_face_image = img  # Default to original image
-    largest_face_xxyy = None
+def detect_all(img : np.ndarray, face_model : YOLO | OrtYOLO | FaceEngine) -> np.ndarray:
+    """Detects all faces on an image, e.g. a cabin frame showing several seats.
     
-    for box in results.boxes.xyxy.cpu().numpy():
+    Returns:
+        (N, 4) array of xyxy bounding boxes.
+    """
+    return detect_all_batch([img], face_model)[0]
 
-        # Selection
-        xmin = int(box[0])
-        xmax = int(box[2])
-        ymin = int(box[1])
-        ymax = int(box[3])
+def detect_all_batch(imgs : list[np.ndarray], face_model : YOLO | OrtYOLO | FaceEngine) -> list[np.ndarray]:
+    """Detects all faces on a list of images, see `detect_all`."""
+    if len(imgs) == 0:
+        return []
+    if isinstance(face_model, FaceEngine):
+        return [face_model.predict(img)[0] for img in imgs]
+    if isinstance(face_model, OrtYOLO):
+        return [d.xyxy for d in face_model.predict(imgs)]
+    results = face_model.predict(imgs, stream=False, verbose=False)
+    return [r.boxes.xyxy.cpu().numpy() for r in results]
 
-        # Calculate face area
-        face_area = (xmax - xmin) * (ymax - ymin)
+def _select_largest_face(img : np.ndarray, boxes : np.ndarray, with_xyxy : bool) -> tuple:
+    """Selects the face with the largest bounding box from the (N, 4) xyxy boxes of a single image."""
+    found = len(boxes) > 0
+    xxyy = largest_box(boxes)
 
-        # Crop the original image using the largest face bounding box
-        if face_area > largest_face_area:
-            largest_face_area  = face_area
-            largest_face_image = img[ymin:ymax, xmin:xmax]
-            largest_face_xxyy = (xmin, xmax, ymin, ymax)
+    # Crop the original image using the largest face bounding box
+    if xxyy is None:
+        face_img = img
+    else:
+        xmin, xmax, ymin, ymax = xxyy
+        face_img = img[ymin:ymax, xmin:xmax]
 
     if with_xyxy:
-        return True, largest_face_image, largest_face_xxyy
-    return True, largest_face_image
+        return found, face_img, xxyy
+    return found, face_img
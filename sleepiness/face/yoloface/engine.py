@@ -0,0 +1,161 @@
+from __future__ import annotations
+import threading
+import numpy as np
+import cv2
+from pathlib import Path
+
+
+def largest_box(xyxy : np.ndarray) -> tuple[int, int, int, int] | None:
+    """Returns the (xmin, xmax, ymin, ymax) box with the largest area among 
+    the (N, 4) xyxy boxes, truncated to int, or None if no box has an area."""
+    if len(xyxy) == 0:
+        return None
+    boxes = xyxy.astype(np.int64)
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    i = np.argmax(areas)
+    if areas[i] <= 0:
+        return None
+    xmin, ymin, xmax, ymax = boxes[i].tolist()
+    return xmin, xmax, ymin, ymax
+
+
+def nms(xyxy : np.ndarray, scores : np.ndarray, iou : float, max_det : int = 300) -> np.ndarray:
+    """Greedy non-maximum suppression.
+
+    The IoU of all box pairs is computed at once; the loop only walks the
+    boxes in score order and skips those suppressed by a kept box.
+
+    Returns:
+        Indices of the kept boxes, by decreasing score.
+    """
+    order = np.argsort(-scores, kind="stable")
+    xyxy = xyxy[order]
+
+    # Pairwise IoU, (N, N)
+    tl = np.maximum(xyxy[:, None, :2], xyxy[None, :, :2])
+    br = np.minimum(xyxy[:, None, 2:], xyxy[None, :, 2:])
+    inter = np.prod(np.clip(br - tl, 0, None), axis=2)
+    area = np.prod(xyxy[:, 2:] - xyxy[:, :2], axis=1)
+    overlap = inter / (area[:, None] + area[None, :] - inter + 1e-9) > iou
+
+    suppressed = np.zeros(len(order), dtype=bool)
+    keep = []
+    for i in range(len(order)):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        if len(keep) == max_det:
+            break
+        suppressed |= overlap[i]
+    return order[keep]
+
+
+class FaceEngine:
+    """Lean face detector for the ONNX export of the YOLOv8n-face model.
+
+    Replaces the ultralytics predictor for single images: the letterbox
+    canvas and the network input are preallocated for the size of the
+    last image, the output is decoded with vectorized NumPy, and the
+    largest face is selected with a single `argmax` over the box areas.
+    Keypoints are ignored. Boxes match `ultralytics.YOLO.predict` with the same
+    `conf` and `iou` up to floating point differences.
+
+    Args:
+        path: The ONNX model, see `sleepiness.utility.onnxbackend`.
+        size: Side length the longer image side is scaled to.
+        conf: Minimal confidence of a face.
+        iou: IoU above which overlapping faces are suppressed.
+    """
+
+    STRIDE = 32
+    PAD_VALUE = 114
+
+    def __init__(self,
+                 path : str | Path | None = None,
+                 size : int = 640,
+                 conf : float = 0.25,
+                 iou : float = 0.7):
+        from sleepiness.utility.onnxbackend import create_session, onnx_path
+        from .detection import MODEL_PATH
+
+        self.session = create_session(path or onnx_path(MODEL_PATH))
+        self.input_name = self.session.get_inputs()[0].name
+        self.size = size
+        self.conf = conf
+        self.iou = iou
+        # Shape and layout of the last image
+        self._buffers : tuple[tuple, dict] | None = None
+        self._lock = threading.Lock()
+
+    def _layout(self, shape : tuple) -> dict:
+        """Returns the preallocated buffers and the letterbox geometry for an image shape.
+        Only the buffers of the last shape are kept, so that streams of varying sizes
+        do not accumulate them."""
+        if self._buffers is not None and self._buffers[0] == shape:
+            return self._buffers[1]
+
+        h, w = shape[:2]
+        scale = min(self.size / h, self.size / w)
+        nh, nw = round(h * scale), round(w * scale)
+        ph = (self.size - nh) % self.STRIDE if nh < self.size else 0
+        pw = (self.size - nw) % self.STRIDE if nw < self.size else 0
+        top, left = round(ph / 2 - 0.1), round(pw / 2 - 0.1)
+
+        canvas = np.full((nh + ph, nw + pw, 3), self.PAD_VALUE, dtype=np.uint8)
+        layout = {
+            "scale": scale,
+            "size": (nw, nh),
+            "offset": np.array([left, top, left, top], dtype=np.float32),
+            "canvas": canvas,
+            # Part of the canvas the resized image is written to, the rest stays padding
+            "window": canvas[top:top + nh, left:left + nw],
+            "resized": np.empty((nh, nw, 3), dtype=np.uint8),
+            "planar": np.empty((3, nh + ph, nw + pw), dtype=np.uint8),
+            "input": np.empty((1, 3, nh + ph, nw + pw), dtype=np.float32),
+            "limits": np.array([w, h, w, h], dtype=np.float32),
+        }
+        self._buffers = (shape, layout)
+        return layout
+
+    def predict(self, img : np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Detects faces on a BGR image.
+
+        Returns:
+            (N, 4) float32 xyxy boxes in image coordinates and their (N,) scores.
+        """
+        with self._lock:
+            layout = self._layout(img.shape)
+
+            # Letterbox: resize into the window, then BGR -> RGB, HWC -> CHW, [0, 1]
+            if layout["size"] != (img.shape[1], img.shape[0]):
+                cv2.resize(img, layout["size"], dst=layout["resized"], interpolation=cv2.INTER_LINEAR)
+                layout["window"][...] = layout["resized"]
+            else:
+                layout["window"][...] = img
+            # The strided transpose is cheaper on uint8, the scaling on
+            # contiguous planes; a float32 scalar keeps it out of float64
+            layout["planar"][...] = layout["canvas"].transpose(2, 0, 1)[::-1]
+            np.multiply(
+                layout["planar"], np.float32(1 / 255),
+                out=layout["input"][0], dtype=np.float32, casting="unsafe"
+            )
+            out = self.session.run(None, {self.input_name: layout["input"]})[0][0]
+
+            # (4 box + 1 score + keypoints, anchors), keep confident anchors only
+            scores = out[4]
+            keep = np.flatnonzero(scores > self.conf)
+            cxcywh = out[:4, keep].T
+            scores = scores[keep]
+
+            xyxy = np.empty_like(cxcywh)
+            xyxy[:, :2] = cxcywh[:, :2] - cxcywh[:, 2:] / 2
+            xyxy[:, 2:] = cxcywh[:, :2] + cxcywh[:, 2:] / 2
+
+            keep = nms(xyxy, scores, self.iou)
+            xyxy = (xyxy[keep] - layout["offset"]) / layout["scale"]
+            np.clip(xyxy, 0, layout["limits"], out=xyxy)
+            return xyxy, scores[keep]
+
+    def largest(self, img : np.ndarray) -> tuple[int, int, int, int] | None:
+        """Returns the box (xmin, xmax, ymin, ymax) of the largest face, or None."""
+        return largest_box(self.predict(img)[0])
@@ -0,0 +1,148 @@
+from __future__ import annotations
+import cv2
+import numpy as np
+from typing import TYPE_CHECKING
+
+from .detection import detect
+
+if TYPE_CHECKING:
+    from ultralytics import YOLO
+
+
+class FaceTracker:
+    """Carries a face bounding box from frame to frame by template matching.
+
+    The template is the greyscale face crop of the last detection. On every
+    new frame, it is searched for in a window around the last known box,
+    and the normalized cross-correlation of the best match is used as the
+    tracking confidence.
+
+    Args:
+        search_margin: Size of the search window around the last box,
+            relative to the box width and height on each side.
+        min_size: Minimal side length of a face box that can be tracked.
+    """
+
+    def __init__(self, search_margin : float = 0.5, min_size : int = 8):
+        self.search_margin = search_margin
+        self.min_size = min_size
+        self.template = None
+        self.xxyy = None
+
+    @property
+    def active(self) -> bool:
+        return self.template is not None
+
+    def reset(self, img : np.ndarray = None, xxyy : tuple = None) -> None:
+        """Starts tracking the box (xmin, xmax, ymin, ymax) on the image,
+        or stops tracking if no box is given."""
+        if img is None or xxyy is None:
+            self.template, self.xxyy = None, None
+            return
+
+        xmin, xmax, ymin, ymax = xxyy
+        if xmax - xmin < self.min_size or ymax - ymin < self.min_size:
+            self.template, self.xxyy = None, None
+            return
+
+        self.template = cv2.cvtColor(img[ymin:ymax, xmin:xmax], cv2.COLOR_BGR2GRAY)
+        self.xxyy = xxyy
+
+    def track(self, img : np.ndarray) -> tuple:
+        """Locates the tracked face on a new image.
+
+        Returns:
+            Tuple of the new box (xmin, xmax, ymin, ymax) and the
+            tracking confidence in [-1, 1]. The box is None if
+            nothing is tracked.
+        """
+        if not self.active:
+            return None, -1.
+
+        height, width = img.shape[:2]
+        xmin, xmax, ymin, ymax = self.xxyy
+        th, tw = self.template.shape
+        mx, my = int(tw * self.search_margin), int(th * self.search_margin)
+
+        # Search window around the last box, clipped to the image
+        sx0, sx1 = max(0, xmin - mx), min(width, xmax + mx)
+        sy0, sy1 = max(0, ymin - my), min(height, ymax + my)
+        if sx1 - sx0 < tw or sy1 - sy0 < th:
+            return None, -1.
+
+        window = cv2.cvtColor(img[sy0:sy1, sx0:sx1], cv2.COLOR_BGR2GRAY)
+        response = cv2.matchTemplate(window, self.template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (x, y) = cv2.minMaxLoc(response)
+
+        self.xxyy = (sx0 + x, sx0 + x + tw, sy0 + y, sy0 + y + th)
+        return self.xxyy, float(score)
+
+class TrackedFaceDetector:
+    """Face detection for video streams.
+
+    The YOLO face detector only runs on every `detect_every`-th frame,
+    when the tracking confidence drops below `min_track_score`, or when
+    the previous frame has not been seen (e.g. because the seat was
+    empty). In between, the largest face of the last detection is
+    carried forward by a `FaceTracker`.
+
+    Args:
+        face_model: The YOLO face model.
+        detect_every: Maximal number of frames between two detections.
+        min_track_score: Tracking confidence below which the
+            detector is run again.
+        search_margin: See `FaceTracker`.
+    """
+
+    def __init__(self,
+                 face_model : YOLO,
+                 detect_every : int = 10,
+                 min_track_score : float = 0.6,
+                 search_margin : float = 0.5):
+
+        if detect_every < 1:
+            raise ValueError("'detect_every' must be at least 1.")
+        self.face_model = face_model
+        self.detect_every = detect_every
+        self.min_track_score = min_track_score
+        self.tracker = FaceTracker(search_margin=search_margin)
+        self.reset()
+
+    def reset(self) -> None:
+        """Drops the tracked face and resets the counters."""
+        self.tracker.reset()
+        self.since_detection = 0
+        self.frames = 0
+        self.detector_calls = 0
+
+    @property
+    def saved_calls(self) -> int:
+        """Number of frames on which the detector was not run."""
+        return self.frames - self.detector_calls
+
+    def detect(self, img : np.ndarray, consecutive : bool = True) -> tuple:
+        """Detects or tracks the face on the next frame of the stream.
+
+        Args:
+            img: The frame.
+            consecutive: Whether the frame directly follows the
+                last frame passed to this method.
+
+        Returns:
+            Tuple of (bool, xxyy) like `detect` with 'with_xyxy',
+            but without the face crop.
+        """
+        self.frames += 1
+        if (consecutive 
+            and self.tracker.active 
+            and self.since_detection < self.detect_every - 1):
+            xxyy, score = self.tracker.track(img)
+            if xxyy is not None and score >= self.min_track_score:
+                self.since_detection += 1
+                return True, xxyy
+
+        self.detector_calls += 1
+        face_detected, _, xxyy = detect(img, self.face_model, with_xyxy=True)
+        self.tracker.reset(img, xxyy)
+        self.since_detection = 0
+        return face_detected, xxyy
@@ -2,17 +2,25 @@ from pathlib import Path
 from sleepiness.hand.handYolo import HandYOLO
 from sleepiness import __path__ as p
 
-def load_model(confidence: float = 0.2) -> HandYOLO:
-    """Loads and returns the hand model."""
+CFG_PATH = Path(p[0]) / "hand" / "cross-hands.cfg"
+WEIGHTS_PATH = Path(p[0]) / "hand" / "cross-hands.weights"
+
+def load_model(confidence: float = 0.2, size: int = 416) -> HandYOLO:
+    """Loads and returns the hand model.
+    
+    Args:
+        confidence: Minimal confidence of a detected hand.
+        size: Side length of the square network input, a multiple of 32.
+    """
+    if size % 32 != 0:
+        raise ValueError(f"The network input size must be a multiple of 32, got {size}.")
 
     try:
-        cfg_path     = Path(p[0]) / "hand" / "cross-hands.cfg"
-        weights_path = Path(p[0]) / "hand" / "cross-hands.weights"
-        hand_model = HandYOLO(cfg_path, weights_path, ["hand"])
+        hand_model = HandYOLO(CFG_PATH, WEIGHTS_PATH, ["hand"])
     except:
         raise FileNotFoundError("Error: Could not load the hand model. Check the paths.")
     
-    hand_model.size = 416
+    hand_model.size = size
     hand_model.confidence = confidence
 
     print("Hand model loaded.")
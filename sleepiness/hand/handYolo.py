@@ -1,3 +1,4 @@
+import threading
 import time
 
 import cv2
@@ -12,6 +13,8 @@ class HandYOLO:
         self.size = size
         self.output_names = []
         self.labels = labels
+        # cv2.dnn nets are not thread-safe, the input and the forward pass go together
+        self._lock = threading.Lock()
         try:
             self.net = cv2.dnn.readNetFromDarknet(str(config), str(model))
         except:
@@ -30,54 +33,97 @@ class HandYOLO:
         ih, iw = image.shape[:2]
 
         blob = cv2.dnn.blobFromImage(image, 1 / 255.0, (self.size, self.size), swapRB=True, crop=False)
-        self.net.setInput(blob)
-        start = time.time()
-        layerOutputs = self.net.forward(self.output_names)
-        end = time.time()
+        with self._lock:
+            self.net.setInput(blob)
+            start = time.time()
+            layerOutputs = self.net.forward(self.output_names)
+            end = time.time()
         inference_time = end - start
 
-        boxes = []
-        confidences = []
-        classIDs = []
-
-        for output in layerOutputs:
-            # loop over each of the detections
-            for detection in output:
-                # extract the class ID and confidence (i.e., probability) of
-                # the current object detection
-                scores = detection[5:]
-                classID = np.argmax(scores)
-                confidence = scores[classID]
-                # filter out weak predictions by ensuring the detected
-                # probability is greater than the minimum probability
-                if confidence > self.confidence:
-                    # scale the bounding box coordinates back relative to the
-                    # size of the image, keeping in mind that YOLO actually
-                    # returns the center (x, y)-coordinates of the bounding
-                    # box followed by the boxes' width and height
-                    box = detection[0:4] * np.array([iw, ih, iw, ih])
-                    (centerX, centerY, width, height) = box.astype("int")
-                    # use the center (x, y)-coordinates to derive the top and
-                    # and left corner of the bounding box
-                    x = int(centerX - (width / 2))
-                    y = int(centerY - (height / 2))
-                    # update our list of bounding box coordinates, confidences,
-                    # and class IDs
-                    boxes.append([x, y, int(width), int(height)])
-                    confidences.append(float(confidence))
-                    classIDs.append(classID)
-
-        idxs = cv2.dnn.NMSBoxes(boxes, confidences, self.confidence, self.threshold)
+        results = self.postprocess(layerOutputs, iw, ih)
+        return iw, ih, inference_time, results
+
+    def inference_batch(self, images):
+        """Runs the network once on a list of images of arbitrary sizes.
+
+        Returns a list with one (width, height, inference_time, results) tuple per image,
+        formatted like the output of `inference`. The inference time of the batch
+        is split evenly among the images.
+        """
+        if len(images) == 0:
+            return []
+
+        blob = cv2.dnn.blobFromImages(images, 1 / 255.0, (self.size, self.size), swapRB=True, crop=False)
+        with self._lock:
+            self.net.setInput(blob)
+            start = time.time()
+            layerOutputs = self.net.forward(self.output_names)
+            end = time.time()
+        inference_time = (end - start) / len(images)
+
+        # Depending on the OpenCV version, the batch is either a leading
+        # dimension or folded into the rows of each output
+        layerOutputs = [out.reshape(len(images), -1, out.shape[-1]) for out in layerOutputs]
+
+        batch_results = []
+        for b, image in enumerate(images):
+            ih, iw = image.shape[:2]
+            results = self.postprocess([out[b] for out in layerOutputs], iw, ih)
+            batch_results.append((iw, ih, inference_time, results))
+        return batch_results
+
+    def postprocess(self, layerOutputs, iw, ih):
+        """Decodes the raw network outputs of one image and applies non-maximum suppression.
+
+        Returns a list of (id, name, confidence, x, y, w, h) tuples.
+        """
+        boxes, confidences, classIDs = decode_outputs(layerOutputs, iw, ih, self.confidence)
+        if len(boxes) == 0:
+            return []
+
+        idxs = cv2.dnn.NMSBoxes(boxes.tolist(), confidences.tolist(), self.confidence, self.threshold)
 
         results = []
-        if len(idxs) > 0:
-            for i in idxs.flatten():
-                # extract the bounding box coordinates
-                x, y = (boxes[i][0], boxes[i][1])
-                w, h = (boxes[i][2], boxes[i][3])
-                id = classIDs[i]
-                confidence = confidences[i]
+        for i in np.asarray(idxs, dtype=int).flatten():
+            # extract the bounding box coordinates
+            x, y, w, h = boxes[i].tolist()
+            id = classIDs[i]
+            confidence = float(confidences[i])
 
-                results.append((id, self.labels[id], confidence, x, y, w, h))
+            results.append((id, self.labels[id], confidence, x, y, w, h))
 
-        return iw, ih, inference_time, results
+        return results
+
+
+def decode_outputs(layerOutputs, iw, ih, min_confidence):
+    """Decodes the Darknet YOLO outputs of one image with whole-array operations.
+
+    Every row of an output holds the center (x, y)-coordinates, width and height
+    of a box relative to the image size, the objectness and one score per class.
+
+    Returns:
+        boxes: int array of shape (N, 4) with the (x, y, w, h) boxes in pixels,
+            where (x, y) is the top left corner,
+        confidences: float array of shape (N,),
+        classIDs: int array of shape (N,),
+    for all rows whose best class score exceeds `min_confidence`.
+    """
+    output = layerOutputs[0] if len(layerOutputs) == 1 else np.concatenate(layerOutputs, axis=0)
+
+    # extract the class ID and confidence (i.e., probability) of
+    # every detection and filter out weak predictions
+    scores = output[:, 5:]
+    classIDs = scores.argmax(axis=1)
+    confidences = np.take_along_axis(scores, classIDs[:, None], axis=1)[:, 0]
+    keep = confidences > min_confidence
+
+    # scale the bounding box coordinates back relative to the
+    # size of the image and derive the top left corner from
+    # the center (x, y)-coordinates
+    box = (output[keep, 0:4] * np.array([iw, ih, iw, ih])).astype(int)
+    centerX, centerY, width, height = box.T
+    x = (centerX - width / 2).astype(int)
+    y = (centerY - height / 2).astype(int)
+
+    boxes = np.stack([x, y, width, height], axis=1)
+    return boxes, confidences[keep].astype(float), classIDs[keep]
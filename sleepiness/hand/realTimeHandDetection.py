@@ -1,5 +1,6 @@
 import cv2
 from sleepiness.hand import load_model
+from sleepiness.utility.engine import latest_frames
 
 
 if __name__ == "__main__":
@@ -10,10 +11,9 @@ if __name__ == "__main__":
     # Access camera
     cap = cv2.VideoCapture("/dev/video0")
 
-    while cap.isOpened():
-
-        # Read current frame
-        ret, frame = cap.read()
+    # The camera is read on its own thread, only the latest frame is processed
+    frames = latest_frames(cap)
+    for frame in frames:
 
         # Inference 
         width, height, inference_time, results = hand_model.inference(frame)
@@ -36,5 +36,6 @@ if __name__ == "__main__":
         if cv2.waitKey(10) & 0xFF == ord('q'):
             break
 
+    frames.close()
     cap.release()
     cv2.destroyAllWindows()
@@ -4,67 +4,57 @@ contains a sleeping person, or contains a person being awake.
 
 Authors: Martin Waltz, Niklas Paulig
 """
-import os
+from __future__ import annotations
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import cached_property
 from pathlib import Path
-from typing import Callable
+from typing import Any, Callable, Hashable, Iterator, TYPE_CHECKING
 import cv2
-import pickle
 import numpy as np
-import torch
+import time
 import uuid
 
-from PIL import Image
 from abc import ABC, abstractmethod
-from torchvision import models
-from ultralytics import YOLO
-from sklearn.pipeline import Pipeline
-from torchvision.transforms import transforms
+from contextlib import contextmanager
 
 from sleepiness import PassengerState
-from sleepiness.eye.CNN.model import CustomCNN
-from sleepiness.face.smallCNN.transforms import val_transform as face_transform
+
+# torch and ultralytics are only imported by the stages
+# that need them, and models are loaded on first use.
+if TYPE_CHECKING:
+    import torch
+    from sklearn.pipeline import Pipeline as SklearnPipeline
+    from ultralytics import YOLO
 
 import sleepiness.face.yoloface as facedetect
 import sleepiness.face.smallCNN as smallface
 import sleepiness.eye as eye
 import sleepiness.hand as hand
 from sleepiness.empty_seat.pixdiff import (
-    is_empty, preprocess as empty_preprocessor
+    DEFAULT_ARTIFACT, ChangeDetector, 
+    default_artifact, is_empty_cv2, pixdiff_cv2
 )
-# Load the average pixel map
-from sleepiness.empty_seat.pixdiff import __path__ as pixdiff_path 
-with open(f"{pixdiff_path[0]}/avgmap.nparray", "rb") as f:
-    AVGMAP = pickle.load(f)
-    
-def crop_vertically(img: np.ndarray) -> np.ndarray:
-    """
-    Crops the lower 20% of an image.
-    
-    Args:
-        img (np.ndarray): The input image.
-        
-    Returns:
-        np.ndarray: The cropped image.
-    """
-    height, width = img.shape[:2]  
-    cropped_height = int(height * 0.8)  
-    return img[:cropped_height, :]
+from sleepiness.utility.cabin import CabinResult, SeatLayout
+from sleepiness.utility.cache import ResultCache, file_fingerprint, fingerprint, image_key
+from sleepiness.utility.export import scripted_path
+from sleepiness.utility.onnxbackend import onnx_path
+from sleepiness.utility.frame import Frame, crop_horizontally, crop_vertically
+from sleepiness.utility.timing import PipelineMetrics, PipelineResult
+from sleepiness.utility.vizsink import VizSink, render
 
-def crop_horizontally(img: np.ndarray) -> np.ndarray:
-    """
-    Keeps only the middle 50% of an image (horizontally).
-    
-    Args:
-        image (PIL.Image): The input image.
-        
-    Returns:
-        PIL.Image: The cropped image.
-    """
-    height, width = img.shape[:2] 
-    xmin = int(width * 0.25)
-    xmax = int(width * 0.75)
-    return img[:, xmin:xmax]
-    
+def __getattr__(name: str):
+    # The average pixel map is opened lazily on first access
+    if name == "AVGMAP":
+        return default_artifact().map
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def is_empty(frame: Frame) -> bool:
+    """Detects whether the seat is empty using the 
+    average pixel map shipped with the package."""
+    avgmap = default_artifact()
+    return is_empty_cv2(
+        frame.empty_thumbnail, threshold=avgmap.threshold, map=avgmap.map
+    )
 
 class Pipeline(ABC):
     """
@@ -94,17 +84,75 @@ class Pipeline(ABC):
 
 class FullPipeline(Pipeline):
 
+    # Writes the visualizations in the background if set
+    viz_sink : VizSink | None = None
+    speculative_hands : bool = False
+    classifier_variant : str | None = None
+    backend : str = "torch"
+
     def __init__(self,
                  eye_model_confidence : float,
-                 hand_model_confidence : float):
-        
-        self.face_model = facedetect.load_model()
-        self.eye_model = eye.load_model()
-        self.eye_classifier = eye.load_classifier_cnn()
-        self.hand_model = hand.load_model(hand_model_confidence)
+                 hand_model_confidence : float,
+                 hand_model_size : int = 416,
+                 speculative_hands : bool = False,
+                 viz_sink : VizSink | None = None,
+                 classifier_variant : str | None = None,
+                 backend : str = "torch"):
         
+        # Models are loaded when their stage first runs
         self.eye_model_confidence = eye_model_confidence
+        self.hand_model_confidence = hand_model_confidence
+        self.hand_model_size = hand_model_size
+
+        # Latency mode: run the hand detection in parallel to the
+        # face and eye stages, and ignore it if an open eye is found
+        self.speculative_hands = speculative_hands
+
+        # Background writer for debug imagery. With a sink, every run
+        # is offered to it, and `viz` no longer blocks on the writes
+        self.viz_sink = viz_sink
+
+        # Variant of the classifier weights, e.g. "int8"
+        self.classifier_variant = classifier_variant
+
+        # "torch" or "onnx" to run the face and eye models on ONNX Runtime
+        self.backend = backend
+
+    @cached_property
+    def face_model(self) -> YOLO:
+        return facedetect.load_model(self.backend)
+
+    @cached_property
+    def eye_model(self) -> YOLO:
+        return eye.load_model(self.backend)
+
+    @cached_property
+    def eye_classifier(self) -> torch.nn.Module:
+        return eye.load_classifier_cnn(self.classifier_variant, self.backend)
+
+    @cached_property
+    def eye_frontend(self) -> eye.EyeClassifierFrontend:
+        return eye.EyeClassifierFrontend(self.eye_classifier)
+
+    @cached_property
+    def hand_model(self) -> hand.HandYOLO:
+        return hand.load_model(self.hand_model_confidence, size=self.hand_model_size)
+
+    @cached_property
+    def hand_executor(self) -> ThreadPoolExecutor:
+        return ThreadPoolExecutor(max_workers=1, thread_name_prefix="hand")
     
+    def detect_face(self, frame : Frame) -> bool:
+        """Detects the face with the largest bounding box and stores 
+        its bounding box on the frame.
+        
+        Returns 'True' if at least one face is detected."""
+        face_detected, _, face_xxyy = facedetect.detect(
+            img=frame.img, face_model=self.face_model, with_xyxy=True
+        )
+        frame.set_face(face_xxyy)
+        return face_detected
+
     def detect_hands(self, img : np.ndarray, hand_model : hand.HandYOLO) -> tuple:
         """Detects hands in an image.
         
@@ -114,7 +162,20 @@ class FullPipeline(Pipeline):
         """ 
         # Inference
         width, height, inference_time, results = hand_model.inference(img)
+        return self._hands_from_results(results)
+
+    def detect_hands_batch(self, imgs : list[np.ndarray], hand_model : hand.HandYOLO) -> list[tuple]:
+        """Detects hands in a list of images using a single forward pass.
         
+        Returns a list of tuples formatted like the output of `detect_hands`."""
+        return [
+            self._hands_from_results(results) 
+            for _, _, _, results in hand_model.inference_batch(imgs)
+        ]
+
+    def _hands_from_results(self, results : list) -> tuple:
+        """Converts the results of the hand model into the output format of `detect_hands`."""
+
         # How many hands should be shown
         hand_count = len(results)
 
@@ -123,27 +184,12 @@ class FullPipeline(Pipeline):
             id, name, confidence, x, y, w, h = r
             hand_xxyy.append((x, x+w, y, y+h))
 
-        # Testing: Display hands
-        #for detection in results[:hand_count]:
-        #    id, name, confidence, x, y, w, h = detection
-
-            # draw a bounding box rectangle and label on the image
-        #    color = (0, 255, 255)
-        #    cv2.rectangle(img, (x, y), (x + w, y + h), color, 2)
-        #    text = "%s (%s)" % (name, round(confidence, 2))
-        #    cv2.putText(img, text, (x, y - 5), cv2.FONT_HERSHEY_SIMPLEX,
-        #                0.5, color, 2)
-        #cv2.namedWindow("preview")
-        #cv2.imshow("preview", img)
-        #cv2.waitKey(0)  # Wait indefinitely until a key is pressed
-        #cv2.destroyAllWindows()
-
         if hand_count == 0:
             return False, hand_xxyy
         else:
             return True, hand_xxyy
 
-    def open_eye_clustering(self, eye_regions : list, clustering_model : Pipeline) -> bool:
+    def open_eye_clustering(self, eye_regions : list, clustering_model : SklearnPipeline) -> bool:
         """Classifies a list of eye regions (np.ndarrays) as open- or closed-eye 
         building on a clustering model (PCA + kmeans).
         
@@ -159,30 +205,15 @@ class FullPipeline(Pipeline):
         return False
 
     def open_eye_classify(self, eye_regions : list[np.ndarray], 
-                        eye_classifier : torch.nn.Module
-                        ) -> list[int]:
-        """Classifies a list of eye regions (np.ndarrays) as open- or closed-eye using a ResNet classifier.
+                        eye_classifier : torch.nn.Module | None = None
+                        ) -> np.ndarray:
+        """Classifies a list of eye regions (np.ndarrays) as open- or closed-eye 
+        in a single batched forward pass.
         
-        Returns 'True' if an open-eye is detected; False otherwise."""
-        transform = transforms.Compose([
-            transforms.Resize((20,50)), # height, width
-            transforms.ToTensor(),
-        ])
-        labels = []
-        for r in eye_regions:
-
-            # Convert the NumPy array to a PIL image with mode 'RGB'
-            pil_img = Image.fromarray(r, mode='RGB')
-
-            # Torch transform
-            torch_img = transform(pil_img).unsqueeze(0)
-
-            # Forward
-            logprobs = eye_classifier(torch_img)
-
-            # Open eyes have label 1
-            labels.append(torch.argmax(logprobs).item())
-        return labels
+        Returns an array of labels, open eyes have label 1."""
+        if eye_classifier is None or eye_classifier is self.eye_classifier:
+            return self.eye_frontend(eye_regions)
+        return eye.EyeClassifierFrontend(eye_classifier)(eye_regions)
 
     def transform_xxyy_for_cropped_img(self, 
                                        full_img : np.ndarray, 
@@ -216,69 +247,25 @@ class FullPipeline(Pipeline):
                   hands_xxyy : list, label : str, 
                   text : str) -> None:
         """Displays the whole classification pipeline by drawing bounding boxes 
-        of relevant features on the original image."""
-        
-        # Copy the original image to avoid modifying it directly
-        img_with_boxes = original_img.copy()
-
-        # Draw face bounding box
-        if face_xxyy is not None:
-            cv2.rectangle(img_with_boxes, (face_xxyy[0], face_xxyy[2]), (face_xxyy[1], face_xxyy[3]), (0, 255, 0), 2)
-
-        # Draw bounding boxes for eyes
-        for eye_xxyy in eyes_xxyy:
-            
-            # Consider the eye coordinates are for face img
-            xmin = eye_xxyy[0] + face_xxyy[0]
-            xmax = eye_xxyy[1] + face_xxyy[0]
-            ymin = eye_xxyy[2] + face_xxyy[2]
-            ymax = eye_xxyy[3] + face_xxyy[2]
-            cv2.rectangle(img_with_boxes, (xmin, ymin), (xmax, ymax), (0, 0, 255), 2)
-
-        # Draw bounding boxes for hands
-        for hand_xxyy in hands_xxyy:
-            hand_xxyy = self.transform_xxyy_for_cropped_img(
-                full_img=original_img, xxyy=hand_xxyy
-            )
-            cv2.rectangle(
-                img_with_boxes, 
-                (hand_xxyy[0], hand_xxyy[2]), 
-                (hand_xxyy[1], hand_xxyy[3]), 
-                (255, 0, 0), 
-                2
-            )
-
-        # Write some text with line breaks
-        font = cv2.FONT_HERSHEY_SIMPLEX
-        org = (20, 15)  # Position of the text
-        fontScale = 0.5
-        color = (0, 0, 0)
-        thickness = 1
-        line_type = cv2.LINE_AA
-
-        # Split the text into lines
-        lines = text.split('\n')
+        of relevant features on the original image. With a `viz_sink`, the 
+        image is drawn and written in the background."""
+        if self.viz_sink is not None:
+            self.viz_sink.submit(original_img, label, face_xxyy, eyes_xxyy, hands_xxyy, text)
+            return
 
-        # Write each line of text with appropriate line spacing
-        for i, line in enumerate(lines):
-            y = org[1] + i * 20  # Adjust spacing between lines (you can modify this value)
-            cv2.putText(img_with_boxes, line, (org[0], y), font, fontScale, color, thickness, line_type)
-
-        # Concatenate the original image and the image with bounding boxes horizontally
-        combined_img = np.hstack((original_img, img_with_boxes))
-
-        # Display the image with bounding boxes
-        #cv2.imshow("Estimate: " + label, combined_img)
-        #cv2.waitKey(0)
-        #cv2.destroyAllWindows()
+        combined_img = render(original_img, face_xxyy, eyes_xxyy, hands_xxyy, text)
 
         # Save the image with bounding boxes
-        # Change the filename and extension as needed
         output_file = "full_pipeline_eval/"+ label + "_" + str(uuid.uuid1()) + ".jpg"
         cv2.imwrite(output_file, combined_img)
 
+    @cached_property
+    def metrics(self) -> PipelineMetrics:
+        """Aggregated stage timings and counters of all runs."""
+        return PipelineMetrics()
+
     def classify(self,
-                    img_or_path : str | np.ndarray, 
+                    img_or_path : str | np.ndarray | Frame, 
                     viz : bool = False) -> PassengerState:
         """Processes the image. 
         Returns: 
@@ -288,114 +275,855 @@ class FullPipeline(Pipeline):
         
         
         Args:
-            path_to_img: Path to the image.
-            face_model: Model for face detection.
-            eye_model: Model for eye detection.
-            clustering_model: Pipeline for clustering eye regions. !Currently not in use.
-            eye_classifier: PyTorch model for eye classification.
-            hand_model: YOLO model for hand detection.
+            img_or_path: Path to the image, the decoded image or a `Frame`.
             viz: If True, the function will display the image with bounding boxes and text.
         """
+        return self.analyze(img_or_path, viz=viz).state
+
+    def analyze(self,
+                img_or_path : str | np.ndarray | Frame, 
+                viz : bool = False) -> PipelineResult:
+        """Processes the image like `classify`, but returns a `PipelineResult` 
+        with the wall time of every stage and the stage that decided the state. 
+        The result is also recorded in `metrics`."""
+        start = time.perf_counter()
+        result = self._analyze(img_or_path, PipelineResult(), viz)
+        result.total = time.perf_counter() - start
+        self.record(result)
+        return result
 
-        # Default
-        state = PassengerState.SLEEPING
-        s = ""
+    def record(self, result : PipelineResult) -> None:
+        """Records a finished result in `metrics`. Called by `analyze` 
+        and by the sink stage of `sleepiness.utility.engine.Engine`."""
+        self.metrics.record(result)
+
+    def _analyze(self,
+                 img_or_path : str | np.ndarray | Frame, 
+                 result : PipelineResult,
+                 viz : bool) -> PipelineResult:
+        """Runs the stages of the pipeline and fills in the result.
+        With 'viz', all stages run and their findings are drawn."""
+
+        # Messages drawn on the visualization
+        notes = [] if viz else None
 
         # Read image
-        if isinstance(img_or_path, str):
-            img = cv2.imread(img_or_path)
-        else: img = img_or_path
-        assert img is not None, "Could not load the image."
+        with result.timed("decode"):
+            frame = Frame.load(img_or_path)
 
-        # 1. Step: Detect whether seat is empty
-        # TODO: switch empty detection to cv2
-        if isinstance(img_or_path, str):
-            proc_for_empty = empty_preprocessor(Image.open(img_or_path))
-        else:
-            proc_for_empty = empty_preprocessor(Image.fromarray(img))
+        # Steps 1-3: Empty seat, face and open eyes
+        done, pending = self.analyze_front(frame, result, notes)
+
+        # Step 4: Hands
+        if not done or viz:
+            self.analyze_hand(frame, result, notes, pending)
+
+        # 5. Step: If none of the above situations appear, we assume the person sleeps
+        if viz:
+            self.visualize(
+                original_img=frame.img, 
+                face_xxyy=result.face_xxyy, 
+                eyes_xxyy=result.eye_xxyy, 
+                hands_xxyy=result.hand_xxyy, 
+                label=result.state.name.lower(), 
+                text="".join(note + "\n" for note in notes)
+            )
+        elif self.viz_sink is not None:
+            # Sampled by the sink, drawn and written off this thread
+            self.viz_sink.submit_result(frame.img, result)
+        return result
+
+    def analyze_front(self, 
+                      frame : Frame, 
+                      result : PipelineResult, 
+                      notes : list[str] | None = None) -> tuple[bool, Any]:
+        """Runs the empty-seat, face and eye stages on a decoded frame.
 
-        if is_empty(proc_for_empty ,threshold= 0.08, map=AVGMAP):
-            state = PassengerState.NOTTHERE
+        This and `analyze_hand` are the stages of `analyze`, which 
+        `sleepiness.utility.engine.Engine` runs on separate threads. 
+        Subclasses change how a frame is analyzed by overriding them.
+
+        Returns:
+            Whether the state is decided and the hand stage can be 
+            skipped, and what `analyze_hand` needs from this stage: 
+            with `speculative_hands`, the pending hand detection.
+            If `notes` is given, all stages run and append their findings.
+        """
+        done = self._analyze_empty(frame, result, notes)
+
+        # In latency mode, start the hand detection for occupied
+        # seats at the same time as the face and eye stages
+        hands = None
+        if self.speculative_hands and notes is None and not done:
+            hands = self._submit_hands(frame)
+
+        done = done or self._analyze_face(frame, result, notes)
+        if done and hands is not None:
+            # Decided without hands, the detection is not needed
+            hands.cancel()
+            hands = None
+        return done, hands
+
+    def analyze_hand(self, 
+                     frame : Frame, 
+                     result : PipelineResult, 
+                     notes : list[str] | None = None,
+                     pending : Any = None) -> None:
+        """Runs the hand stage on a frame `analyze_front` has not decided. 
+        `pending` is the second value it returned."""
+        detection = None
+        if pending is not None:
+            detection, result.timings["hand"] = pending.result()
+        self._analyze_hand(frame, result, notes, detection)
+
+    def _analyze_empty(self, 
+                       frame : Frame, 
+                       result : PipelineResult, 
+                       notes : list[str] | None = None) -> bool:
+        """Runs the empty-seat stage, see `analyze_front`."""
+        viz = notes is not None
+
+        # 1. Step: Detect whether seat is empty
+        with result.timed("empty"):
+            empty = is_empty(frame)
+        if empty:
+            result.decide(PassengerState.NOTTHERE, "empty")
             if not viz:
-                return state
+                return True
         if viz:
-            s += "Seat is not empty.\n"
+            notes.append("Seat is not empty.")
+        return False
+
+    def _analyze_face(self, 
+                      frame : Frame, 
+                      result : PipelineResult, 
+                      notes : list[str] | None = None) -> bool:
+        """Runs the face and eye stages, see `analyze_front`."""
+        viz = notes is not None
 
         # 2. Step: If someone is there, detect face and select the one with largest bounding box
-        face_detected, faceImg, face_xxyy = facedetect.detect(
-            img=img, face_model=self.face_model, with_xyxy=True
-        )
+        with result.timed("face"):
+            face_detected = self.detect_face(frame)
+        result.face_xxyy = frame.face_xxyy
 
         # 3. Step: Run open-eye detection on the face
         if face_detected:
 
             if viz:
-                s += "Face detected.\n"
-            eye_regions, eye_xxyy = eye.detect(
-                faceImg=faceImg, eye_model=self.eye_model, confidence=self.eye_model_confidence
-            )
+                notes.append("Face detected.")
+            with result.timed("eye_detect"):
+                eye_regions, result.eye_xxyy = eye.detect(
+                    faceImg=frame.face_crop, eye_model=self.eye_model, confidence=self.eye_model_confidence
+                )
 
             if len(eye_regions) > 0:
 
                 if viz:
-                    s += f"{len(eye_regions)} eye/s detected.\n"
+                    notes.append(f"{len(eye_regions)} eye/s detected.")
 
-                eye_labels = self.open_eye_classify(
-                    eye_regions=eye_regions, 
-                    eye_classifier=self.eye_classifier
-                )
+                with result.timed("eye_classify"):
+                    eye_labels = self.open_eye_classify(
+                        eye_regions=eye_regions, 
+                        eye_classifier=self.eye_classifier
+                    )
 
                 if any(eye_labels):
             
                     if viz:
-                        s += f"{sum(eye_labels)} open. {len(eye_labels)-sum(eye_labels)} closed. \n"
-                    state = PassengerState.AWAKE
+                        notes.append(f"{sum(eye_labels)} open. {len(eye_labels)-sum(eye_labels)} closed. ")
+                    result.decide(PassengerState.AWAKE, "eye_classify")
                     if not viz:
-                        return state
+                        return True
                 elif viz:
-                    s += "All eyes closed.\n"
+                    notes.append("All eyes closed.")
 
             elif viz:
-                s += "No eyes detected.\n"
-        else:
-            eye_xxyy = []
+                notes.append("No eyes detected.")
+        return False
 
-        # 4. Step: If no open-eyes are detected, cut image and look for hands
-        croppedImg = crop_horizontally(crop_vertically(img))
+    def _submit_hands(self, frame : Frame) -> Future:
+        """Starts `detect_hands` on the hand worker thread. The future 
+        resolves to its output and the wall time it took."""
+        img, hand_model = frame.hand_crop, self.hand_model
 
-        hands_detected, hands_xxyy = self.detect_hands(
-            img=croppedImg, hand_model=self.hand_model
-        )
+        def run() -> tuple:
+            start = time.perf_counter()
+            detection = self.detect_hands(img=img, hand_model=hand_model)
+            return detection, time.perf_counter() - start
+        return self.hand_executor.submit(run)
+
+    def _analyze_hand(self, 
+                      frame : Frame, 
+                      result : PipelineResult, 
+                      notes : list[str] | None = None,
+                      detection : tuple | None = None) -> None:
+        """Runs the hand stage on a decoded frame. If the hands have 
+        already been detected, `detection` is the output of `detect_hands`."""
+
+        # 4. Step: If no open-eyes are detected, cut image and look for hands
+        if detection is None:
+            with result.timed("hand"):
+                detection = self.detect_hands(
+                    img=frame.hand_crop, hand_model=self.hand_model
+                )
+        hands_detected, result.hand_xxyy = detection
 
         if hands_detected:
-            if viz:
-                s += "Hand/s detected in cropped image.\n"
-            state = PassengerState.AWAKE
-            if not viz:
-                return state
-        elif viz:
-            s += "No hands detected in cropped image.\n"
+            if notes is not None:
+                notes.append("Hand/s detected in cropped image.")
+            result.decide(PassengerState.AWAKE, "hand")
+        elif notes is not None:
+            notes.append("No hands detected in cropped image.")
+
+    def classify_batch(self, 
+                       imgs_or_paths : list[str | np.ndarray | Frame]
+                       ) -> list[PassengerState]:
+        """Processes a batch of images with the same logic as `classify`.
+        
+        Every stage only receives the images that have not been 
+        decided by a previous stage, and the surviving images 
+        of a stage are sent through its model as one batch.
+        
+        Returns:
+            List of PassengerStates in the same order as `imgs_or_paths`.
+        """
+        return [result.state for result in self.analyze_batch(imgs_or_paths)]
+
+    def analyze_batch(self, 
+                      imgs_or_paths : list[str | np.ndarray | Frame]
+                      ) -> list[PipelineResult]:
+        """Processes a batch of images like `classify_batch`, but returns
+        a `PipelineResult` per image. The timing of a stage is the wall 
+        time of the batched stage the image took part in, the total 
+        that of the whole batch. The results are recorded in `metrics`.
         
+        Returns:
+            List of PipelineResults in the same order as `imgs_or_paths`.
+        """
+        start = time.perf_counter()
+        results = [PipelineResult() for _ in imgs_or_paths]
+
+        @contextmanager
+        def timed(stage : str, indices : list[int]) -> Iterator[None]:
+            # Charges the wall time of a batched stage to all images in it
+            stage_start = time.perf_counter()
+            yield
+            elapsed = time.perf_counter() - stage_start
+            for i in indices:
+                results[i].timings[stage] = elapsed
+
+        # Read images
+        everything = list(range(len(imgs_or_paths)))
+        with timed("decode", everything):
+            frames = [Frame.load(img_or_path) for img_or_path in imgs_or_paths]
+
+        # 1. Step: Detect whether seats are empty
+        with timed("empty", everything):
+            empty = [is_empty(frame) for frame in frames]
+        occupied = []
+        for i, frame_empty in enumerate(empty):
+            if frame_empty:
+                results[i].decide(PassengerState.NOTTHERE, "empty")
+            else:
+                occupied.append(i)
+
+        # 2. Step: Detect faces on all occupied seats
+        with_face = []
+        if occupied:
+            with timed("face", occupied):
+                faces = facedetect.detect_batch(
+                    imgs=[frames[i].img for i in occupied], 
+                    face_model=self.face_model, 
+                    with_xyxy=True
+                )
+            for i, (face_detected, _, face_xxyy) in zip(occupied, faces):
+                frames[i].set_face(face_xxyy)
+                results[i].face_xxyy = face_xxyy
+                if face_detected:
+                    with_face.append(i)
+
+        # 3. Step: Run open-eye detection on all faces and classify
+        # the eye regions of all images in a single forward pass
+        if with_face:
+            with timed("eye_detect", with_face):
+                eyes = eye.detect_batch(
+                    faceImgs=[frames[i].face_crop for i in with_face], 
+                    eye_model=self.eye_model, 
+                    confidence=self.eye_model_confidence
+                )
+            eye_regions, owners = [], []
+            for i, (regions, eye_xxyy) in zip(with_face, eyes):
+                results[i].eye_xxyy = eye_xxyy
+                eye_regions.extend(regions)
+                owners.extend([i] * len(regions))
+
+            if eye_regions:
+                with timed("eye_classify", sorted(set(owners))):
+                    eye_labels = self.open_eye_classify(
+                        eye_regions=eye_regions, 
+                        eye_classifier=self.eye_classifier
+                    )
+                for i, label in zip(owners, eye_labels):
+                    if label:
+                        results[i].decide(PassengerState.AWAKE, "eye_classify")
+
+        # 4. Step: If no open-eyes are detected, cut images and look for hands
+        remaining = [i for i in occupied if results[i].decided_by is None]
+        if remaining:
+            with timed("hand", remaining):
+                hands = self.detect_hands_batch(
+                    imgs=[frames[i].hand_crop for i in remaining], hand_model=self.hand_model
+                )
+            for i, (hands_detected, hand_xxyy) in zip(remaining, hands):
+                results[i].hand_xxyy = hand_xxyy
+                if hands_detected:
+                    results[i].decide(PassengerState.AWAKE, "hand")
+
         # 5. Step: If none of the above situations appear, we assume the person sleeps
-        if viz:
-            self.visualize(
-                original_img=img, 
-                face_xxyy=face_xxyy, 
-                eyes_xxyy=eye_xxyy, 
-                hands_xxyy=hands_xxyy, 
-                label=state.name.lower(), 
-                text=s
-            )
+        total = time.perf_counter() - start
+        for result in results:
+            result.total = total
+            self.metrics.record(result)
+        return results
+
+class StreamingPipeline(FullPipeline):
+    """
+    Pipeline for consecutive frames of a video stream.
+
+    The face detector is only run every `detect_every` frames or
+    when the tracking confidence drops below `min_track_score`;
+    in between, the face box is carried forward by template matching.
+    Frames must be passed to `classify` in stream order.
+    """
+
+    def __init__(self,
+                 eye_model_confidence : float,
+                 hand_model_confidence : float,
+                 hand_model_size : int = 416,
+                 detect_every : int = 10,
+                 min_track_score : float = 0.6,
+                 search_margin : float = 0.5,
+                 speculative_hands : bool = False,
+                 viz_sink : VizSink | None = None,
+                 classifier_variant : str | None = None,
+                 backend : str = "torch"):
+
+        super().__init__(
+            eye_model_confidence, hand_model_confidence, hand_model_size,
+            speculative_hands=speculative_hands, viz_sink=viz_sink,
+            classifier_variant=classifier_variant, backend=backend
+        )
+        self.detect_every = detect_every
+        self.min_track_score = min_track_score
+        self.search_margin = search_margin
+
+        # Frame counters to tell whether the face stage saw the previous frame
+        self._frame_index = 0
+        self._face_index = -1
+        self._latencies = []
+
+    @cached_property
+    def face_tracker(self) -> facedetect.TrackedFaceDetector:
+        return facedetect.TrackedFaceDetector(
+            self.face_model,
+            detect_every=self.detect_every,
+            min_track_score=self.min_track_score,
+            search_margin=self.search_margin
+        )
+
+    def detect_face(self, frame : Frame) -> bool:
+        consecutive = self._face_index == self._frame_index - 1
+        self._face_index = self._frame_index
+        face_detected, face_xxyy = self.face_tracker.detect(frame.img, consecutive)
+        frame.set_face(face_xxyy)
+        return face_detected
+
+    def analyze_front(self,
+                      frame : Frame,
+                      result : PipelineResult,
+                      notes : list[str] | None = None) -> tuple[bool, Any]:
+        """Starts the next frame of the stream, see `FullPipeline.analyze_front`."""
+        self._frame_index += 1
+        return super().analyze_front(frame, result, notes)
+
+    def record(self, result : PipelineResult) -> None:
+        self._latencies.append(result.total)
+        super().record(result)
+
+    def reset(self) -> None:
+        """Starts a new stream and resets the statistics."""
+        self.face_tracker.reset()
+        self._face_index = -1
+        self._latencies = []
+
+    def stats(self) -> dict:
+        """Returns statistics of the stream so far:
+            - frames: Number of classified frames.
+            - face_frames: Number of frames that reached the face stage.
+            - detector_calls: Number of face detector runs.
+            - saved_calls: Number of face detector runs saved by tracking.
+            - mean_latency_ms, p95_latency_ms: Latency per frame.
+        """
+        latencies = np.array(self._latencies) * 1000
+        tracker = self.face_tracker
+        return {
+            "frames": len(latencies),
+            "face_frames": tracker.frames,
+            "detector_calls": tracker.detector_calls,
+            "saved_calls": tracker.saved_calls,
+            "mean_latency_ms": float(latencies.mean()) if len(latencies) else 0.,
+            "p95_latency_ms": float(np.percentile(latencies, 95)) if len(latencies) else 0.,
+        }
+
+class CabinPipeline(FullPipeline):
+    """
+    Pipeline for cabin frames showing several seats at once.
+
+    Instead of cropping the seats and classifying each crop on
+    its own, the face and hand detectors run once on the full
+    frame and their detections are assigned to the seats by a
+    `SeatLayout`. The empty-seat check runs per seat ROI, the
+    eye stage on the faces of all occupied seats as one batch.
+    The decision logic per seat is that of `FullPipeline`.
+
+    The detectors see the whole row at their input size, so
+    wide frames may need a larger `hand_model_size`.
+
+    Args:
+        layout: Default seat layout of the frames.
+        Other arguments: See `FullPipeline`.
+    """
+
+    def __init__(self,
+                 eye_model_confidence : float,
+                 hand_model_confidence : float,
+                 layout : SeatLayout | None = None,
+                 hand_model_size : int = 416,
+                 classifier_variant : str | None = None,
+                 backend : str = "torch"):
+
+        super().__init__(
+            eye_model_confidence, hand_model_confidence, hand_model_size,
+            classifier_variant=classifier_variant, backend=backend
+        )
+        self.layout = layout
+
+    def classify_cabin(self,
+                       img_or_path : str | np.ndarray | Frame,
+                       layout : SeatLayout | None = None
+                       ) -> dict[Hashable, PassengerState]:
+        """Classifies every seat of a cabin frame.
+
+        Args:
+            img_or_path: Path to the frame, the decoded frame or a `Frame`.
+            layout: Seat layout, by default the one of the pipeline.
+
+        Returns:
+            The PassengerState per seat ID.
+        """
+        return self.analyze_cabin(img_or_path, layout).states
+
+    def analyze_cabin(self,
+                      img_or_path : str | np.ndarray | Frame,
+                      layout : SeatLayout | None = None) -> CabinResult:
+        """Processes a cabin frame like `classify_cabin`, but returns a 
+        `CabinResult` with a `PipelineResult` per seat and the stage 
+        timings of the frame."""
+        layout = layout or self.layout
+        if layout is None:
+            raise ValueError("No seat layout given.")
+
+        start = time.perf_counter()
+        result = CabinResult(layout.seat_ids)
+        seats = result.seats
+
+        # Read image
+        with result.timed("decode"):
+            frame = Frame.load(img_or_path)
+
+        # 1. Step: Detect per ROI whether the seats are empty
+        with result.timed("empty"):
+            empty = layout.is_empty(frame.img)
+        occupied = []
+        for seat_id, seat_empty in zip(layout.seat_ids, empty):
+            if seat_empty:
+                seats[seat_id].decide(PassengerState.NOTTHERE, "empty")
+            else:
+                occupied.append(seat_id)
+
+        # 2. Step: Detect all faces once, every seat keeps its largest one
+        with_face = []
+        if occupied:
+            with result.timed("face"):
+                boxes = facedetect.detect_all(frame.img, self.face_model)
+                faces = layout.assign(boxes, occupied)
+            for seat_id in occupied:
+                seats[seat_id].face_xxyy = facedetect.largest_box(boxes[faces[seat_id]])
+                if seats[seat_id].face_xxyy is not None:
+                    with_face.append(seat_id)
+
+        # 3. Step: Run open-eye detection on all faces and classify
+        # the eye regions of all seats in a single forward pass
+        if with_face:
+            face_crops = []
+            for seat_id in with_face:
+                xmin, xmax, ymin, ymax = seats[seat_id].face_xxyy
+                face_crops.append(frame.img[ymin:ymax, xmin:xmax])
+            with result.timed("eye_detect"):
+                eyes = eye.detect_batch(
+                    faceImgs=face_crops, 
+                    eye_model=self.eye_model, 
+                    confidence=self.eye_model_confidence
+                )
+            eye_regions, owners = [], []
+            for seat_id, (regions, eye_xxyy) in zip(with_face, eyes):
+                seats[seat_id].eye_xxyy = eye_xxyy
+                eye_regions.extend(regions)
+                owners.extend([seat_id] * len(regions))
+
+            if eye_regions:
+                with result.timed("eye_classify"):
+                    eye_labels = self.open_eye_classify(
+                        eye_regions=eye_regions, 
+                        eye_classifier=self.eye_classifier
+                    )
+                for seat_id, label in zip(owners, eye_labels):
+                    if label:
+                        seats[seat_id].decide(PassengerState.AWAKE, "eye_classify")
+
+        # 4. Step: If no open-eyes are detected, look for hands on the whole 
+        # frame and keep those in the hand region of the undecided seats
+        remaining = [s for s in occupied if seats[s].decided_by is None]
+        if remaining:
+            with result.timed("hand"):
+                _, hands_xxyy = self.detect_hands(img=frame.img, hand_model=self.hand_model)
+                hands = layout.assign_hands(hands_xxyy, remaining)
+            for seat_id in remaining:
+                seats[seat_id].hand_xxyy = [hands_xxyy[i] for i in hands[seat_id]]
+                if seats[seat_id].hand_xxyy:
+                    seats[seat_id].decide(PassengerState.AWAKE, "hand")
+
+        # 5. Step: If none of the above situations appear, we assume the person sleeps
+        result.total = time.perf_counter() - start
+        return result
+
+class MonitoringPipeline(Pipeline):
+    """
+    Continuous monitoring of several seats with motion gating.
+
+    Wraps a pipeline and only runs it on a frame if the seat
+    has visibly changed since it was last classified, or if its
+    last classification is older than `max_age` frames. Otherwise,
+    the cached state of the seat is returned. Changes are detected
+    on the pixdiff thumbnail, which the wrapped pipeline reuses
+    for its empty-seat check.
+
+    Args:
+        pipeline: The pipeline to run on changed frames.
+        change_threshold: See `ChangeDetector`.
+        max_age: See `ChangeDetector`.
+    """
+
+    def __init__(self,
+                 pipeline : Pipeline,
+                 change_threshold : float = 0.02,
+                 max_age : int = 30):
+        self.pipeline = pipeline
+        self.changes = ChangeDetector(threshold=change_threshold, max_age=max_age)
+
+    def classify(self,
+                 img_or_path : str | np.ndarray | Frame,
+                 seat_id : Hashable = 0,
+                 viz : bool = False) -> PassengerState:
+        """Classifies the next frame of a seat, reusing the
+        last state of the seat if the frame has not changed."""
+        frame = Frame.load(img_or_path)
+        thumbnail = frame.empty_thumbnail
+
+        state = self.changes.lookup(seat_id, thumbnail)
+        if state is None:
+            state = self.pipeline.classify(frame, viz=viz)
+            self.changes.store(seat_id, thumbnail, state)
         return state
 
+    def stats(self) -> dict:
+        """Returns the number of frames answered from
+        the cache (hits) and by the pipeline (misses)."""
+        return {"hits": self.changes.hits, "misses": self.changes.misses}
+
+class CachedPipeline(FullPipeline):
+    """
+    `FullPipeline` with a content-addressed cache of the
+    final state and boxes and of every stage output.
+
+    Images are identified by the hash of their file (or array)
+    bytes, stage outputs by a fingerprint of the weights and
+    settings they depend on. Changing e.g. the hand confidence
+    therefore only reruns the hand stage, and images whose
+    stage outputs are all cached are not even decoded.
+    The empty-seat stage stores the pixel difference, so that
+    the threshold can be changed without invalidating it.
+
+    Args:
+        cache: A `ResultCache`, or the path of the SQLite database
+            to open one on. If None, an in-memory cache is used.
+        speculative_hands: Only applies to runs with visualization,
+            the cached stages run one after the other.
+        Other arguments: See `FullPipeline`.
+    """
+
+    def __init__(self,
+                 eye_model_confidence : float,
+                 hand_model_confidence : float,
+                 hand_model_size : int = 416,
+                 cache : ResultCache | str | Path | None = None,
+                 speculative_hands : bool = False,
+                 viz_sink : VizSink | None = None,
+                 classifier_variant : str | None = None,
+                 backend : str = "torch"):
+
+        super().__init__(
+            eye_model_confidence, hand_model_confidence, hand_model_size,
+            speculative_hands=speculative_hands, viz_sink=viz_sink,
+            classifier_variant=classifier_variant, backend=backend
+        )
+        if not isinstance(cache, ResultCache):
+            cache = ResultCache(cache)
+        self.cache = cache
+
+    @cached_property
+    def fingerprints(self) -> dict[str, str]:
+        """Fingerprints of the stage outputs."""
+        def weights(path : Path) -> str:
+            # The files the backend actually runs
+            return file_fingerprint(onnx_path(path) if self.backend == "onnx" else path)
+
+        fp = {}
+        fp["empty"] = file_fingerprint(DEFAULT_ARTIFACT)
+        fp["face"] = weights(facedetect.MODEL_PATH)
+        fp["eye_detect"] = fingerprint(
+            fp["face"], weights(eye.MODEL_PATH), self.eye_model_confidence
+        )
+        fp["eye_classify"] = fingerprint(
+            fp["eye_detect"], weights(eye.CNN_CLASSIFIER_PATH),
+            self.classifier_variant, 
+            file_fingerprint(scripted_path(eye.CNN_CLASSIFIER_PATH, self.classifier_variant))
+        )
+        fp["hand"] = fingerprint(
+            file_fingerprint(hand.CFG_PATH), file_fingerprint(hand.WEIGHTS_PATH),
+            self.hand_model_confidence, self.hand_model_size
+        )
+        return fp
+
+    def _stage(self, 
+               key : str, 
+               stage : str, 
+               compute : Callable[[], dict], 
+               result : PipelineResult) -> dict:
+        """Returns the cached output of a stage or computes and stores it."""
+        fp = self.fingerprints[stage]
+        decode = result.timings.get("decode", 0.)
+        with result.timed(stage):
+            value = self.cache.get(key, stage, fp)
+            if value is None:
+                value = compute()
+                self.cache.put(key, stage, fp, value)
+
+        # An image decoded on first use is only accounted to "decode"
+        result.timings[stage] -= result.timings.get("decode", 0.) - decode
+        return value
+
+    def _analyze(self,
+                 img_or_path : str | np.ndarray | Frame,
+                 result : PipelineResult,
+                 viz : bool) -> PipelineResult:
+        """Runs the stages like `FullPipeline._analyze`, reusing 
+        cached stage outputs. Visualization bypasses the cache."""
+        if viz:
+            return super()._analyze(img_or_path, result, viz)
+
+        if isinstance(img_or_path, Frame):
+            key = self._lookup(img_or_path.path or img_or_path.img, result)
+        else:
+            key = self._lookup(img_or_path, result)
+        if key is not None:
+            # The image is only decoded once a stage has to run
+            frame = None
+            def get_frame() -> Frame:
+                nonlocal frame
+                if frame is None:
+                    with result.timed("decode"):
+                        frame = Frame.load(img_or_path)
+                return frame
+
+            if not self._front_stages(key, get_frame, result):
+                self._hand_stages(key, get_frame, result)
+            self._store(key, result)
+
+        if self.viz_sink is not None:
+            # Only decoded if sampled, on a writer thread
+            self.viz_sink.submit_result(lambda: Frame.load(img_or_path).img, result)
+        return result
+
+    def analyze_front(self,
+                      frame : Frame,
+                      result : PipelineResult,
+                      notes : list[str] | None = None) -> tuple[bool, Any]:
+        """Runs the empty-seat, face and eye stages like 
+        `FullPipeline.analyze_front`, reusing cached stage outputs."""
+        if notes is not None:
+            return super().analyze_front(frame, result, notes)
+
+        key = self._lookup(frame.path or frame.img, result)
+        if key is None:
+            return True, None
+        done = self._front_stages(key, lambda: frame, result)
+        if done:
+            self._store(key, result)
+        return done, key
+
+    def analyze_hand(self,
+                     frame : Frame,
+                     result : PipelineResult,
+                     notes : list[str] | None = None,
+                     pending : Any = None) -> None:
+        """Runs the hand stage like `FullPipeline.analyze_hand`,
+        reusing its cached output."""
+        if notes is not None:
+            return super().analyze_hand(frame, result, notes, pending)
+        self._hand_stages(pending, lambda: frame, result)
+        self._store(pending, result)
+
+    def _state_fingerprint(self) -> str:
+        # Entries hold the boxes along with the state
+        return fingerprint(*self.fingerprints.values(), default_artifact().threshold, "boxes")
+
+    def _lookup(self, 
+                img_or_path : str | np.ndarray, 
+                result : PipelineResult) -> str | None:
+        """Fills in the state and the boxes of the result from the cache.
+        Returns None on a hit, otherwise the key of the image."""
+        with result.timed("cache"):
+            key = image_key(img_or_path)
+            cached = self.cache.get(key, "state", self._state_fingerprint())
+        if cached is None:
+            return key
+        result.decide(PassengerState[cached["state"]], cached.get("decided_by"))
+        result.face_xxyy = cached["face_xxyy"] and tuple(cached["face_xxyy"])
+        result.eye_xxyy = [tuple(xxyy) for xxyy in cached["eye_xxyy"]]
+        result.hand_xxyy = [tuple(xxyy) for xxyy in cached["hand_xxyy"]]
+        return None
+
+    def _store(self, key : str, result : PipelineResult) -> None:
+        """Caches the state and the boxes of a finished result."""
+        self.cache.put(
+            key, "state", self._state_fingerprint(), {
+                "state": result.state.name, 
+                "decided_by": result.decided_by,
+                "face_xxyy": result.face_xxyy,
+                "eye_xxyy": result.eye_xxyy,
+                "hand_xxyy": result.hand_xxyy,
+            }
+        )
+
+    def _front_stages(self,
+                      key : str,
+                      get_frame : Callable[[], Frame],
+                      result : PipelineResult) -> bool:
+        """Runs the cached empty-seat, face and eye stages.
+        Returns 'True' if the state is decided."""
+        avgmap = default_artifact()
+
+        # 1. Step: Detect whether seat is empty
+        empty = self._stage(key, "empty", lambda: {
+            "score": pixdiff_cv2(get_frame().empty_thumbnail, avgmap.map)
+        }, result)
+        if empty["score"] <= avgmap.threshold:
+            result.decide(PassengerState.NOTTHERE, "empty")
+            return True
+
+        # 2. Step: Detect face and select the one with largest bounding box
+        def face() -> dict:
+            self.detect_face(get_frame())
+            return {"xxyy": get_frame().face_xxyy}
+        face_xxyy = self._stage(key, "face", face, result)["xxyy"]
+        result.face_xxyy = face_xxyy and tuple(face_xxyy)
+
+        # 3. Step: Run open-eye detection on the face
+        if face_xxyy is not None:
+            eye_regions = None
+            def eye_detect() -> dict:
+                nonlocal eye_regions
+                get_frame().set_face(tuple(face_xxyy))
+                eye_regions, eye_xxyy = eye.detect(
+                    faceImg=get_frame().face_crop,
+                    eye_model=self.eye_model,
+                    confidence=self.eye_model_confidence
+                )
+                return {"xxyy": eye_xxyy}
+            eye_xxyy = self._stage(key, "eye_detect", eye_detect, result)["xxyy"]
+            result.eye_xxyy = [tuple(xxyy) for xxyy in eye_xxyy]
+
+            if len(eye_xxyy) > 0:
+                def eye_classify() -> dict:
+                    regions = eye_regions
+                    if regions is None:
+                        # Cut the regions from the cached boxes like `eye.detect`
+                        get_frame().set_face(tuple(face_xxyy))
+                        scaled = eye.maxmin_scaling(get_frame().face_crop)
+                        regions = [
+                            scaled[ymin:ymax, xmin:xmax]
+                            for xmin, xmax, ymin, ymax in eye_xxyy
+                        ]
+                    return {"labels": self.open_eye_classify(regions).tolist()}
+                eye_labels = self._stage(key, "eye_classify", eye_classify, result)["labels"]
+
+                if any(eye_labels):
+                    result.decide(PassengerState.AWAKE, "eye_classify")
+                    return True
+        return False
+
+    def _hand_stages(self,
+                     key : str,
+                     get_frame : Callable[[], Frame],
+                     result : PipelineResult) -> None:
+        """Runs the cached hand stage."""
+
+        # 4. Step: If no open-eyes are detected, cut image and look for hands
+        hands = self._stage(key, "hand", lambda: {
+            "xxyy": self.detect_hands(
+                img=get_frame().hand_crop, hand_model=self.hand_model
+            )[1]
+        }, result)
+        result.hand_xxyy = [tuple(xxyy) for xxyy in hands["xxyy"]]
+        if len(hands["xxyy"]) > 0:
+            result.decide(PassengerState.AWAKE, "hand")
+
+        # 5. Step: If none of the above situations appear, we assume the person sleeps
+
 class NoEyePipeline(FullPipeline):
     
-    def __init__(self):
-        self.face_detection = facedetect.load_model()
-        self.face_classification = smallface.load_model()
+    def __init__(self, 
+                 classifier_variant : str | None = None, 
+                 backend : str = "torch"):
+        # Models are loaded when their stage first runs
+        self.classifier_variant = classifier_variant
+        self.backend = backend
+
+    @cached_property
+    def face_detection(self) -> YOLO:
+        return facedetect.load_model(self.backend)
+
+    @cached_property
+    def face_classification(self) -> torch.nn.Module:
+        return smallface.load_model(self.classifier_variant, self.backend)
+
+    @property
+    def face_model(self) -> YOLO:
+        return self.face_detection
 
     def classify(self,
-                img_or_path : str | np.ndarray, 
+                img_or_path : str | np.ndarray | Frame, 
                 viz : bool = True) -> PassengerState:
         """Processes the image. 
         Returns: 
@@ -405,111 +1133,46 @@ class NoEyePipeline(FullPipeline):
         
         
         Args:
-            path_to_img: Path to the image.
-            face_model: Model for face detection.
-            eye_model: Model for eye detection.
-            clustering_model: Pipeline for clustering eye regions. !Currently not in use.
-            eye_classifier: PyTorch model for eye classification.
-            hand_model: YOLO model for hand detection.
+            img_or_path: Path to the image, the decoded image or a `Frame`.
             viz: If True, the function will display the image with bounding boxes and text.
         """
+        return self.analyze(img_or_path, viz=viz).state
 
-        # Default
-        state = PassengerState.SLEEPING
-        s = ""
-
-        # Read image
-        if isinstance(img_or_path, str):
-            img = cv2.imread(img_or_path)
-        else: img = img_or_path
-        assert img is not None, "Could not load the image."
-
-        # 1. Step: Detect whether seat is empty
-        # TODO: switch empty detection to cv2
-        if isinstance(img_or_path, str):
-            proc_for_empty = empty_preprocessor(Image.open(img_or_path))
-        else:
-            proc_for_empty = empty_preprocessor(Image.fromarray(img))
-
-        if is_empty(proc_for_empty ,threshold= 0.08, map=AVGMAP):
-            state = PassengerState.NOTTHERE
-            if not viz:
-                return state
-        if viz:
-            s += "Seat is not empty.\n"
+    def _analyze_face(self, 
+                      frame : Frame, 
+                      result : PipelineResult, 
+                      notes : list[str] | None = None) -> bool:
+        """Runs the face detection and face classification stages.
+        The state is always decided here."""
+        viz = notes is not None
 
         # 2. Step: If someone is there, detect face and select the one with largest bounding box
-        face_detected, faceImg, face_xxyy = facedetect.detect(
-            img=img, face_model=self.face_detection, with_xyxy=True
-        )
+        with result.timed("face"):
+            face_detected = self.detect_face(frame)
+        result.face_xxyy = frame.face_xxyy
 
-        # 3. Step: Run open-eye detection on the face
+        # 3. Step: Classify the face
         if face_detected:
 
             if viz:
-                s += "Face detected.\n"
+                notes.append("Face detected.")
 
-            # Classify the face
-            res = smallface.classify(faceImg, self.face_classification)
+            with result.timed("face_classify"):
+                res = smallface.classify(frame.face_crop, self.face_classification)
             if res == 0:
-                state = PassengerState.AWAKE
-                if not viz:
-                    return state
-                else:
-                    s += "Face classified as awake.\n"
+                result.decide(PassengerState.AWAKE, "face_classify")
+                if viz:
+                    notes.append("Face classified as awake.")
             else:
-                state = PassengerState.SLEEPING
-                if not viz:
-                    return state
-                else:
-                    s += "Face classified as sleeping.\n"
-        
-        # 5. Step: If none of the above situations appear, we assume the person sleeps
-        if viz:
-            self.visualize(
-                original_img=img, 
-                face_xxyy=face_xxyy, 
-                eyes_xxyy=[], 
-                hands_xxyy=[], 
-                label=state.name.lower(), 
-                text=s
-            )
-        return state
-
-
-def main(img_folder : str, 
-         face_model : YOLO, 
-         eye_model : YOLO, 
-         hand_model : hand.HandYOLO
-         ) -> str:
-    
-    awake_cnt = 0
-    sleep_cnt = 0
-    empty_cnt = 0
-    N = 0
-
-    for i, filename in enumerate(os.listdir(img_folder)):
-        if i % 5 == 0:
-            print(f"{i} images classified.")
-
-        output = classify_img(path_to_img=img_folder + "/" + filename, 
-                              face_model=face_model, 
-                              eye_model=eye_model,
-                              hand_model=hand_model,
-                              viz=False)
-        assert output in ["awake", "sleeping", "not there"]
-
-        if output == "awake":
-            awake_cnt += 1
-        elif output == "sleeping":
-            sleep_cnt += 1
-        else:
-            empty_cnt += 1
-        N += 1
-
-        if i == 99:
-            break
+                result.decide(PassengerState.SLEEPING, "face_classify")
+                if viz:
+                    notes.append("Face classified as sleeping.")
+        return True
 
-    print(f"Awake:    {awake_cnt} of {N} images.")
-    print(f"Sleeping: {sleep_cnt} of {N} images.")
-    print(f"Empty:    {empty_cnt} of {N} images.")
\ No newline at end of file
+    def _analyze_hand(self, 
+                      frame : Frame, 
+                      result : PipelineResult, 
+                      notes : list[str] | None = None,
+                      detection : tuple | None = None) -> None:
+        # This pipeline does not look for hands
+        pass
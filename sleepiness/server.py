@@ -0,0 +1,399 @@
+"""
+Local inference server sharing one set of models between processes.
+
+Camera processes on a host send their frames to this server
+instead of loading the face, eye, classifier and hand models
+themselves. Concurrent requests are collected into micro-batches
+of at most `--max-batch` frames, waiting at most `--max-wait-ms`
+after the first frame of a batch, which are run through
+`FullPipeline.analyze_batch` on a single worker thread.
+
+Endpoints:
+    POST /classify  A JPEG or PNG image (Content-Type image/jpeg or
+                    image/png), or a raw BGR uint8 frame
+                    (application/octet-stream) with its size in the
+                    X-Width and X-Height headers. Returns the state,
+                    the deciding stage and the stage timings as JSON.
+    GET  /stats     Batching counters and the pipeline metrics.
+    GET  /health    Returns {"status": "ok"}.
+
+The server listens on TCP (`--host`, `--port`) or, with `--unix`,
+on a Unix domain socket. See `Client` for the client side and
+`sleepiness.test.loadtest` for a load test.
+
+Usage:
+    python -m sleepiness.server --port 8765 --max-batch 8 --max-wait-ms 5
+"""
+from __future__ import annotations
+import argparse
+import http.client
+import json
+import os
+import queue
+import socket
+import socketserver
+import stat
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import cv2
+import numpy as np
+
+from sleepiness import __greeting__
+
+if TYPE_CHECKING:
+    from sleepiness.pipelines import FullPipeline
+    from sleepiness.utility.timing import PipelineResult
+
+class MicroBatcher:
+    """
+    Collects concurrently submitted frames into batches
+    for `FullPipeline.analyze_batch`.
+
+    A batch is run as soon as it holds `max_batch` frames, or
+    `max_wait` seconds after its first frame arrived. The
+    pipeline is only ever called from the batching thread.
+
+    Args:
+        pipeline: The pipeline holding the models.
+        max_batch: Maximal number of frames per batch.
+        max_wait: Maximal time in seconds a frame waits for
+            others to join its batch.
+    """
+    def __init__(self,
+                 pipeline: FullPipeline,
+                 max_batch: int = 8,
+                 max_wait: float = 0.005):
+        if max_batch < 1:
+            raise ValueError("'max_batch' must be at least 1.")
+        self.pipeline = pipeline
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.frames = 0
+        self.failures = 0
+        self.batch_sizes: dict[int, int] = {}
+        self._thread = threading.Thread(target=self._run, name="batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, img: np.ndarray) -> Future:
+        """
+        Queues a BGR image. The future resolves to its
+        `PipelineResult` and the seconds it waited for its batch.
+        """
+        future = Future()
+        self._queue.put((img, future, time.perf_counter()))
+        return future
+
+    def classify(self, img: np.ndarray) -> tuple[PipelineResult, float]:
+        """Classifies a BGR image in the next batch and waits for it."""
+        return self.submit(img).result()
+
+    def _collect(self) -> list[tuple] | None:
+        """Waits for the next batch, None once closed."""
+        item = self._queue.get()
+        if item is None:
+            return None
+        batch = [item]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Run what has been collected, then stop
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            started = time.perf_counter()
+            try:
+                results = self.pipeline.analyze_batch([img for img, _, _ in batch])
+            except Exception:
+                # Isolate the failing frames, so that one bad frame
+                # does not fail the requests batched with it
+                self._run_single(batch, started)
+                continue
+
+            with self._lock:
+                self.batches += 1
+                self.frames += len(batch)
+                self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+            for (_, future, queued), result in zip(batch, results):
+                future.set_result((result, started - queued))
+
+    def _run_single(self, batch: list[tuple], started: float) -> None:
+        """Runs the frames of a failed batch one by one."""
+        for img, future, queued in batch:
+            try:
+                result = self.pipeline.analyze_batch([img])[0]
+            except Exception as e:
+                with self._lock:
+                    self.failures += 1
+                future.set_exception(e)
+                continue
+            with self._lock:
+                self.batches += 1
+                self.frames += 1
+                self.batch_sizes[1] = self.batch_sizes.get(1, 0) + 1
+            future.set_result((result, started - queued))
+
+    def close(self) -> None:
+        """Finishes the queued frames and stops the batching thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def stats(self) -> dict:
+        """
+        Returns the number of batches, frames and failed frames,
+        the mean batch size and the number of batches per size.
+        """
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "frames": self.frames,
+                "failures": self.failures,
+                "mean_batch_size": self.frames / self.batches if self.batches else 0.,
+                "batch_sizes": dict(sorted(self.batch_sizes.items())),
+                "queued": self._queue.qsize(),
+            }
+
+def decode_request(body: bytes, content_type: str, headers) -> np.ndarray:
+    """
+    Decodes the body of a /classify request into a BGR image.
+    Raises ValueError for malformed requests.
+    """
+    if content_type == "application/octet-stream":
+        try:
+            width, height = int(headers["X-Width"]), int(headers["X-Height"])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Raw frames need the X-Width and X-Height headers.") from None
+        if width <= 0 or height <= 0:
+            raise ValueError(f"Invalid frame size {width}x{height}.")
+        if len(body) != width * height * 3:
+            raise ValueError(f"Expected {width * height * 3} bytes for a {width}x{height} BGR frame, got {len(body)}.")
+        return np.frombuffer(body, dtype=np.uint8).reshape(height, width, 3)
+
+    if content_type in ("image/jpeg", "image/png"):
+        if not body:
+            raise ValueError("The request has no image.")
+        img = cv2.imdecode(np.frombuffer(body, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None or img.size == 0:
+            raise ValueError("Could not decode the image.")
+        return img
+    raise ValueError(f"Unsupported Content-Type '{content_type}'.")
+
+def result_to_dict(result: PipelineResult, waited: float) -> dict:
+    """JSON response of a /classify request."""
+    return {
+        "state": result.state.name,
+        "decided_by": result.decided_by,
+        "timings_ms": {stage: 1e3 * t for stage, t in result.timings.items()},
+        "batch_ms": 1e3 * result.total,
+        "wait_ms": 1e3 * waited,
+    }
+
+class _Handler(BaseHTTPRequestHandler):
+
+    # Set on the subclass created by `make_server`
+    batcher: MicroBatcher
+
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        if self.path == "/health":
+            self._reply(200, {"status": "ok"})
+        elif self.path == "/stats":
+            self._reply(200, {
+                "batching": self.batcher.stats(),
+                "pipeline": self.batcher.pipeline.metrics.summary(),
+            })
+        else:
+            self._reply(404, {"error": f"Unknown path {self.path}."})
+
+    def do_POST(self) -> None:
+        if self.path != "/classify":
+            self._reply(404, {"error": f"Unknown path {self.path}."})
+            return
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        content_type = self.headers.get("Content-Type", "").split(";")[0].strip()
+        try:
+            img = decode_request(body, content_type, self.headers)
+        except ValueError as e:
+            self._reply(400, {"error": str(e)})
+            return
+        try:
+            result, waited = self.batcher.classify(img)
+        except Exception as e:
+            self._reply(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        self._reply(200, result_to_dict(result, waited))
+
+    def address_string(self) -> str:
+        # Unix socket peers have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format: str, *args) -> None:
+        # Every frame would be logged otherwise
+        pass
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """HTTP server on a Unix domain socket, one thread per connection."""
+    daemon_threads = True
+
+def make_server(batcher: MicroBatcher,
+                host: str = "127.0.0.1",
+                port: int = 8765,
+                unix: str | Path | None = None) -> socketserver.BaseServer:
+    """
+    Creates the HTTP server for a batcher, on the Unix
+    socket `unix` if given, on TCP otherwise. A stale socket
+    at `unix` is replaced, any other file is left alone.
+    """
+    handler = type("Handler", (_Handler,), {"batcher": batcher})
+    if unix is not None:
+        if os.path.lexists(unix):
+            if not stat.S_ISSOCK(os.lstat(unix).st_mode):
+                raise FileExistsError(f"{unix} exists and is not a socket.")
+            os.unlink(unix)
+        return ThreadingUnixHTTPServer(str(unix), handler)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, path: str, timeout: float | None = None):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+class Client:
+    """
+    Client of the inference server keeping one connection
+    open. Not thread-safe, use one client per thread.
+
+    Args:
+        host, port: TCP address of the server.
+        unix: Path of the Unix socket, replaces host and port.
+        timeout: Socket timeout in seconds.
+    """
+    def __init__(self,
+                 host: str = "127.0.0.1",
+                 port: int = 8765,
+                 unix: str | Path | None = None,
+                 timeout: float | None = 60.):
+        if unix is not None:
+            self.connection = _UnixHTTPConnection(str(unix), timeout)
+        else:
+            self.connection = http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def _request(self, method: str, path: str, body: bytes | None = None, headers: dict | None = None) -> dict:
+        self.connection.request(method, path, body=body, headers=headers or {})
+        response = self.connection.getresponse()
+        data = json.loads(response.read())
+        if response.status != 200:
+            raise RuntimeError(f"Server error {response.status}: {data.get('error')}")
+        return data
+
+    def classify(self, img: np.ndarray | bytes, content_type: str = "image/jpeg") -> dict:
+        """
+        Classifies an encoded image (`content_type` "image/jpeg"
+        or "image/png") or a raw BGR frame given as an array.
+
+        Returns:
+            The JSON response, see `result_to_dict`.
+        """
+        if isinstance(img, np.ndarray):
+            height, width = img.shape[:2]
+            return self._request("POST", "/classify", np.ascontiguousarray(img).tobytes(), {
+                "Content-Type": "application/octet-stream",
+                "X-Width": str(width), "X-Height": str(height),
+            })
+        return self._request("POST", "/classify", img, {"Content-Type": content_type})
+
+    def stats(self) -> dict:
+        return self._request("GET", "/stats")
+
+    def close(self) -> None:
+        self.connection.close()
+
+def serve(pipeline: FullPipeline,
+          host: str = "127.0.0.1",
+          port: int = 8765,
+          unix: str | Path | None = None,
+          max_batch: int = 8,
+          max_wait: float = 0.005) -> None:
+    """
+    Loads the models of `pipeline` and serves it until interrupted.
+    """
+    # Load all models before the first request
+    pipeline.face_model, pipeline.eye_model, pipeline.eye_classifier, pipeline.hand_model
+
+    batcher = MicroBatcher(pipeline, max_batch, max_wait)
+    server = make_server(batcher, host, port, unix)
+    where = unix if unix is not None else f"http://{host}:{port}"
+    print(f"Serving on {where}, batches of up to {max_batch} frames within {1e3 * max_wait:.1f} ms.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.close()
+        if unix is not None and os.path.lexists(unix) and stat.S_ISSOCK(os.lstat(unix).st_mode):
+            os.unlink(unix)
+
+def main(argv: list[str] | None = None) -> None:
+    from sleepiness.pipelines import FullPipeline
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", type=Path, help="Listen on this Unix socket instead of TCP.")
+    parser.add_argument("--max-batch", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=5.)
+    parser.add_argument("--eye-confidence", type=float, default=0.2)
+    parser.add_argument("--hand-confidence", type=float, default=0.5)
+    parser.add_argument("--backend", choices=["torch", "onnx"], default="torch")
+    parser.add_argument("--variant", help="Classifier variant, e.g. int8.")
+    args = parser.parse_args(argv)
+
+    print(__greeting__)
+    pipeline = FullPipeline(
+        eye_model_confidence=args.eye_confidence,
+        hand_model_confidence=args.hand_confidence,
+        classifier_variant=args.variant,
+        backend=args.backend
+    )
+    serve(pipeline, args.host, args.port, args.unix, args.max_batch, args.max_wait_ms / 1e3)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,695 @@
+"""
+Micro- and throughput benchmarks for the
+classification pipelines and their stages.
+
+Run a single benchmark by its name, e.g.:
+
+    python -m sleepiness.test.benchmark batch --folder <path>
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable
+
+import cv2
+import numpy as np
+
+from sleepiness import __path__ as p
+
+# Sample images shipped with the repository
+SAMPLE_FOLDER = Path(p[0]) / "initial_tests" / "data" / "images"
+
+def timeit(func: Callable, repeat: int = 100, warmup: int = 3) -> float:
+    """
+    Returns the median wall time of `func()` in seconds.
+    """
+    for _ in range(warmup):
+        func()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+def load_images(folder: Path, n: int | None = None) -> list[np.ndarray]:
+    """
+    Loads (at most `n`) jpg images from a folder as BGR arrays.
+    """
+    paths = sorted(Path(folder).glob("*.jpg"))[:n]
+    return [cv2.imread(str(path)) for path in paths]
+
+def bench_batch(folder: Path, n: int = 64) -> None:
+    """
+    Compares the per-image throughput of `FullPipeline.classify`
+    in a loop with `FullPipeline.classify_batch`.
+    """
+    from sleepiness.pipelines import FullPipeline
+
+    imgs = load_images(folder, n)
+    pipeline = FullPipeline(eye_model_confidence=0.2, hand_model_confidence=0.5)
+
+    t_loop = timeit(lambda: [pipeline.classify(img) for img in imgs], repeat=5)
+    t_batch = timeit(lambda: pipeline.classify_batch(imgs), repeat=5)
+
+    print(f"classify (loop): {1e3 * t_loop / len(imgs):8.2f} ms/img")
+    print(f"classify_batch:  {1e3 * t_batch / len(imgs):8.2f} ms/img")
+    print(f"Speedup:         {t_loop / t_batch:8.2f}x")
+
+def _load_avgmap() -> np.ndarray:
+    from sleepiness.empty_seat.pixdiff import default_artifact
+    return np.asarray(default_artifact().map)
+
+def check_pixdiff_parity(folder: Path, 
+                         threshold: float = 0.08,
+                         tolerance: float = 0.01) -> None:
+    """
+    Checks that the OpenCV pixdiff path reaches the same
+    empty-seat decisions as the PIL path, with scores 
+    within `tolerance` of each other.
+    """
+    from PIL import Image
+    from sleepiness.empty_seat.pixdiff import _pixdiff as pd
+
+    avgmap = _load_avgmap()
+    paths = sorted(Path(folder).glob("*.jpg"))
+    max_delta = 0.
+    for path in paths:
+        score_pil = pd.pixdiff(pd.preprocess(Image.open(path)), avgmap)
+        score_cv2 = pd.pixdiff_cv2(pd.preprocess_cv2(cv2.imread(str(path))), avgmap)
+        max_delta = max(max_delta, abs(score_pil - score_cv2))
+        assert (score_pil <= threshold) == (score_cv2 <= threshold), (
+            f"Empty-seat decision differs for {path}: "
+            f"PIL {score_pil:.4f}, cv2 {score_cv2:.4f}"
+        )
+    assert max_delta < tolerance, f"Score difference {max_delta:.4f} exceeds {tolerance}."
+    print(f"Parity ok on {len(paths)} images, max score difference {max_delta:.5f}.")
+
+def bench_pixdiff(folder: Path) -> None:
+    """
+    Compares the cost of the PIL and the OpenCV 
+    empty-seat gate on a single decoded image.
+    """
+    from PIL import Image
+    from sleepiness.empty_seat.pixdiff import _pixdiff as pd
+
+    check_pixdiff_parity(folder)
+    avgmap = _load_avgmap()
+    avgmap32 = avgmap.astype(np.float32)
+    img = load_images(folder, 1)[0]
+    pil_img = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+    thumb, thumb32 = pd.preprocess(pil_img), pd.preprocess_cv2(img)
+
+    timings = {
+        "preprocess (PIL)": lambda: pd.preprocess(pil_img),
+        "preprocess_cv2": lambda: pd.preprocess_cv2(img),
+        "pixdiff (NumPy)": lambda: pd.pixdiff(thumb, avgmap),
+        "pixdiff_cv2": lambda: pd.pixdiff_cv2(thumb32, avgmap32),
+        "is_empty (PIL, end-to-end)": 
+            lambda: pd.is_empty(pd.preprocess(pil_img), 0.08, avgmap),
+        "is_empty_cv2 (end-to-end)": 
+            lambda: pd.is_empty_cv2(pd.preprocess_cv2(img), 0.08, avgmap32),
+    }
+    for name, func in timings.items():
+        print(f"{name:<28} {1e6 * timeit(func, repeat=1000):10.1f} us")
+
+def bench_eye(folder: Path, sizes: tuple[int, ...] = (1, 2, 8, 32)) -> None:
+    """
+    Compares the per-eye cost of the former per-eye PIL/autograd
+    classification with the batched `EyeClassifierFrontend`.
+    Uses an untrained `CustomCNN`, so no weights are required.
+    """
+    import torch
+    from PIL import Image
+    from torchvision.transforms import transforms
+    from sleepiness.eye import CustomCNN, EyeClassifierFrontend
+
+    classifier = CustomCNN().eval()
+    frontend = EyeClassifierFrontend(classifier)
+    transform = transforms.Compose([
+        transforms.Resize((20,50)),
+        transforms.ToTensor(),
+    ])
+
+    def per_eye(regions):
+        labels = []
+        for r in regions:
+            torch_img = transform(Image.fromarray(r, mode='RGB')).unsqueeze(0)
+            labels.append(torch.argmax(classifier(torch_img)).item())
+        return labels
+
+    img = load_images(folder, 1)[0]
+    rng = np.random.default_rng(0)
+    for n in sizes:
+        regions = []
+        for _ in range(n):
+            y, x = rng.integers(0, img.shape[0] - 40), rng.integers(0, img.shape[1] - 90)
+            regions.append(img[y:y + rng.integers(15, 40), x:x + rng.integers(35, 90)])
+        assert list(frontend(regions)) == per_eye(regions)
+        t_old = timeit(lambda: per_eye(regions), repeat=50)
+        t_new = timeit(lambda: frontend(regions), repeat=50)
+        print(
+            f"N={n:3d}  per-eye loop: {1e6 * t_old / n:8.1f} us/eye  "
+            f"frontend: {1e6 * t_new / n:8.1f} us/eye  ({t_old / t_new:5.1f}x)"
+        )
+
+def _decode_outputs_loop(layerOutputs, iw, ih, min_confidence):
+    """
+    Former per-row Python decoding of `HandYOLO.inference`,
+    kept as reference for `bench_hand_postprocess`.
+    """
+    boxes, confidences, classIDs = [], [], []
+    for output in layerOutputs:
+        for detection in output:
+            scores = detection[5:]
+            classID = np.argmax(scores)
+            confidence = scores[classID]
+            if confidence > min_confidence:
+                box = detection[0:4] * np.array([iw, ih, iw, ih])
+                (centerX, centerY, width, height) = box.astype("int")
+                x = int(centerX - (width / 2))
+                y = int(centerY - (height / 2))
+                boxes.append([x, y, int(width), int(height)])
+                confidences.append(float(confidence))
+                classIDs.append(classID)
+    return boxes, confidences, classIDs
+
+def bench_hand_postprocess(folder: Path, size: int = 416) -> None:
+    """
+    Compares the per-row loop and the vectorized decoding of
+    synthetic Darknet YOLOv3 outputs for a `size` x `size` input.
+    """
+    from sleepiness.hand.handYolo import decode_outputs
+
+    rng = np.random.default_rng(0)
+    layerOutputs = []
+    for stride in (32, 16, 8):
+        rows = 3 * (size // stride) ** 2
+        out = rng.random((rows, 6), dtype=np.float32)
+        # Most candidates are weak, a few exceed the confidence threshold
+        out[:, 5] **= 8
+        layerOutputs.append(out)
+    iw, ih = 320, 384
+
+    boxes, confidences, classIDs = decode_outputs(layerOutputs, iw, ih, 0.5)
+    ref_boxes, ref_confidences, ref_classIDs = _decode_outputs_loop(layerOutputs, iw, ih, 0.5)
+    assert boxes.tolist() == ref_boxes
+    assert confidences.tolist() == ref_confidences
+    assert classIDs.tolist() == ref_classIDs
+
+    rows = sum(len(o) for o in layerOutputs)
+    t_loop = timeit(lambda: _decode_outputs_loop(layerOutputs, iw, ih, 0.5), repeat=20)
+    t_vec = timeit(lambda: decode_outputs(layerOutputs, iw, ih, 0.5), repeat=200)
+    print(f"{rows} candidate rows, {len(boxes)} above threshold")
+    print(f"Loop:       {1e3 * t_loop:8.3f} ms")
+    print(f"Vectorized: {1e3 * t_vec:8.3f} ms  ({t_loop / t_vec:.0f}x)")
+
+_STARTUP_SCRIPT = """
+import json, sys, time
+t0 = time.perf_counter()
+from sleepiness.pipelines import FullPipeline
+t1 = time.perf_counter()
+pipeline = FullPipeline(eye_model_confidence=0.2, hand_model_confidence=0.5)
+t2 = time.perf_counter()
+state = pipeline.classify(sys.argv[1])
+t3 = time.perf_counter()
+state = pipeline.classify(sys.argv[1])
+t4 = time.perf_counter()
+print(json.dumps(dict(
+    state=str(state), imp=t1 - t0, init=t2 - t1, first=t3 - t2, second=t4 - t3
+)))
+"""
+
+def bench_startup(folder: Path) -> None:
+    """
+    Measures, in a fresh interpreter, the time to import the
+    pipelines, construct a `FullPipeline` and run the first
+    (and a second) classification of the first image in `folder`.
+    """
+    path = str(sorted(Path(folder).glob("*.jpg"))[0])
+    proc = subprocess.run(
+        [sys.executable, "-c", _STARTUP_SCRIPT, path],
+        capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Startup benchmark failed:\n{proc.stderr}")
+    t = json.loads(proc.stdout.strip().splitlines()[-1])
+    print(f"import sleepiness.pipelines: {1e3 * t['imp']:9.1f} ms")
+    print(f"FullPipeline(...):           {1e3 * t['init']:9.1f} ms")
+    print(f"First classify ({t['state']}): {1e3 * t['first']:9.1f} ms")
+    print(f"Second classify:             {1e3 * t['second']:9.1f} ms")
+    print(f"Time to first classification: {1e3 * (t['imp'] + t['init'] + t['first']):8.1f} ms")
+
+def _empty_frame(scale: int = 6) -> np.ndarray:
+    """
+    Builds a BGR frame of an empty seat by painting the
+    average pixel map into the region the empty-seat
+    check looks at.
+    """
+    from sleepiness.empty_seat.pixdiff import _pixdiff as pd
+
+    avgmap = cv2.resize(
+        _load_avgmap(), (pd.IMAGE_WIDTH * scale, pd.IMAGE_HEIGHT * scale),
+        interpolation=cv2.INTER_NEAREST
+    )
+    grey = (255 * avgmap).astype(np.uint8)
+    # Pad so that the crops of `preprocess_cv2` cut exactly the map
+    height = int(np.ceil(grey.shape[0] / (1 - pd.CROP_BOTTOM)))
+    width = int(np.ceil(grey.shape[1] / (1 - 2 * pd.CROP_SIDES)))
+    img = np.zeros((height, width), dtype=np.uint8)
+    sides = int(width * pd.CROP_SIDES)
+    img[:grey.shape[0], sides:sides + grey.shape[1]] = grey
+    return cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+
+def check_lazy_batch(folder: Path, n: int = 8) -> None:
+    """
+    Checks that `FullPipeline.analyze_batch` loads no model
+    for a batch of empty seats, and only the face model once
+    the face stage runs.
+    """
+    from sleepiness.pipelines import FullPipeline
+
+    models = ("face_model", "eye_model", "eye_classifier", "hand_model")
+    def loaded(pipeline: FullPipeline) -> list[str]:
+        return [name for name in models if name in pipeline.__dict__]
+
+    pipeline = FullPipeline(eye_model_confidence=0.2, hand_model_confidence=0.5)
+    results = pipeline.analyze_batch([_empty_frame()] * n)
+    assert all(r.decided_by == "empty" for r in results), "The synthetic frames are not empty."
+    assert not loaded(pipeline), f"An empty batch loaded {loaded(pipeline)}."
+    print(f"Empty batch of {n}: no model loaded.")
+
+    pipeline.analyze_batch(load_images(folder, n))
+    print(f"Occupied batch of {n}: loaded {loaded(pipeline)}.")
+
+def _synthetic_stream(img: np.ndarray, n: int, amplitude: int = 6) -> list[np.ndarray]:
+    """
+    Turns a still image into `n` frames of a stream in which
+    the content slowly drifts back and forth.
+    """
+    h, w = img.shape[:2]
+    frames = []
+    for i in range(n):
+        dx = int(amplitude * np.sin(2 * np.pi * i / n))
+        dy = int(amplitude / 2 * np.cos(2 * np.pi * i / n))
+        M = np.float32([[1, 0, dx], [0, 1, dy]])
+        frames.append(cv2.warpAffine(img, M, (w, h), borderMode=cv2.BORDER_REPLICATE))
+    return frames
+
+def bench_face_tracking(folder: Path, 
+                        n_frames: int = 60, 
+                        detect_every: tuple[int, ...] = (1, 5, 10, 30)) -> None:
+    """
+    Runs the face stage on synthetic streams made from the
+    images in `folder`, detecting on every frame and with
+    tracking between detections. Reports the latency per
+    frame, the detector calls saved, and the mean IoU of
+    the tracked boxes with the boxes detected on every frame.
+    """
+    import sleepiness.face.yoloface as facedetect
+
+    face_model = facedetect.load_model()
+    streams = [_synthetic_stream(img, n_frames) for img in load_images(folder, 5)]
+
+    def iou(a, b):
+        ix = max(0, min(a[1], b[1]) - max(a[0], b[0]))
+        iy = max(0, min(a[3], b[3]) - max(a[2], b[2]))
+        inter = ix * iy
+        union = (a[1] - a[0]) * (a[3] - a[2]) + (b[1] - b[0]) * (b[3] - b[2]) - inter
+        return inter / union if union > 0 else 0.
+
+    reference = None
+    for every in detect_every:
+        detector = facedetect.TrackedFaceDetector(face_model, detect_every=every)
+        boxes, times = [], []
+        for stream in streams:
+            for j, frame in enumerate(stream):
+                start = time.perf_counter()
+                _, xxyy = detector.detect(frame, consecutive=j > 0)
+                times.append(time.perf_counter() - start)
+                boxes.append(xxyy)
+        if reference is None:
+            reference = boxes
+        ious = [
+            iou(a, b) for a, b in zip(boxes, reference) 
+            if a is not None and b is not None
+        ]
+        print(
+            f"detect_every={every:3d}: "
+            f"{1e3 * np.mean(times):7.2f} ms/frame (p95 {1e3 * np.percentile(times, 95):7.2f}), "
+            f"{detector.saved_calls}/{detector.frames} detector calls saved, "
+            f"IoU {np.mean(ious) if ious else 0.:.3f}"
+        )
+
+def bench_speculative(folder: Path, repeat: int = 3) -> None:
+    """
+    Compares the latency of `FullPipeline.analyze` with and
+    without speculative hand detection, grouped by the stage
+    that decided, and checks that the states agree.
+    """
+    from sleepiness.pipelines import FullPipeline
+
+    imgs = load_images(folder)
+    sequential = FullPipeline(eye_model_confidence=0.2, hand_model_confidence=0.5)
+    speculative = FullPipeline(
+        eye_model_confidence=0.2, hand_model_confidence=0.5, speculative_hands=True
+    )
+    for pipeline in (sequential, speculative):
+        pipeline.classify(imgs[0])
+
+    for name, pipeline in (("sequential", sequential), ("speculative", speculative)):
+        results = [pipeline.analyze(img) for _ in range(repeat) for img in imgs]
+        by_stage = {}
+        for r in results:
+            by_stage.setdefault(r.decided_by or "default", []).append(r.total)
+        print(f"{name}:")
+        for stage, totals in by_stage.items():
+            print(f"  decided by {stage:12s} {1e3 * np.median(totals):8.2f} ms (n={len(totals)})")
+
+    agree = all(
+        sequential.classify(img) == speculative.classify(img) for img in imgs
+    )
+    print(f"States agree: {agree}")
+
+def check_engine_parity(folder: Path, n_frames: int = 30) -> None:
+    """
+    Runs `StreamingPipeline` and `CachedPipeline` standalone and
+    through the threaded `Engine`, and checks that the states,
+    the face detector calls saved by tracking and the cache hits
+    agree.
+    """
+    from sleepiness.pipelines import CachedPipeline, StreamingPipeline
+    from sleepiness.utility.engine import Engine
+
+    imgs = load_images(folder)
+    stream = _synthetic_stream(imgs[0], n_frames)
+
+    def through_engine(pipeline, source) -> list:
+        jobs = []
+        Engine(pipeline, sink=jobs.append, drop=False).run(source)
+        return jobs
+
+    standalone = StreamingPipeline(eye_model_confidence=0.2, hand_model_confidence=0.5)
+    engine = StreamingPipeline(eye_model_confidence=0.2, hand_model_confidence=0.5)
+    states = [standalone.classify(frame) for frame in stream]
+    jobs = through_engine(engine, stream)
+    print(
+        f"StreamingPipeline: states agree: {states == [job.result.state for job in jobs]}, "
+        f"detector calls {standalone.stats()['detector_calls']} standalone, "
+        f"{engine.stats()['detector_calls']} through the engine"
+    )
+
+    cached = CachedPipeline(eye_model_confidence=0.2, hand_model_confidence=0.5)
+    states = [cached.classify(img) for img in imgs]
+    jobs = through_engine(cached, imgs)
+    hits = sum("empty" not in job.result.timings for job in jobs)
+    print(
+        f"CachedPipeline: states agree: {states == [job.result.state for job in jobs]}, "
+        f"{hits}/{len(jobs)} answered from the cache through the engine"
+    )
+
+def _random_classifiers() -> dict:
+    """
+    Untrained instances of the exportable classifiers,
+    used when their weights are not available.
+    """
+    import torch
+    from torchvision import models
+    from sleepiness.eye.CNN.model import CustomCNN
+    from sleepiness.eye.FFNN.model import FFNN
+    from sleepiness.face.smallCNN.model import smallCNN
+
+    resnet = models.resnet18()
+    resnet.fc = torch.nn.Sequential(
+        torch.nn.Linear(512, 64), torch.nn.ReLU(),
+        torch.nn.Linear(64, 2), torch.nn.LogSoftmax(dim=1)
+    )
+    return {
+        "eye_cnn": CustomCNN(), "eye_ffnn": FFNN(),
+        "eye_resnet": resnet, "small_face": smallCNN(),
+    }
+
+def bench_torchscript(folder: Path, batch_sizes: tuple[int, ...] = (1, 8)) -> None:
+    """
+    Compares the load time and the per-call latency of the
+    pickled eager classifiers with their TorchScript exports.
+    Classifiers without weights are benchmarked untrained.
+    """
+    import tempfile
+    import torch
+    from sleepiness.utility import export
+
+    random_models = _random_classifiers()
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, (path, shape) in export.exportable().items():
+            if not path.exists():
+                path = Path(tmp) / f"{name}.pt"
+                torch.save(random_models[name], path)
+                name += " (untrained)"
+            eager_load = timeit(lambda: torch.load(path, map_location="cpu", weights_only=False), repeat=5)
+            eager = torch.load(path, map_location="cpu", weights_only=False).eval()
+
+            ts = export.export(eager, torch.rand(shape), Path(tmp) / "artifact.pt")
+            scripted_load = timeit(lambda: torch.jit.load(ts, map_location="cpu"), repeat=5)
+            scripted = torch.jit.load(ts, map_location="cpu").eval()
+
+            print(f"{name}:")
+            print(f"  load:     eager {1e3 * eager_load:8.2f} ms, torchscript {1e3 * scripted_load:8.2f} ms")
+            for n in batch_sizes:
+                x = torch.rand((n, *shape[1:]))
+                with torch.inference_mode():
+                    t_eager = timeit(lambda: eager(x))
+                    t_scripted = timeit(lambda: scripted(x))
+                print(
+                    f"  batch {n:2d}: eager {1e3 * t_eager:8.3f} ms, "
+                    f"torchscript {1e3 * t_scripted:8.3f} ms, {t_eager / t_scripted:5.2f}x"
+                )
+
+def bench_onnx(folder: Path) -> None:
+    """
+    Compares the torch and the ONNX Runtime backend per model
+    on the images in `folder`: latency and agreement of the
+    detected boxes or predicted classes. The models are exported
+    to a temporary folder; classifiers without weights are
+    compared untrained.
+    """
+    import shutil
+    import tempfile
+    import torch
+    import sleepiness.eye as eye
+    import sleepiness.face.smallCNN as smallface
+    import sleepiness.face.yoloface as facedetect
+    from sleepiness.utility import onnxbackend
+
+    imgs = load_images(folder)
+    random_models = _random_classifiers()
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, (weights, shape) in onnxbackend.exportable().items():
+            copy = Path(tmp) / weights.name
+            if weights.exists():
+                shutil.copy(weights, copy)
+            elif shape is not None:
+                torch.save(random_models[name], copy)
+                name += " (untrained)"
+            else:
+                print(f"{name}: no weights at {weights}, skipped.")
+                continue
+
+            if shape is None:
+                from ultralytics import YOLO
+                model = YOLO(copy)
+                onnx = onnxbackend.OrtYOLO(onnxbackend.export_yolo(copy))
+                if weights == facedetect.MODEL_PATH:
+                    inputs = imgs
+                    run_torch = lambda img: facedetect.detect(img, model, with_xyxy=True)[2]
+                    run_onnx = lambda img: facedetect.detect(img, onnx, with_xyxy=True)[2]
+                else:
+                    inputs = [facedetect.detect(img, YOLO(facedetect.MODEL_PATH))[1] for img in imgs]
+                    run_torch = lambda img: eye.detect(img, model, 0.2)[1]
+                    run_onnx = lambda img: eye.detect(img, onnx, 0.2)[1]
+            else:
+                model = torch.load(copy, map_location="cpu", weights_only=False).eval()
+                onnx = onnxbackend.OrtClassifier(onnxbackend.export_classifier(copy, shape))
+                if name.startswith("eye"):
+                    frontend = eye.EyeClassifierFrontend(None)
+                    inputs = [frontend.preprocess([img[100:160, 250:400]]) for img in imgs]
+                else:
+                    inputs = [smallface.preprocess(img[50:350, 200:450])[None] for img in imgs]
+                run_torch = lambda x: model(x).argmax(1).tolist()
+                run_onnx = lambda x: onnx(x).argmax(1).tolist()
+
+            with torch.inference_mode():
+                agree = sum(run_torch(x) == run_onnx(x) for x in inputs)
+                t_torch = timeit(lambda: [run_torch(x) for x in inputs], repeat=5)
+                t_onnx = timeit(lambda: [run_onnx(x) for x in inputs], repeat=5)
+            print(
+                f"{name:24s} torch {1e3 * t_torch / len(inputs):8.3f} ms/img, "
+                f"onnx {1e3 * t_onnx / len(inputs):8.3f} ms/img, "
+                f"{t_torch / t_onnx:5.2f}x, identical outputs on {agree}/{len(inputs)}"
+            )
+
+def bench_face_engine(folder: Path) -> None:
+    """
+    Compares the face boxes and the latency of ultralytics
+    on the PyTorch weights, `OrtYOLO` and the lean `FaceEngine`
+    on the ONNX export, which is written to a temporary folder.
+    """
+    import shutil
+    import tempfile
+    from ultralytics import YOLO
+    import sleepiness.face.yoloface as facedetect
+    from sleepiness.utility import onnxbackend
+
+    imgs = load_images(folder)
+    with tempfile.TemporaryDirectory() as tmp:
+        weights = Path(tmp) / facedetect.MODEL_PATH.name
+        shutil.copy(facedetect.MODEL_PATH, weights)
+        path = onnxbackend.export_yolo(weights)
+        models = {
+            "ultralytics": YOLO(weights),
+            "OrtYOLO": onnxbackend.OrtYOLO(path),
+            "FaceEngine": facedetect.FaceEngine(path),
+        }
+
+        boxes = {
+            name: [facedetect.detect(img, model, with_xyxy=True)[2] for img in imgs]
+            for name, model in models.items()
+        }
+        for name, model in models.items():
+            t = timeit(lambda: [facedetect.detect(img, model) for img in imgs], repeat=5)
+            diffs = [
+                np.abs(np.subtract(a, b)).max() if a is not None and b is not None else 0 if a == b else np.inf
+                for a, b in zip(boxes[name], boxes["ultralytics"])
+            ]
+            print(
+                f"{name:12s} {1e3 * t / len(imgs):8.2f} ms/img, "
+                f"max deviation from ultralytics {max(diffs):.0f} px"
+            )
+
+        # Without the network, for the pre- and postprocessing alone
+        engine = models["FaceEngine"]
+        session = engine.session
+        out = session.run(None, {engine.input_name: engine._layout(imgs[0].shape)["input"]})
+        class _Cached:
+            def run(self, *args):
+                return out
+        engine.session = _Cached()
+        t_engine = timeit(lambda: engine.predict(imgs[0]))
+        engine.session = session
+        print(f"FaceEngine pre- and postprocessing: {1e3 * t_engine:.3f} ms/img")
+
+def _cabin_frame(imgs: list[np.ndarray], height: int = 480) -> tuple[np.ndarray, dict]:
+    """
+    Places the images side by side, scaled to the same
+    height, and returns the frame and the box of every seat.
+    """
+    seats = [
+        cv2.resize(img, (round(img.shape[1] * height / img.shape[0]), height))
+        for img in imgs
+    ]
+    boxes, x = {}, 0
+    for i, seat in enumerate(seats):
+        boxes[f"seat{i}"] = (x, x + seat.shape[1], 0, height)
+        x += seat.shape[1]
+    return np.hstack(seats), boxes
+
+def bench_cabin(folder: Path, seats: int = 4) -> None:
+    """
+    Compares classifying the crops of a cabin frame one by one
+    with `CabinPipeline.classify_cabin` on the full frame, on
+    frames stitched from `seats` images each, and reports how
+    often the states of the seats agree.
+    """
+    from sleepiness.pipelines import CabinPipeline
+    from sleepiness.utility.cabin import SeatLayout
+
+    imgs = load_images(folder)
+    frames = [
+        _cabin_frame(imgs[i:i + seats]) for i in range(0, len(imgs) - seats + 1, seats)
+    ]
+    pipeline = CabinPipeline(eye_model_confidence=0.2, hand_model_confidence=0.5)
+    layouts = [SeatLayout(boxes) for _, boxes in frames]
+    pipeline.classify_cabin(frames[0][0], layouts[0])
+
+    def per_seat() -> list[dict]:
+        return [
+            {s: pipeline.classify(layout.crop(frame, s)) for s in layout}
+            for (frame, _), layout in zip(frames, layouts)
+        ]
+    def cabin() -> list[dict]:
+        return [
+            pipeline.classify_cabin(frame, layout)
+            for (frame, _), layout in zip(frames, layouts)
+        ]
+
+    n = len(frames)
+    t_seat = timeit(per_seat, repeat=3, warmup=1)
+    t_cabin = timeit(cabin, repeat=3, warmup=1)
+    print(f"per seat crop: {1e3 * t_seat / n:8.2f} ms/frame ({seats} seats)")
+    print(f"cabin frame:   {1e3 * t_cabin / n:8.2f} ms/frame ({t_seat / t_cabin:.2f}x)")
+
+    agree = sum(
+        a[s] == b[s] for a, b in zip(per_seat(), cabin()) for s in a
+    )
+    print(f"States agree for {agree}/{n * seats} seats")
+    print(pipeline.analyze_cabin(frames[0][0], layouts[0]))
+
+def check_polygon_rois(folder: Path) -> None:
+    """
+    Checks that the empty-seat check of a polygon ROI ignores a
+    neighbouring seat reaching into the bounding box of the
+    polygon, while a box ROI over the same bounding box does not.
+    """
+    from sleepiness.utility.cabin import SeatLayout
+
+    rng = np.random.default_rng(0)
+    img = _empty_frame()
+    h, w = img.shape[:2]
+
+    # The neighbour covers the upper right of the box
+    neighbour = np.array([[w, 0], [w, int(0.7 * h)], [int(0.4 * w), 0]])
+    mask = np.zeros((h, w), dtype=np.uint8)
+    cv2.fillPoly(mask, [neighbour], 1)
+    img[mask.astype(bool)] = rng.integers(0, 256, (int(mask.sum()), 3))
+    # Someone sitting in the seat, inside the polygon
+    occupied = img.copy()
+    person = occupied[h // 5:3 * h // 5, w // 5:w // 2]
+    person[...] = rng.integers(0, 256, person.shape)
+
+    box = SeatLayout({"seat": [0, w, 0, h]})
+    polygon = SeatLayout({"seat": [
+        [0, 0], [int(0.4 * w) - 10, 0], [w - 1, int(0.7 * h) + 10], [w - 1, h - 1], [0, h - 1]
+    ]})
+    assert not box.is_empty(img)[0], "The neighbour does not reach into the box."
+    assert polygon.is_empty(img)[0], "The neighbour leaks into the polygon."
+    assert not polygon.is_empty(occupied)[0], "The seat inside the polygon is not seen."
+    print("Polygon ROIs ignore their neighbours.")
+
+BENCHMARKS = {
+    "batch": bench_batch,
+    "pixdiff": bench_pixdiff,
+    "pixdiff-parity": check_pixdiff_parity,
+    "eye": bench_eye,
+    "hand-postprocess": bench_hand_postprocess,
+    "startup": bench_startup,
+    "lazy-batch": check_lazy_batch,
+    "face-tracking": bench_face_tracking,
+    "speculative": bench_speculative,
+    "engine-parity": check_engine_parity,
+    "torchscript": bench_torchscript,
+    "onnx": bench_onnx,
+    "face-engine": bench_face_engine,
+    "cabin": bench_cabin,
+    "polygon-rois": check_polygon_rois,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("benchmark", choices=BENCHMARKS.keys())
+    parser.add_argument("--folder", type=Path, default=SAMPLE_FOLDER)
+    args = parser.parse_args()
+
+    BENCHMARKS[args.benchmark](args.folder)
@@ -0,0 +1,141 @@
+"""
+Load test of the inference server (`sleepiness.server`).
+
+Sends the images of a folder from several concurrent clients
+and reports the throughput and the latency per request, along
+with the batch sizes the server formed. As the baseline, the
+same images are classified in-process, one by one with
+`FullPipeline.classify` as every camera process does on its
+own today.
+
+Without `--port` or `--unix`, a server is started in this
+process on a free port, sharing the pipeline of the baseline.
+
+Usage:
+    python -m sleepiness.test.loadtest --clients 8 --requests 200
+    python -m sleepiness.test.loadtest --unix /tmp/sleepiness.sock
+"""
+from __future__ import annotations
+import argparse
+import threading
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from sleepiness.server import Client, MicroBatcher, make_server
+from sleepiness.test.benchmark import SAMPLE_FOLDER, load_images
+
+def baseline(pipeline, imgs: list[np.ndarray], n: int) -> float:
+    """
+    Classifies `n` images in-process, one at a time.
+    Returns the throughput in images per second.
+    """
+    start = time.perf_counter()
+    for i in range(n):
+        pipeline.classify(imgs[i % len(imgs)])
+    return n / (time.perf_counter() - start)
+
+def load_test(client_args: dict,
+              payloads: list[np.ndarray | bytes],
+              clients: int,
+              n: int) -> dict:
+    """
+    Sends `n` requests from `clients` threads, each with its own
+    connection. Returns the throughput, the latency percentiles
+    and the mean time the requests waited for their batch.
+    """
+    latencies, waits, errors = [], [], []
+    counter = iter(range(n))
+    lock = threading.Lock()
+
+    def worker() -> None:
+        client = Client(**client_args)
+        try:
+            while True:
+                with lock:
+                    i = next(counter, None)
+                if i is None:
+                    return
+                start = time.perf_counter()
+                try:
+                    response = client.classify(payloads[i % len(payloads)])
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                latencies.append(time.perf_counter() - start)
+                waits.append(response["wait_ms"])
+        finally:
+            client.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    ms = 1e3 * np.array(latencies)
+    return {
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(ms, 50)) if len(ms) else 0.,
+        "p95_ms": float(np.percentile(ms, 95)) if len(ms) else 0.,
+        "wait_ms": float(np.mean(waits)) if waits else 0.,
+        "errors": len(errors),
+    }
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--folder", type=Path, default=SAMPLE_FOLDER)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="Port of a running server.")
+    parser.add_argument("--unix", type=Path, help="Unix socket of a running server.")
+    parser.add_argument("--raw", action="store_true", help="Send raw frames instead of JPEGs.")
+    parser.add_argument("--max-batch", type=int, default=8, help="For the in-process server.")
+    parser.add_argument("--max-wait-ms", type=float, default=5., help="For the in-process server.")
+    args = parser.parse_args(argv)
+
+    from sleepiness.pipelines import FullPipeline
+
+    imgs = load_images(args.folder)
+    payloads = imgs if args.raw else [cv2.imencode(".jpg", img)[1].tobytes() for img in imgs]
+
+    pipeline = FullPipeline(eye_model_confidence=0.2, hand_model_confidence=0.5)
+    pipeline.classify(imgs[0])
+    rate = baseline(pipeline, imgs, args.requests)
+    print(f"in-process baseline: {rate:8.1f} img/s")
+
+    server = None
+    if args.port is None and args.unix is None:
+        batcher = MicroBatcher(pipeline, args.max_batch, args.max_wait_ms / 1e3)
+        server = make_server(batcher, args.host, 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        client_args = {"host": args.host, "port": server.server_address[1]}
+    elif args.unix is not None:
+        client_args = {"unix": args.unix}
+    else:
+        client_args = {"host": args.host, "port": args.port}
+
+    for clients in args.clients:
+        r = load_test(client_args, payloads, clients, args.requests)
+        print(
+            f"server, {clients:3d} clients: {r['throughput']:8.1f} img/s "
+            f"({r['throughput'] / rate:.2f}x), p50 {r['p50_ms']:7.1f} ms, "
+            f"p95 {r['p95_ms']:7.1f} ms, batch wait {r['wait_ms']:5.1f} ms, "
+            f"{r['errors']} errors"
+        )
+
+    client = Client(**client_args)
+    print(f"batching: {client.stats()['batching']}")
+    client.close()
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+        batcher.close()
+
+if __name__ == "__main__":
+    main()
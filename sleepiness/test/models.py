@@ -21,6 +21,7 @@ from sleepiness.empty_seat.FFNN.weights import __path__ as emptyWeightsFFNN
 import sleepiness.hand as hand
 import sleepiness.eye as eye
 import sleepiness.face as face
+import sleepiness.face.smallCNN as smallface
 
 # Import PassengerState
 from sleepiness.utility.pstate import (
@@ -32,7 +33,7 @@ from sleepiness.utility.pstate import (
 import sleepiness.pipelines as pipelines
 
 from sleepiness.empty_seat.pixdiff import (
-    __path__ as pixdiffPath , preprocess
+    default_artifact, preprocess
 )
 import sleepiness.test.utils as tutils
 from sleepiness.utility.logger import logger
@@ -194,6 +195,59 @@ class EmptyfierFFNN(EvalClassifier):
     def forward(self, x: Tensor) -> Tensor:
         return self.model(x)
     
+class EyeCNN(EvalClassifier):
+    """
+    Convolutional open-eye classifier. 
+    `variant` selects e.g. its "int8" version.
+    """
+    def __init__(self, variant: str | None = None):
+        super().__init__()
+        self.variant = variant
+    
+    def load_model(self):
+        """
+        Load the pre-trained model.
+        """
+        self.model = eye.load_classifier_cnn(self.variant)
+        return self
+    
+    @staticmethod
+    def transform(img: Image.Image) -> Tensor:
+        """
+        Preprocesses an eye image like the pipelines do.
+        """
+        bgr = np.ascontiguousarray(np.asarray(img)[..., ::-1])
+        return eye.EyeClassifierFrontend(None).preprocess([bgr])[0]
+        
+    def forward(self, x: Tensor) -> Tensor:
+        return self.model(x)
+
+class SmallFaceCNN(EvalClassifier):
+    """
+    Small CNN classifying faces as awake or sleepy. 
+    `variant` selects e.g. its "int8" version.
+    """
+    def __init__(self, variant: str | None = None):
+        super().__init__()
+        self.variant = variant
+    
+    def load_model(self):
+        """
+        Load the pre-trained model.
+        """
+        self.model = smallface.load_model(self.variant)
+        return self
+    
+    @staticmethod
+    def transform(img: Image.Image) -> Tensor:
+        """
+        Preprocesses a face image like the pipelines do.
+        """
+        return smallface.preprocess(np.ascontiguousarray(np.asarray(img)[..., ::-1]))
+        
+    def forward(self, x: Tensor) -> Tensor:
+        return self.model(x)
+
 class EmptyfierPixDiff(EvalClassifier):
     """
     Class for the empty seat detection model
@@ -213,8 +267,7 @@ class EmptyfierPixDiff(EvalClassifier):
         """
         Load the pre-trained model.
         """
-        import pickle
-        self.pixmap: np.ndarray = pickle.load(open(f"{pixdiffPath[0]}/avgmap.nparray", "rb"))
+        self.pixmap: np.ndarray = default_artifact().map
         return self
         
     def forward(self, x: Tensor) -> Tensor:
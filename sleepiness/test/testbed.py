@@ -1,3 +1,4 @@
+import argparse
 from typing import Callable
 import torch
 from torchvision import datasets
@@ -5,6 +6,7 @@ from torch.utils.data import DataLoader
 import torchvision
 
 from sleepiness.test import models
+from sleepiness.test.benchmark import timeit
 from sleepiness.test.utils import *
 
 # These imports are necessary to load the models
@@ -25,10 +27,48 @@ def create_test_dataloader(test_data_folder: str,
     test_loader = DataLoader(test_dataset, batch_size=batch_size, shuffle=True, num_workers=4)
     return test_loader
 
+def quantization_report(model_cls: type[models.EvalClassifier],
+                        test_data_folder: str,
+                        n_samples: int = 1000,
+                        batch_size: int = 32,
+                        variants: tuple = (None, "int8")):
+    """
+    Evaluates the variants of a classifier (see 
+    `sleepiness.utility.quantize`) and prints their 
+    scores and their latency on the CPU.
+    """
+    device = torch.device("cpu")
+    for variant in variants:
+        print(f"{model_cls.__name__} ({variant or 'fp32'}):")
+        model = model_cls(variant).load_model()
+        test_loader = create_test_dataloader(
+            test_data_folder, batch_size=batch_size, transform=model_cls.transform
+        )
+        model.evaluate(test_loader, device, n_samples=n_samples)
+
+        inputs, _ = next(iter(test_loader))
+        with torch.inference_mode():
+            for n in (1, len(inputs)):
+                t = timeit(lambda: model(inputs[:n]))
+                print(f"Batch {n:3d}: {1e3 * t:8.3f} ms, {1e3 * t / n:8.3f} ms/img")
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--quantization", choices=["eye", "face"],
+        help="Report accuracy and latency of the fp32 and int8 classifier instead."
+    )
+    parser.add_argument("--folder", default="pictures/balanced_correct_full/test")
+    args = parser.parse_args()
+
     # Path to your test images (organized in folders by class)
-    test_data_folder = "pictures/balanced_correct_full/test"
+    test_data_folder = args.folder
     # test_data_folder = "pictures/e2e_dataset/test"
+
+    if args.quantization:
+        model_cls = models.EyeCNN if args.quantization == "eye" else models.SmallFaceCNN
+        quantization_report(model_cls, test_data_folder, n_samples=1000)
+        raise SystemExit
     
     # Assuming CUDA is available, use GPU for evaluation; otherwise, use CPU.
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -0,0 +1,305 @@
+"""
+Seat layout of a cabin camera.
+
+A cabin camera sees a whole row of seats at once. The layout
+holds one region of interest (ROI) per seat ID, either a box
+(xmin, xmax, ymin, ymax) or a polygon of (x, y) points, in
+full-frame pixel coordinates. It crops the seats for the
+empty-seat check, which only compares the pixels inside a
+polygon, and assigns detections made on the full frame to
+the seats, see `sleepiness.pipelines.CabinPipeline`.
+"""
+from __future__ import annotations
+import json
+from pathlib import Path
+from typing import Hashable, Iterator, Sequence
+
+import cv2
+import numpy as np
+
+from sleepiness.empty_seat.pixdiff import SeatMaps, default_artifact, pixdiff_many
+from sleepiness.empty_seat.pixdiff import preprocess_cv2 as empty_preprocessor
+from sleepiness.empty_seat.pixdiff import preprocess_mask
+from sleepiness.utility.pstate import PassengerState
+from sleepiness.utility.timing import PipelineResult
+
+class SeatLayout:
+    """
+    Regions of interest of the seats seen by one camera.
+
+    A detection belongs to the seat whose ROI contains the
+    center of its box. If the ROIs of several seats contain
+    it, the seat with the closest ROI center wins.
+
+    Args:
+        rois: Per seat ID, a box (xmin, xmax, ymin, ymax)
+            or a polygon as a sequence of at least 3 (x, y) points.
+        maps: Average pixel maps per seat, built from the seat
+            crops (see `crop`). Without them, every seat is
+            compared against the map shipped with the package.
+    """
+    def __init__(self,
+                 rois: dict[Hashable, Sequence],
+                 maps: SeatMaps | None = None):
+
+        if not rois:
+            raise ValueError("The layout needs at least one seat.")
+        self.rois = {}
+        self.polygons: dict[Hashable, np.ndarray | None] = {}
+        self.boxes: dict[Hashable, tuple[int, int, int, int]] = {}
+        # Per polygon, its mask on the crop and its weights on the thumbnail
+        self._masks: dict[Hashable, tuple[np.ndarray, np.ndarray]] = {}
+        for seat_id, roi in rois.items():
+            points = np.asarray(roi, dtype=np.float32)
+            if points.shape == (4,):
+                xmin, xmax, ymin, ymax = points
+                polygon = None
+            elif points.ndim == 2 and points.shape[1] == 2 and len(points) >= 3:
+                (xmin, ymin), (xmax, ymax) = points.min(axis=0), points.max(axis=0)
+                polygon = points
+            else:
+                raise ValueError(
+                    f"The ROI of seat {seat_id!r} is neither a box nor a polygon."
+                )
+            if xmax <= xmin or ymax <= ymin or (polygon is not None and cv2.contourArea(polygon) <= 0):
+                raise ValueError(f"The ROI of seat {seat_id!r} is empty.")
+            self.rois[seat_id] = roi
+            self.polygons[seat_id] = polygon
+            self.boxes[seat_id] = (
+                int(np.floor(xmin)), int(np.ceil(xmax)), int(np.floor(ymin)), int(np.ceil(ymax))
+            )
+            if polygon is not None:
+                self._masks[seat_id] = self._polygon_mask(seat_id)
+
+        if maps is not None:
+            missing = [s for s in self.seat_ids if s not in maps]
+            if missing:
+                raise ValueError(f"No average pixel map for the seats {missing}.")
+        self.maps = maps
+
+    @classmethod
+    def load(cls, path: str | Path, maps: SeatMaps | None = None) -> SeatLayout:
+        """
+        Loads a layout saved with `save`. Seat IDs are strings.
+        """
+        with open(path) as f:
+            return cls(json.load(f), maps)
+
+    def save(self, path: str | Path) -> None:
+        """
+        Saves the ROIs as JSON. Seat IDs must be strings.
+        """
+        rois = {
+            seat_id: np.asarray(roi).tolist() for seat_id, roi in self.rois.items()
+        }
+        with open(path, "w") as f:
+            json.dump(rois, f, indent=2)
+
+    @property
+    def seat_ids(self) -> list[Hashable]:
+        return list(self.boxes)
+
+    def __len__(self) -> int:
+        return len(self.boxes)
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self.boxes)
+
+    def __contains__(self, seat_id: Hashable) -> bool:
+        return seat_id in self.boxes
+
+    def crop(self, img: np.ndarray, seat_id: Hashable) -> np.ndarray:
+        """
+        View on the bounding box of the seat's ROI, as the
+        seat would be seen by a camera of its own.
+        """
+        xmin, xmax, ymin, ymax = self.boxes[seat_id]
+        return img[max(ymin, 0):max(ymax, 0), max(xmin, 0):max(xmax, 0)]
+
+    def _polygon_mask(self, seat_id: Hashable) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the mask of the polygon on the crop of the seat, and
+        per thumbnail pixel its share of the polygon, divided by the
+        mean share, so that averaging over the thumbnail averages
+        over the polygon.
+        """
+        xmin, xmax, ymin, ymax = self.boxes[seat_id]
+        mask = np.zeros((ymax - ymin, xmax - xmin), dtype=np.uint8)
+        points = np.round(self.polygons[seat_id] - (xmin, ymin)).astype(np.int32)
+        cv2.fillPoly(mask, [points], 1)
+        mask = mask.astype(bool)
+        weights = preprocess_mask(mask)
+        if not weights.any():
+            raise ValueError(f"The ROI of seat {seat_id!r} is empty.")
+        return mask, weights / weights.mean()
+
+    def thumbnail(self, img: np.ndarray, seat_id: Hashable, map: np.ndarray) -> np.ndarray:
+        """
+        Preprocessed crop of the seat for the empty-seat check.
+
+        For a polygon ROI, only the pixels inside the polygon are
+        compared: outside it, the thumbnail takes the values of `map`,
+        the average pixel map of the seat, and the differences inside
+        are weighted so that its pixel difference to `map` is their mean.
+        The ROI must be inside the frame, see `check`.
+        """
+        crop = self.crop(img, seat_id)
+        if seat_id not in self._masks:
+            return empty_preprocessor(crop)
+
+        mask, weights = self._masks[seat_id]
+        # Neighbouring seats must not take part in the normalization
+        crop = crop.copy()
+        crop[~mask] = crop[mask].mean(axis=0)
+        thumbnail = empty_preprocessor(crop)
+        return map + (thumbnail - map) * weights
+
+    def hand_region(self, seat_id: Hashable) -> tuple[int, int, int, int]:
+        """
+        Box (xmin, xmax, ymin, ymax) of the part of the seat
+        searched for hands, the middle 50% of the upper 80%
+        of its crop like `Frame.hand_crop`.
+        """
+        xmin, xmax, ymin, ymax = self.boxes[seat_id]
+        width, height = xmax - xmin, ymax - ymin
+        return (
+            xmin + int(width * 0.25), xmin + int(width * 0.75),
+            ymin, ymin + int(height * 0.8)
+        )
+
+    def check(self, shape: tuple, seat_ids: Sequence[Hashable] | None = None) -> None:
+        """
+        Raises a ValueError naming the first seat (by default
+        of all) whose ROI is not inside a frame of `shape`.
+        """
+        height, width = shape[:2]
+        for seat_id in self.seat_ids if seat_ids is None else seat_ids:
+            xmin, xmax, ymin, ymax = self.boxes[seat_id]
+            if xmin < 0 or ymin < 0 or xmax > width or ymax > height:
+                raise ValueError(
+                    f"The ROI {(xmin, xmax, ymin, ymax)} of seat {seat_id!r} "
+                    f"is not inside the {width}x{height} frame."
+                )
+
+    def is_empty(self, img: np.ndarray, seat_ids: Sequence[Hashable] | None = None) -> np.ndarray:
+        """
+        Runs the pixdiff empty-seat check on the thumbnails of the
+        seats (by default all) of a full frame in a single reduction,
+        see `thumbnail`. Raises a ValueError if a ROI is not inside the frame.
+
+        Returns:
+            Boolean array in the order of `seat_ids`, True where the seat is empty.
+        """
+        seat_ids = self.seat_ids if seat_ids is None else list(seat_ids)
+        self.check(img.shape, seat_ids)
+        if self.maps is not None:
+            thumbnails = np.stack([self.thumbnail(img, s, self.maps[s]) for s in seat_ids])
+            return self.maps.is_empty_many(thumbnails, seat_ids)
+        avgmap = default_artifact()
+        thumbnails = np.stack([self.thumbnail(img, s, avgmap.map) for s in seat_ids])
+        return pixdiff_many(thumbnails, avgmap.map[None]) <= avgmap.threshold
+
+    def _inside(self, seat_id: Hashable, points: np.ndarray) -> np.ndarray:
+        """Returns which of the (N, 2) points lie in the ROI of the seat."""
+        xmin, xmax, ymin, ymax = self.boxes[seat_id]
+        inside = (
+            (points[:, 0] >= xmin) & (points[:, 0] <= xmax)
+            & (points[:, 1] >= ymin) & (points[:, 1] <= ymax)
+        )
+        polygon = self.polygons[seat_id]
+        if polygon is not None:
+            for i in np.flatnonzero(inside):
+                inside[i] = cv2.pointPolygonTest(polygon, tuple(map(float, points[i])), False) >= 0
+        return inside
+
+    def _assign(self,
+                points: np.ndarray,
+                seat_ids: Sequence[Hashable] | None,
+                regions: dict[Hashable, tuple[int, int, int, int]] | None = None
+                ) -> dict[Hashable, np.ndarray]:
+        """
+        Assigns the (N, 2) points to the seats whose ROI (and
+        region, if given) contains them.
+        """
+        seat_ids = self.seat_ids if seat_ids is None else list(seat_ids)
+        if len(points) == 0:
+            return {s: np.empty(0, dtype=np.intp) for s in seat_ids}
+
+        # Distance of every point to every seat, infinite outside the seat
+        distances = np.full((len(seat_ids), len(points)), np.inf)
+        for row, seat_id in enumerate(seat_ids):
+            inside = self._inside(seat_id, points)
+            if regions is not None:
+                xmin, xmax, ymin, ymax = regions[seat_id]
+                inside &= (
+                    (points[:, 0] >= xmin) & (points[:, 0] <= xmax)
+                    & (points[:, 1] >= ymin) & (points[:, 1] <= ymax)
+                )
+            xmin, xmax, ymin, ymax = self.boxes[seat_id]
+            center = np.array([(xmin + xmax) / 2, (ymin + ymax) / 2])
+            distances[row, inside] = np.hypot(*(points[inside] - center).T)
+
+        owner = distances.argmin(axis=0)
+        assigned = np.isfinite(distances.min(axis=0))
+        return {
+            seat_id: np.flatnonzero(assigned & (owner == row))
+            for row, seat_id in enumerate(seat_ids)
+        }
+
+    def assign(self,
+               xyxy: np.ndarray,
+               seat_ids: Sequence[Hashable] | None = None) -> dict[Hashable, np.ndarray]:
+        """
+        Assigns (N, 4) xyxy boxes to the seats (by default all)
+        by the centers of the boxes.
+
+        Returns:
+            Per seat ID, the indices of its boxes.
+        """
+        xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        centers = (xyxy[:, :2] + xyxy[:, 2:]) / 2
+        return self._assign(centers, seat_ids)
+
+    def assign_hands(self,
+                     hands_xxyy: Sequence[tuple[int, int, int, int]],
+                     seat_ids: Sequence[Hashable] | None = None) -> dict[Hashable, np.ndarray]:
+        """
+        Assigns (xmin, xmax, ymin, ymax) hand boxes to the seats
+        (by default all) whose `hand_region` contains their center.
+
+        Returns:
+            Per seat ID, the indices of its hands.
+        """
+        xxyy = np.asarray(hands_xxyy, dtype=np.float32).reshape(-1, 4)
+        centers = np.stack([xxyy[:, :2].mean(axis=1), xxyy[:, 2:].mean(axis=1)], axis=1)
+        seat_ids = self.seat_ids if seat_ids is None else list(seat_ids)
+        return self._assign(centers, seat_ids, {s: self.hand_region(s) for s in seat_ids})
+
+class CabinResult:
+    """
+    Outcome of a pipeline run on a cabin frame.
+
+    Attributes:
+        seats: `PipelineResult` per seat ID. Face and hand boxes
+            are in frame coordinates, eye boxes relative to the face.
+            Their timings are empty, as the stages run once per frame.
+        timings: Wall time in seconds per executed stage, for all seats.
+        total: Wall time of the whole run in seconds.
+    """
+    # Same bookkeeping as for a single seat
+    timed = PipelineResult.timed
+
+    def __init__(self, seat_ids: Sequence[Hashable]):
+        self.seats = {seat_id: PipelineResult() for seat_id in seat_ids}
+        self.timings: dict[str, float] = {}
+        self.total = 0.
+
+    def __repr__(self) -> str:
+        states = ", ".join(f"{s!r}: {r.state.name}" for s, r in self.seats.items())
+        timings = ", ".join(f"{k}={1e3 * v:.2f}ms" for k, v in self.timings.items())
+        return f"CabinResult({{{states}}}, total={1e3 * self.total:.2f}ms, {timings})"
+
+    @property
+    def states(self) -> dict[Hashable, PassengerState]:
+        """The state per seat ID."""
+        return {seat_id: r.state for seat_id, r in self.seats.items()}
@@ -0,0 +1,159 @@
+"""
+Content-addressed cache for the results of the pipeline stages.
+
+Entries are keyed by
+    - a blake2b hash of the encoded image file (or of the
+      decoded array if no file is given),
+    - the name of the stage,
+    - a fingerprint of everything the stage output depends
+      on, i.e. the model weights, the confidence settings
+      and the fingerprints of the stages it builds on.
+
+Values are small JSON documents (bounding boxes, labels,
+scores). A bounded LRU dict is kept in memory; if a path
+is given, all entries are also written to an SQLite
+database, so that they survive between runs and can be
+shared by several processes.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+# Read size for hashing files
+_CHUNK = 1 << 20
+
+def _blake2b(*parts: bytes | str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update(part.encode("utf-8") if isinstance(part, str) else part)
+        h.update(b"\0")
+    return h.hexdigest()
+
+def image_key(img_or_path: str | os.PathLike | np.ndarray) -> str:
+    """
+    Returns the hash of an image file's bytes, or of
+    the shape, dtype and bytes of a decoded image.
+    """
+    if isinstance(img_or_path, np.ndarray):
+        img = np.ascontiguousarray(img_or_path)
+        return _blake2b(str(img.shape), img.dtype.str, memoryview(img).cast("B"))
+    h = hashlib.blake2b(digest_size=16)
+    with open(img_or_path, "rb") as f:
+        while chunk := f.read(_CHUNK):
+            h.update(chunk)
+    return h.hexdigest()
+
+@lru_cache(maxsize=None)
+def _file_fingerprint(path: str, size: int, mtime_ns: int) -> str:
+    return image_key(path)
+
+def file_fingerprint(path: str | os.PathLike) -> str:
+    """
+    Returns the hash of a file's contents, e.g. of model weights.
+    Hashes are computed once per process and file version.
+    Missing files have the fingerprint "missing".
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return "missing"
+    return _file_fingerprint(str(path), stat.st_size, stat.st_mtime_ns)
+
+def fingerprint(*parts: Any) -> str:
+    """
+    Combines settings and other fingerprints into one fingerprint.
+    """
+    return _blake2b(*(repr(part) for part in parts))
+
+class ResultCache:
+    """
+    Two-level cache of stage results.
+
+    Args:
+        path: SQLite database to persist entries in.
+            If None, entries are only kept in memory.
+        maxsize: Number of entries kept in memory.
+    """
+    def __init__(self, path: str | Path | None = None, maxsize: int = 4096):
+        self.path = path
+        self.maxsize = maxsize
+        self._lru: OrderedDict[tuple[str, str, str], Any] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self._db = None
+        if path is not None:
+            self._db = sqlite3.connect(str(path), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "image TEXT, stage TEXT, fingerprint TEXT, value TEXT, "
+                "PRIMARY KEY (image, stage, fingerprint))"
+            )
+            self._db.commit()
+
+    def _remember(self, key: tuple[str, str, str], value: Any) -> None:
+        self._lru[key] = value
+        self._lru.move_to_end(key)
+        if len(self._lru) > self.maxsize:
+            self._lru.popitem(last=False)
+
+    def get(self, image: str, stage: str, fingerprint: str) -> Any | None:
+        """
+        Returns the stored value or None if there is none.
+        """
+        key = (image, stage, fingerprint)
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return self._lru[key]
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value FROM results "
+                    "WHERE image = ? AND stage = ? AND fingerprint = ?", key
+                ).fetchone()
+                if row is not None:
+                    value = json.loads(row[0])
+                    self._remember(key, value)
+                    self.hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def put(self, image: str, stage: str, fingerprint: str, value: Any) -> None:
+        """
+        Stores a JSON serializable value, which must not be None.
+        """
+        key = (image, stage, fingerprint)
+        with self._lock:
+            self._remember(key, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                    (*key, json.dumps(value))
+                )
+                self._db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def __enter__(self) -> ResultCache:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,351 @@
+"""
+Threaded stage engine for live classification.
+
+Frames flow through
+
+    capture -> decode -> front -> hand -> sink
+
+where every arrow is a bounded queue and every stage runs
+on its own thread. "front" is the empty-seat, face and eye
+part of a `FullPipeline` (`FullPipeline.analyze_front`), "hand"
+its hand detection (`FullPipeline.analyze_hand`), which only
+runs for frames the front stage has not decided.
+Since torch and cv2.dnn release the GIL, the front stage of
+one frame overlaps with the hand stage of the previous one,
+and the camera is read independently of the inference.
+
+When a queue is full, the oldest frame in it is dropped, so
+a slow stage never blocks the camera and the sink always
+receives the most recent frames. Queue depths and the number
+of dropped frames are reported by `Engine.stats`.
+
+Single-model scripts that do not run a pipeline read the camera
+with `latest_frames` instead, which only decouples the capture.
+
+Usage:
+    engine = Engine(pipeline, sink=lambda job: print(job.result))
+    engine.run(camera_frames(cv2.VideoCapture(0)))
+"""
+from __future__ import annotations
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Iterable, Iterator, TYPE_CHECKING
+
+import numpy as np
+
+from sleepiness.utility.frame import Frame
+from sleepiness.utility.timing import PipelineResult
+
+if TYPE_CHECKING:
+    import cv2
+    from sleepiness.pipelines import FullPipeline
+
+class Closed(Exception):
+    """Raised by `DropOldestQueue.get` once the queue is closed and empty."""
+
+class DropOldestQueue:
+    """
+    Bounded FIFO queue that drops its oldest item when full.
+
+    Args:
+        maxsize: Maximal number of items held.
+        drop: If False, `put` blocks while the queue is full
+            instead of dropping, e.g. for offline processing.
+    """
+    def __init__(self, maxsize: int = 2, drop: bool = True):
+        if maxsize < 1:
+            raise ValueError("'maxsize' must be at least 1.")
+        self.maxsize = maxsize
+        self.drop = drop
+        self._items: deque = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+        self.max_depth = 0
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._items)
+
+    def put(self, item: Any) -> None:
+        with self._cond:
+            if self._closed:
+                raise Closed
+            if self.drop:
+                if len(self._items) >= self.maxsize:
+                    self._items.popleft()
+                    self.dropped += 1
+            else:
+                while len(self._items) >= self.maxsize and not self._closed:
+                    self._cond.wait()
+            self._items.append(item)
+            self.max_depth = max(self.max_depth, len(self._items))
+            self._cond.notify_all()
+
+    def get(self) -> Any:
+        """
+        Returns the oldest item, waiting for one if necessary.
+        Raises `Closed` once the queue is closed and drained.
+        """
+        with self._cond:
+            while not self._items:
+                if self._closed:
+                    raise Closed
+                self._cond.wait()
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def close(self) -> None:
+        """
+        No more items will be put; waiting consumers
+        drain the remaining items and then stop.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+class Job:
+    """
+    A frame travelling through the engine.
+
+    Attributes:
+        seq: Capture sequence number.
+        source: The captured image or path.
+        frame: The decoded `Frame`, set by the decode stage.
+        result: The `PipelineResult`, filled in by the stages.
+        done: Whether the state is decided.
+        pending: What the front stage hands on to the hand stage.
+        captured: `time.perf_counter()` at capture.
+        latency: Seconds from capture to the sink.
+    """
+    __slots__ = ("seq", "source", "frame", "result", "done", "pending", "captured", "latency")
+
+    def __init__(self, seq: int, source: str | np.ndarray):
+        self.seq = seq
+        self.source = source
+        self.frame: Frame | None = None
+        self.result = PipelineResult()
+        self.done = False
+        self.pending = None
+        self.captured = time.perf_counter()
+        self.latency = 0.
+
+def camera_frames(cap: cv2.VideoCapture) -> Iterator[np.ndarray]:
+    """
+    Yields frames from a video capture until it ends.
+    """
+    while cap.isOpened():
+        ret, frame = cap.read()
+        if not ret:
+            break
+        yield frame
+
+def latest_frames(cap: cv2.VideoCapture, maxsize: int = 1) -> Iterator[np.ndarray]:
+    """
+    Yields the most recent frames of a video capture, which is
+    read on a background thread. Frames arriving while the caller
+    is busy are dropped, so the camera never waits on the caller.
+    Closing the generator stops and joins the reading thread, after
+    which the capture can be released.
+    """
+    frames = DropOldestQueue(maxsize)
+    stop = threading.Event()
+
+    def read() -> None:
+        try:
+            for frame in camera_frames(cap):
+                if stop.is_set():
+                    break
+                frames.put(frame)
+        finally:
+            frames.close()
+
+    thread = threading.Thread(target=read, name="capture", daemon=True)
+    thread.start()
+    try:
+        while True:
+            try:
+                yield frames.get()
+            except Closed:
+                return
+    finally:
+        stop.set()
+        thread.join()
+
+class Engine:
+    """
+    Runs a `FullPipeline` as a chain of threaded stages.
+
+    Args:
+        pipeline: The pipeline whose stages are run.
+        sink: Called with every finished `Job`, in capture order,
+            on the sink thread.
+        maxsize: Capacity of every queue.
+        drop: Drop the oldest frame when a queue is full (live
+            sources); otherwise producers wait (offline sources).
+    """
+    STAGES = ("decode", "front", "hand", "sink")
+
+    def __init__(self,
+                 pipeline: FullPipeline,
+                 sink: Callable[[Job], None] | None = None,
+                 maxsize: int = 2,
+                 drop: bool = True):
+
+        self.pipeline = pipeline
+        self.sink = sink
+        self.queues = {
+            stage: DropOldestQueue(maxsize, drop) for stage in self.STAGES
+        }
+        self.captured = 0
+        self.completed = 0
+        self._latencies: deque = deque(maxlen=1000)
+        self._threads: list[threading.Thread] = []
+        self._stop = threading.Event()
+        self._started = 0.
+        self._errors: list[BaseException] = []
+
+    # Stage functions, each turning a job into the job for the next stage
+
+    def _decode(self, job: Job) -> Job:
+        with job.result.timed("decode"):
+            job.frame = Frame.load(job.source)
+        return job
+
+    def _front(self, job: Job) -> Job:
+        job.done, job.pending = self.pipeline.analyze_front(job.frame, job.result)
+        return job
+
+    def _hand(self, job: Job) -> Job:
+        if not job.done:
+            self.pipeline.analyze_hand(job.frame, job.result, pending=job.pending)
+            job.done = True
+        job.pending = None
+        return job
+
+    def _finish(self, job: Job) -> None:
+        job.latency = time.perf_counter() - job.captured
+        job.result.total = sum(job.result.timings.values())
+        self.pipeline.record(job.result)
+        self.completed += 1
+        self._latencies.append(job.latency)
+        if self.pipeline.viz_sink is not None:
+            self.pipeline.viz_sink.submit_result(job.frame.img, job.result)
+        if self.sink is not None:
+            self.sink(job)
+
+    def _worker(self,
+                name: str,
+                func: Callable[[Job], Job | None],
+                inbox: DropOldestQueue,
+                outbox: DropOldestQueue | None) -> None:
+        try:
+            while True:
+                try:
+                    job = inbox.get()
+                except Closed:
+                    break
+                job = func(job)
+                if outbox is not None:
+                    outbox.put(job)
+        except BaseException as e:
+            self._errors.append(e)
+            self._stop.set()
+            # Unblock all other stages
+            for queue in self.queues.values():
+                queue.close()
+        finally:
+            if outbox is not None:
+                outbox.close()
+
+    def _capture(self, source: Iterable[str | np.ndarray]) -> None:
+        inbox = self.queues["decode"]
+        try:
+            for item in source:
+                if self._stop.is_set():
+                    break
+                inbox.put(Job(self.captured, item))
+                self.captured += 1
+        except Closed:
+            pass
+        except BaseException as e:
+            self._errors.append(e)
+        finally:
+            inbox.close()
+
+    def start(self, source: Iterable[str | np.ndarray]) -> None:
+        """
+        Starts reading `source` and processing its frames in the background.
+        """
+        q = self.queues
+        chain = [
+            ("decode", self._decode, q["decode"], q["front"]),
+            ("front", self._front, q["front"], q["hand"]),
+            ("hand", self._hand, q["hand"], q["sink"]),
+            ("sink", self._finish, q["sink"], None),
+        ]
+        self._started = time.perf_counter()
+        self._threads = [
+            threading.Thread(target=self._worker, args=args, name=args[0], daemon=True)
+            for args in chain
+        ]
+        self._threads.append(threading.Thread(
+            target=self._capture, args=(source,), name="capture", daemon=True
+        ))
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def running(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads)
+
+    def stop(self) -> None:
+        """
+        Stops capturing; frames already captured are still processed.
+        """
+        self._stop.set()
+
+    def join(self) -> None:
+        """
+        Waits until all captured frames are processed and
+        re-raises the first error raised by a stage.
+        """
+        for thread in self._threads:
+            thread.join()
+        if self._errors:
+            raise self._errors[0]
+
+    def run(self, source: Iterable[str | np.ndarray]) -> None:
+        """
+        Processes all frames of `source` and returns when done.
+        """
+        self.start(source)
+        try:
+            self.join()
+        except KeyboardInterrupt:
+            self.stop()
+            self.join()
+
+    def stats(self) -> dict:
+        """
+        Returns the current depth, the maximal depth and the
+        number of dropped frames of every queue, the number of
+        captured and completed frames, the throughput and the
+        capture-to-sink latency.
+        """
+        elapsed = time.perf_counter() - self._started if self._started else 0.
+        latencies = 1e3 * np.array(self._latencies)
+        return {
+            "captured": self.captured,
+            "completed": self.completed,
+            "dropped": sum(q.dropped for q in self.queues.values()),
+            "fps": self.completed / elapsed if elapsed > 0 else 0.,
+            "latency_p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else 0.,
+            "latency_p95_ms": float(np.percentile(latencies, 95)) if len(latencies) else 0.,
+            "queues": {
+                name: {"depth": len(q), "max_depth": q.max_depth, "dropped": q.dropped}
+                for name, q in self.queues.items()
+            },
+        }
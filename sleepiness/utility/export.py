@@ -0,0 +1,131 @@
+"""
+TorchScript artifacts of the torch classifiers.
+
+The classifiers are stored as whole pickled modules, which
+are slow to unpickle, need their class to be importable and
+run in eager mode. `export` traces a classifier with an
+example input and freezes it (weights become constants,
+dropout and other training-only code is removed) into a
+`.ts` file next to the pickled weights. `load` prefers such
+an artifact as long as it is not older than the weights it
+was exported from, and falls back to the pickled module.
+Other variants of a classifier, e.g. the INT8 one written
+by `sleepiness.utility.quantize`, are stored as `.<variant>.ts`
+and have to be selected explicitly.
+
+Usage:
+    python -m sleepiness.utility.export [eye_cnn eye_ffnn eye_resnet small_face]
+"""
+from __future__ import annotations
+import argparse
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import torch
+
+def scripted_path(path: str | Path, variant: str | None = None) -> Path:
+    """
+    Returns the path of the TorchScript artifact (of the
+    given variant) belonging to the pickled weights at `path`.
+    """
+    return Path(path).with_suffix(f".{variant}.ts" if variant else ".ts")
+
+def load(path: str | Path, variant: str | None = None) -> torch.nn.Module:
+    """
+    Loads the classifier stored at `path` on the CPU in eval mode,
+    preferring its TorchScript artifact if one is up to date. A
+    `variant` is always loaded from its artifact.
+    """
+    import torch
+
+    path = Path(path)
+    ts = scripted_path(path, variant)
+    if variant:
+        if not ts.exists():
+            raise FileNotFoundError(f"No {variant} variant of {path} at {ts}.")
+        model = torch.jit.load(ts, map_location="cpu")
+    elif ts.exists() and (not path.exists() or ts.stat().st_mtime >= path.stat().st_mtime):
+        model = torch.jit.load(ts, map_location="cpu")
+    else:
+        # The weights are pickled modules, not state dicts
+        model = torch.load(path, map_location="cpu", weights_only=False)
+        model.to("cpu")
+    model.eval()
+    return model
+
+def export(model: torch.nn.Module,
+           example: torch.Tensor,
+           path: str | Path,
+           atol: float = 1e-4,
+           variant: str | None = None) -> Path:
+    """
+    Traces and freezes `model` with the `example` input and saves
+    it as the artifact (of the given variant) of `path`. The artifact
+    is checked against the eager model on a batch of a different size.
+
+    Returns:
+        The path of the artifact.
+    """
+    import torch
+
+    model = model.to("cpu").eval()
+    with torch.no_grad():
+        frozen = torch.jit.freeze(torch.jit.trace(model, example))
+
+        batch = torch.rand((4, *example.shape[1:]))
+        if not torch.allclose(model(batch), frozen(batch), atol=atol):
+            raise RuntimeError(f"The exported model deviates from {path}.")
+
+    ts = scripted_path(path, variant)
+    torch.jit.save(frozen, ts)
+    return ts
+
+def exportable() -> dict[str, tuple[Path, tuple[int, ...]]]:
+    """
+    Returns the pickled weights and the input shape
+    of every classifier that can be exported.
+    """
+    import sleepiness.eye as eye
+    import sleepiness.face.smallCNN as smallface
+
+    eye_shape = (1, 3, eye.EyeClassifierFrontend.HEIGHT, eye.EyeClassifierFrontend.WIDTH)
+    return {
+        "eye_cnn": (eye.CNN_CLASSIFIER_PATH, eye_shape),
+        "eye_ffnn": (eye.FFNN_CLASSIFIER_PATH, eye_shape),
+        "eye_resnet": (eye.RESNET_CLASSIFIER_PATH, eye_shape),
+        "small_face": (smallface.MODEL_PATH, (1, 3, 200, 100)),
+    }
+
+def export_all(names: list[str] | None = None) -> dict[str, Path]:
+    """
+    Exports the given (by default all) classifiers whose weights
+    exist. Returns the paths of the written artifacts.
+    """
+    import torch
+
+    # The model classes must be importable to unpickle the weights
+    from sleepiness.eye.CNN.model import CustomCNN
+    from sleepiness.eye.FFNN.model import FFNN
+    from sleepiness.face.smallCNN.model import smallCNN
+
+    models = exportable()
+    written = {}
+    for name in names or models:
+        path, shape = models[name]
+        if not path.exists():
+            print(f"{name}: no weights at {path}, skipped.")
+            continue
+        model = torch.load(path, map_location="cpu", weights_only=False)
+        written[name] = export(model, torch.rand(shape), path)
+        print(f"{name}: exported to {written[name]}.")
+    return written
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("names", nargs="*", help="Classifiers to export, default all.")
+    args = parser.parse_args()
+    unknown = set(args.names) - set(exportable())
+    if unknown:
+        parser.error(f"Unknown classifiers: {', '.join(sorted(unknown))}.")
+    export_all(args.names)
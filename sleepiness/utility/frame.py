@@ -0,0 +1,112 @@
+"""
+Container for a single image that is shared by all
+stages of a classification pipeline.
+
+The image is decoded exactly once. All derived views
+(the greyscale thumbnail for the empty-seat check,
+the crop for hand detection and the face crop) are
+built lazily on first access and cached on the frame.
+"""
+from __future__ import annotations
+from functools import cached_property
+
+import cv2
+import numpy as np
+
+from sleepiness.empty_seat.pixdiff import preprocess_cv2 as empty_preprocessor
+
+def crop_vertically(img: np.ndarray) -> np.ndarray:
+    """
+    Crops the lower 20% of an image.
+
+    Args:
+        img (np.ndarray): The input image.
+
+    Returns:
+        np.ndarray: The cropped image.
+    """
+    height, width = img.shape[:2]
+    cropped_height = int(height * 0.8)
+    return img[:cropped_height, :]
+
+def crop_horizontally(img: np.ndarray) -> np.ndarray:
+    """
+    Keeps only the middle 50% of an image (horizontally).
+
+    Args:
+        img (np.ndarray): The input image.
+
+    Returns:
+        np.ndarray: The cropped image.
+    """
+    height, width = img.shape[:2]
+    xmin = int(width * 0.25)
+    xmax = int(width * 0.75)
+    return img[:, xmin:xmax]
+
+class Frame:
+    """
+    A decoded BGR image together with its cached derived views.
+
+    Use `Frame.load` to create a frame from a path,
+    an np.ndarray or an existing frame.
+    """
+    def __init__(self, img: np.ndarray, path: str | None = None):
+        assert img is not None, "Could not load the image."
+        self.img = img
+        self.path = path
+
+        # Bounding box (xmin, xmax, ymin, ymax) of the
+        # largest face, set by the face detection stage.
+        self.face_xxyy: tuple[int, int, int, int] | None = None
+
+    @classmethod
+    def load(cls, img_or_path: str | np.ndarray | Frame) -> Frame:
+        """
+        Creates a frame, decoding the image if a path is given.
+        Frames are returned as they are.
+        """
+        if isinstance(img_or_path, Frame):
+            return img_or_path
+        if isinstance(img_or_path, str):
+            return cls(cv2.imread(img_or_path), path=img_or_path)
+        return cls(img_or_path)
+
+    @property
+    def shape(self) -> tuple:
+        return self.img.shape
+
+    @cached_property
+    def empty_thumbnail(self) -> np.ndarray:
+        """
+        Downscaled, greyscaled and normalized thumbnail
+        used by the pixdiff empty-seat detection.
+        """
+        return empty_preprocessor(self.img)
+
+    @cached_property
+    def hand_crop(self) -> np.ndarray:
+        """
+        View on the upper 80% and the horizontally
+        middle 50% of the image used for hand detection.
+        """
+        return crop_horizontally(crop_vertically(self.img))
+
+    def set_face(self, face_xxyy: tuple[int, int, int, int] | None) -> None:
+        """
+        Stores the bounding box of the detected face
+        and invalidates the cached face crop.
+        """
+        self.face_xxyy = face_xxyy
+        self.__dict__.pop("face_crop", None)
+
+    @cached_property
+    def face_crop(self) -> np.ndarray | None:
+        """
+        View on the face region of the image,
+        or None if no face has been set.
+        """
+        if self.face_xxyy is None:
+            return None
+        xmin, xmax, ymin, ymax = self.face_xxyy
+        return self.img[ymin:ymax, xmin:xmax]
@@ -0,0 +1,295 @@
+"""
+ONNX Runtime backend for the pipeline models.
+
+The YOLOv8 face and eye detectors are exported with ultralytics,
+the eye and face classifiers with `torch.onnx`, to `.onnx` files
+next to their weights. All sessions run on the CPU and share
+one intra-op and one inter-op thread pool, sized once per process
+with `configure`, instead of every runtime bringing its own pools.
+
+The Darknet hand network cannot be exported to ONNX by OpenCV,
+so it stays on `cv2.dnn`, whose thread count `configure` sets to
+the intra-op size as well.
+
+Select the backend with `FullPipeline(..., backend="onnx")`.
+
+Usage:
+    python -m sleepiness.utility.onnxbackend [face eye eye_cnn small_face]
+"""
+from __future__ import annotations
+import argparse
+import ast
+import inspect
+import threading
+from pathlib import Path
+from typing import NamedTuple, TYPE_CHECKING
+
+import cv2
+import numpy as np
+
+if TYPE_CHECKING:
+    import onnxruntime
+    import torch
+
+# Sizes of the shared thread pools, 0 lets ONNX Runtime decide
+_pools = {"intra_op_threads": 0, "inter_op_threads": 0}
+_lock = threading.Lock()
+_env_created = False
+
+def onnx_path(path: str | Path) -> Path:
+    """
+    Returns the path of the ONNX export of the weights at `path`.
+    """
+    return Path(path).with_suffix(".onnx")
+
+def configure(intra_op_threads: int = 0, inter_op_threads: int = 0) -> None:
+    """
+    Sets the sizes of the thread pools shared by all sessions
+    (0 for the default) and the number of `cv2.dnn` threads.
+    Must be called before the first session is created.
+    """
+    with _lock:
+        if _env_created:
+            raise RuntimeError("The thread pools are fixed once the first session exists.")
+        _pools.update(intra_op_threads=intra_op_threads, inter_op_threads=inter_op_threads)
+    if intra_op_threads > 0:
+        cv2.setNumThreads(intra_op_threads)
+
+def create_session(path: str | Path) -> onnxruntime.InferenceSession:
+    """
+    Creates a CPU session for the model at `path`
+    that runs on the shared thread pools.
+    """
+    import onnxruntime as ort
+
+    global _env_created
+    with _lock:
+        if not _env_created:
+            ort.set_global_thread_pool_sizes(
+                _pools["intra_op_threads"], _pools["inter_op_threads"]
+            )
+            _env_created = True
+
+    options = ort.SessionOptions()
+    options.use_per_session_threads = False
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+
+class Detections(NamedTuple):
+    """
+    Detections of one image.
+
+    Attributes:
+        xyxy: (N, 4) float32 boxes in image coordinates.
+        confidence: (N,) scores.
+        class_id: (N,) class indices.
+    """
+    xyxy: np.ndarray
+    confidence: np.ndarray
+    class_id: np.ndarray
+
+class OrtYOLO:
+    """
+    YOLOv8 detection or pose model exported to ONNX.
+
+    Images are letterboxed like ultralytics does (scaled to
+    `size` on the longer side, padded to a multiple of 32),
+    keypoints of pose models are ignored.
+    """
+    def __init__(self, path: str | Path, size: int | None = None):
+        self.session = create_session(path)
+        self.input_name = self.session.get_inputs()[0].name
+        meta = self.session.get_modelmeta().custom_metadata_map
+        self.names: dict[int, str] = ast.literal_eval(meta.get("names", "{0: 'object'}"))
+        self.size = size or max(ast.literal_eval(meta.get("imgsz", "[640, 640]")))
+        self.stride = int(meta.get("stride", 32))
+
+    def _letterbox(self, img: np.ndarray) -> tuple[np.ndarray, float, tuple[int, int]]:
+        h, w = img.shape[:2]
+        scale = min(self.size / h, self.size / w)
+        nh, nw = round(h * scale), round(w * scale)
+        ph = (self.size - nh) % self.stride if nh < self.size else 0
+        pw = (self.size - nw) % self.stride if nw < self.size else 0
+        top, left = round(ph / 2 - 0.1), round(pw / 2 - 0.1)
+        if (nh, nw) != (h, w):
+            img = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+        img = cv2.copyMakeBorder(
+            img, top, ph - top, left, pw - left, cv2.BORDER_CONSTANT, value=(114, 114, 114)
+        )
+        return img, scale, (left, top)
+
+    def predict(self,
+                imgs: list[np.ndarray],
+                conf: float = 0.25,
+                iou: float = 0.7,
+                agnostic: bool = False,
+                max_det: int = 300) -> list[Detections]:
+        """
+        Detects objects on BGR images. Images of different
+        sizes are run one by one, equal ones as a batch.
+        """
+        if len(imgs) == 0:
+            return []
+        if len({img.shape for img in imgs}) > 1:
+            return [self.predict([img], conf, iou, agnostic, max_det)[0] for img in imgs]
+
+        boxed = [self._letterbox(img) for img in imgs]
+        batch = np.stack([b[0] for b in boxed])[..., ::-1].transpose(0, 3, 1, 2)
+        batch = np.ascontiguousarray(batch, dtype=np.float32) / 255
+        outputs = self.session.run(None, {self.input_name: batch})[0]
+
+        h, w = imgs[0].shape[:2]
+        return [
+            self._decode(out, scale, pad, (w, h), conf, iou, agnostic, max_det)
+            for out, (_, scale, pad) in zip(outputs, boxed)
+        ]
+
+    def _decode(self,
+                out: np.ndarray,
+                scale: float,
+                pad: tuple[int, int],
+                limits: tuple[int, int],
+                conf: float,
+                iou: float,
+                agnostic: bool,
+                max_det: int) -> Detections:
+        # (4 + classes [+ keypoints], anchors) -> per anchor rows
+        nc = len(self.names)
+        out = out[:4 + nc].T
+        scores = out[:, 4:]
+        class_id = scores.argmax(axis=1)
+        confidence = scores[np.arange(len(scores)), class_id]
+        keep = confidence > conf
+        cxcywh, confidence, class_id = out[keep, :4], confidence[keep], class_id[keep]
+
+        xywh = cxcywh.copy()
+        xywh[:, :2] -= cxcywh[:, 2:] / 2
+        # Offset the boxes per class so that NMS does not mix classes
+        shifted = xywh.copy()
+        if not agnostic:
+            shifted[:, :2] += class_id[:, None] * 7680.
+        idx = cv2.dnn.NMSBoxes(shifted.tolist(), confidence.tolist(), conf, iou, top_k=max_det)
+        idx = np.asarray(idx, dtype=np.int64).reshape(-1)
+
+        xyxy = np.empty((len(idx), 4), dtype=np.float32)
+        xyxy[:, :2] = xywh[idx, :2]
+        xyxy[:, 2:] = xywh[idx, :2] + xywh[idx, 2:]
+        xyxy[:, [0, 2]] -= pad[0]
+        xyxy[:, [1, 3]] -= pad[1]
+        xyxy /= scale
+        np.clip(xyxy, 0, [*limits, *limits], out=xyxy)
+        return Detections(xyxy, confidence[idx], class_id[idx])
+
+class OrtClassifier:
+    """
+    Classifier exported to ONNX, called like the torch module:
+    takes an (N, C, H, W) tensor and returns the (N, classes)
+    log-probabilities as a tensor.
+    """
+    def __init__(self, path: str | Path):
+        self.session = create_session(path)
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, x: torch.Tensor) -> torch.Tensor:
+        import torch
+        x = x.detach().numpy()
+        return torch.from_numpy(self.session.run(None, {self.input_name: x})[0])
+
+    def eval(self) -> OrtClassifier:
+        return self
+
+def load_yolo(weights: str | Path) -> OrtYOLO:
+    """Loads the ONNX export of YOLOv8 weights."""
+    path = onnx_path(weights)
+    if not path.exists():
+        raise FileNotFoundError(
+            f"No ONNX export at {path}, run `python -m sleepiness.utility.onnxbackend`."
+        )
+    return OrtYOLO(path)
+
+def load_classifier(weights: str | Path) -> OrtClassifier:
+    """Loads the ONNX export of classifier weights."""
+    path = onnx_path(weights)
+    if not path.exists():
+        raise FileNotFoundError(
+            f"No ONNX export at {path}, run `python -m sleepiness.utility.onnxbackend`."
+        )
+    return OrtClassifier(path)
+
+def export_yolo(weights: str | Path) -> Path:
+    """
+    Exports YOLOv8 weights to ONNX with dynamic batch and image size.
+    """
+    from ultralytics import YOLO
+
+    path = YOLO(weights).export(format="onnx", dynamic=True, simplify=False, verbose=False)
+    return Path(path)
+
+def export_classifier(weights: str | Path, shape: tuple[int, ...]) -> Path:
+    """
+    Exports a pickled classifier to ONNX with a dynamic batch size.
+    """
+    import torch
+
+    # The model classes must be importable to unpickle the weights
+    from sleepiness.eye.CNN.model import CustomCNN
+    from sleepiness.eye.FFNN.model import FFNN
+    from sleepiness.face.smallCNN.model import smallCNN
+
+    model = torch.load(weights, map_location="cpu", weights_only=False).eval()
+    path = onnx_path(weights)
+
+    # Newer torch releases default to the torch.export based exporter
+    kwargs = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    torch.onnx.export(
+        model, torch.rand(shape), path,
+        input_names=["input"], output_names=["logprobs"],
+        dynamic_axes={"input": {0: "batch"}, "logprobs": {0: "batch"}},
+        **kwargs
+    )
+    return path
+
+def exportable() -> dict[str, tuple[Path, tuple[int, ...] | None]]:
+    """
+    Returns the weights of every model that can be exported
+    and the input shape of the classifiers.
+    """
+    import sleepiness.eye as eye
+    import sleepiness.face.yoloface as facedetect
+    from sleepiness.utility import export
+
+    classifiers = export.exportable()
+    return {
+        "face": (facedetect.MODEL_PATH, None),
+        "eye": (eye.MODEL_PATH, None),
+        "eye_cnn": classifiers["eye_cnn"],
+        "small_face": classifiers["small_face"],
+    }
+
+def export_all(names: list[str] | None = None) -> dict[str, Path]:
+    """
+    Exports the given (by default all) models whose weights
+    exist. Returns the paths of the written files.
+    """
+    models = exportable()
+    written = {}
+    for name in names or models:
+        weights, shape = models[name]
+        if not weights.exists():
+            print(f"{name}: no weights at {weights}, skipped.")
+            continue
+        if shape is None:
+            written[name] = export_yolo(weights)
+        else:
+            written[name] = export_classifier(weights, shape)
+        print(f"{name}: exported to {written[name]}.")
+    return written
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("names", nargs="*", help="Models to export, default all.")
+    args = parser.parse_args()
+    unknown = set(args.names) - set(exportable())
+    if unknown:
+        parser.error(f"Unknown models: {', '.join(sorted(unknown))}.")
+    export_all(args.names)
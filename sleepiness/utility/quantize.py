@@ -0,0 +1,158 @@
+"""
+INT8 variants of the small eye and face CNNs.
+
+Most of the time of `CustomCNN` and `smallCNN` is spent in
+their first fully connected layer (about 10M weights for
+smallCNN). The linear layers are quantized dynamically, i.e.
+their weights are stored as INT8 and the activations are
+quantized on the fly. The conv layers (fused with their ReLU)
+and the pooling are quantized statically, with activation
+ranges calibrated on a held-out folder of images.
+
+The quantized model is saved as the "int8" TorchScript variant
+next to the pickled weights (see `sleepiness.utility.export`)
+and selected with e.g. `eye.load_classifier_cnn("int8")` or
+`FullPipeline(..., classifier_variant="int8")`.
+
+Usage:
+    python -m sleepiness.utility.quantize eye_cnn --calibration <folder>
+"""
+from __future__ import annotations
+import argparse
+import copy
+from pathlib import Path
+from typing import Callable, Iterable, TYPE_CHECKING
+
+import cv2
+import numpy as np
+import torch
+from torch import nn
+
+from sleepiness.utility import export
+
+if TYPE_CHECKING:
+    from torch import Tensor
+
+VARIANT = "int8"
+
+class QuantizableCNN(nn.Module):
+    """
+    Rebuilds a CNN of conv/ReLU/pool blocks followed by a
+    flatten and linear/ReLU layers, like `CustomCNN` and
+    `smallCNN`, with quantization stubs around the convs.
+    Dropout is left out, as in eval mode.
+    """
+    def __init__(self, model: nn.Module):
+        super().__init__()
+        convs = [m for m in model.children() if isinstance(m, nn.Conv2d)]
+        linears = [m for m in model.children() if isinstance(m, nn.Linear)]
+        if not convs or not linears:
+            raise ValueError(f"{type(model).__name__} has no conv and linear layers.")
+
+        self.quant = torch.ao.quantization.QuantStub()
+        self.features = nn.Sequential(*(
+            layer for conv in convs for layer in (conv, nn.ReLU(), copy.deepcopy(model.pool))
+        ))
+        self.dequant = torch.ao.quantization.DeQuantStub()
+
+        head = []
+        for linear in linears:
+            head += [linear, nn.ReLU()]
+        head[-1] = nn.LogSoftmax(dim=1)
+        self.head = nn.Sequential(*head)
+
+    def forward(self, x: Tensor) -> Tensor:
+        x = self.dequant(self.features(self.quant(x)))
+        return self.head(x.flatten(1))
+
+def quantize(model: nn.Module,
+             calibration: Iterable[Tensor],
+             backend: str = "x86") -> nn.Module:
+    """
+    Returns an INT8 copy of `model`: the convs are quantized
+    statically with ranges observed on the `calibration` batches,
+    the linear layers dynamically.
+    """
+    model = QuantizableCNN(copy.deepcopy(model).eval()).eval()
+    torch.backends.quantized.engine = backend
+
+    # Fuse every conv with its ReLU
+    n_blocks = len(model.features) // 3
+    torch.ao.quantization.fuse_modules(
+        model.features, [[str(3 * i), str(3 * i + 1)] for i in range(n_blocks)], inplace=True
+    )
+    model.qconfig = None
+    for module in (model.quant, model.features, model.dequant):
+        module.qconfig = torch.ao.quantization.get_default_qconfig(backend)
+    torch.ao.quantization.prepare(model, inplace=True)
+
+    with torch.no_grad():
+        for batch in calibration:
+            model(batch)
+    torch.ao.quantization.convert(model, inplace=True)
+
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+def preprocessors() -> dict[str, Callable[[list[np.ndarray]], Tensor]]:
+    """
+    Returns, per quantizable classifier, the function turning BGR
+    images into its input batch, as used by the pipelines.
+    """
+    import sleepiness.eye as eye
+    import sleepiness.face.smallCNN as smallface
+
+    return {
+        "eye_cnn": eye.EyeClassifierFrontend(None).preprocess,
+        "small_face": lambda imgs: torch.stack([smallface.preprocess(img) for img in imgs]),
+    }
+
+def calibration_batches(folder: str | Path,
+                        preprocess: Callable[[list[np.ndarray]], Tensor],
+                        n: int = 256,
+                        batch_size: int = 32) -> list[Tensor]:
+    """
+    Returns the preprocessed first `n` images (sorted by path)
+    below `folder` in batches.
+    """
+    paths = sorted(
+        path for path in Path(folder).rglob("*")
+        if path.suffix.lower() in (".jpg", ".jpeg", ".png")
+    )[:n]
+    if not paths:
+        raise FileNotFoundError(f"No calibration images in {folder}.")
+    imgs = [cv2.imread(str(path)) for path in paths]
+    return [preprocess(imgs[i:i + batch_size]) for i in range(0, len(imgs), batch_size)]
+
+def quantize_classifier(name: str, folder: str | Path, n: int = 256) -> Path:
+    """
+    Quantizes the classifier `name` ("eye_cnn" or "small_face")
+    with the images in `folder` and saves its INT8 variant.
+    Prints how often it agrees with the original on them.
+
+    Returns:
+        The path of the artifact.
+    """
+    from sleepiness.eye.CNN.model import CustomCNN
+    from sleepiness.face.smallCNN.model import smallCNN
+
+    path, shape = export.exportable()[name]
+    model = torch.load(path, map_location="cpu", weights_only=False).eval()
+    batches = calibration_batches(folder, preprocessors()[name], n)
+    qmodel = quantize(model, batches)
+
+    with torch.no_grad():
+        agree = sum(
+            int((model(b).argmax(1) == qmodel(b).argmax(1)).sum()) for b in batches
+        )
+    total = sum(len(b) for b in batches)
+    print(f"{name}: INT8 agrees with FP32 on {agree}/{total} calibration images.")
+
+    return export.export(qmodel, torch.rand(shape), path, variant=VARIANT)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("name", choices=["eye_cnn", "small_face"])
+    parser.add_argument("--calibration", type=Path, required=True, help="Folder of held-out images.")
+    parser.add_argument("-n", type=int, default=256, help="Number of calibration images.")
+    args = parser.parse_args()
+    print(f"Written to {quantize_classifier(args.name, args.calibration, args.n)}.")
@@ -1,5 +1,6 @@
 import cv2
 from sleepiness.pipelines import NoEyePipeline
+from sleepiness.utility.engine import Engine, camera_frames
 
 # Load trained model
 #model = torch.hub.load('ultralytics/yolov5', 'custom', path='yolov5/runs/train/exp2/weights/last.pt', force_reload=True)
@@ -18,22 +19,30 @@ model = NoEyePipeline()
 # Access camera
 cap = cv2.VideoCapture("/dev/video0")
 
-while cap.isOpened():
+# Capture and inference run on their own threads,
+# the latest classified frame is displayed here
+latest = {}
+engine = Engine(model, sink=lambda job: latest.update(job=job))
+engine.start(camera_frames(cap))
 
-    # Read current frame
-    ret, frame = cap.read()
-    # Make detections 
-    result = model.classify(frame)
-    
-    # Write a text in the top right corner
-    cv2.putText(frame, f"{result}", (10, 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-    # Render
-    cv2.imshow(f"Detection", frame)
-    
+while engine.running:
+
+    job = latest.pop("job", None)
+    if job is not None:
+        frame = job.frame.img.copy()
+
+        # Write a text in the top right corner
+        cv2.putText(frame, f"{job.result.state}", (10, 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+        # Render
+        cv2.imshow(f"Detection", frame)
     
     # Exit
     if cv2.waitKey(10) & 0xFF == ord('q'):
         break
+
+# The capture thread may still be reading, release the camera after it stopped
+engine.stop()
+engine.join()
 cap.release()
+print(engine.stats())
 cv2.destroyAllWindows()
-
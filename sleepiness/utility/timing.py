@@ -0,0 +1,143 @@
+"""
+Per-stage timing of pipeline runs.
+
+Every run of a pipeline produces a `PipelineResult` holding
+the classified state, the wall time spent in each stage and
+the stage that made the decision. `PipelineMetrics` aggregates
+the results of many runs into counters and latency percentiles.
+"""
+from __future__ import annotations
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Iterator
+
+import numpy as np
+
+from sleepiness.utility.pstate import PassengerState
+
+# Stages of the pipelines in execution order
+STAGES = (
+    "decode", "empty", "face", "face_classify",
+    "eye_detect", "eye_classify", "hand"
+)
+
+class PipelineResult:
+    """
+    Outcome of a single pipeline run.
+
+    Attributes:
+        state: The classified state.
+        decided_by: Stage that set the state, or None if no
+            stage fired and the default state is returned.
+        timings: Wall time in seconds per executed stage.
+        total: Wall time of the whole run in seconds.
+        face_xxyy: Bounding box of the face, if one was detected.
+        eye_xxyy: Bounding boxes of the eyes, relative to the face.
+        hand_xxyy: Bounding boxes of the hands, relative to the hand crop.
+    """
+    def __init__(self, state: PassengerState = PassengerState.SLEEPING):
+        self.state = state
+        self.decided_by: str | None = None
+        self.timings: dict[str, float] = {}
+        self.total = 0.
+        self.face_xxyy: tuple[int, int, int, int] | None = None
+        self.eye_xxyy: list[tuple[int, int, int, int]] = []
+        self.hand_xxyy: list[tuple[int, int, int, int]] = []
+
+    def __repr__(self) -> str:
+        timings = ", ".join(f"{k}={1e3 * v:.2f}ms" for k, v in self.timings.items())
+        return (
+            f"PipelineResult(state={self.state}, decided_by={self.decided_by}, "
+            f"total={1e3 * self.total:.2f}ms, {timings})"
+        )
+
+    @contextmanager
+    def timed(self, stage: str) -> Iterator[None]:
+        """
+        Adds the wall time of the block to the stage.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[stage] = self.timings.get(stage, 0.) + elapsed
+
+    def decide(self, state: PassengerState, stage: str) -> PipelineResult:
+        """
+        Sets the state and the stage that decided it.
+        """
+        self.state = state
+        self.decided_by = stage
+        return self
+
+class PipelineMetrics:
+    """
+    Thread-safe aggregate of pipeline results.
+
+    Counts the runs, the runs reaching each stage and the
+    decisions made by each stage, and keeps the latencies
+    of the last `window` runs per stage for percentiles.
+    """
+    def __init__(self, window: int = 10_000):
+        self.window = window
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls = 0
+            self.entries: Counter[str] = Counter()
+            self.exits: Counter[str | None] = Counter()
+            self.seconds: Counter[str] = Counter()
+            self._latencies: dict[str, deque] = {}
+
+    def _samples(self, stage: str) -> deque:
+        if stage not in self._latencies:
+            self._latencies[stage] = deque(maxlen=self.window)
+        return self._latencies[stage]
+
+    def record(self, result: PipelineResult) -> None:
+        with self._lock:
+            self.calls += 1
+            self.exits[result.decided_by] += 1
+            for stage, elapsed in result.timings.items():
+                self.entries[stage] += 1
+                self.seconds[stage] += elapsed
+                self._samples(stage).append(elapsed)
+            self.seconds["total"] += result.total
+            self._samples("total").append(result.total)
+
+    def summary(self) -> dict:
+        """
+        Returns the counters and, per stage and for whole runs,
+        the number of runs, the total time and the p50/p95/p99
+        latencies in milliseconds. Exits are keyed by the
+        deciding stage, "default" if no stage fired.
+        """
+        with self._lock:
+            stages = {}
+            order = sorted(
+                self._latencies, 
+                key=lambda s: STAGES.index(s) if s in STAGES else len(STAGES) + (s == "total")
+            )
+            for stage in order:
+                samples = self._latencies[stage]
+                ms = 1e3 * np.fromiter(samples, dtype=np.float64)
+                p50, p95, p99 = np.percentile(ms, (50, 95, 99))
+                stages[stage] = {
+                    "calls": self.entries[stage] if stage != "total" else self.calls,
+                    "time_ms": 1e3 * self.seconds[stage],
+                    "p50_ms": float(p50),
+                    "p95_ms": float(p95),
+                    "p99_ms": float(p99),
+                }
+            return {
+                "calls": self.calls,
+                "exits": {
+                    stage or "default": n for stage, n in self.exits.items()
+                },
+                "stages": stages,
+            }
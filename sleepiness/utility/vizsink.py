@@ -0,0 +1,222 @@
+"""
+Background writer for pipeline visualizations.
+
+Drawing the detections, stacking the original and annotated
+image and encoding the result as JPEG takes several times
+longer than the empty-seat check. `VizSink` moves this work
+off the classification thread: frames are sampled on the
+caller's thread, queued in a bounded drop-oldest queue and
+rendered and written by a pool of writer threads
+(`cv2.imwrite` releases the GIL while encoding).
+"""
+from __future__ import annotations
+import threading
+import uuid
+from pathlib import Path
+from typing import Callable, Hashable
+
+import cv2
+import numpy as np
+
+from sleepiness.utility.engine import Closed, DropOldestQueue
+from sleepiness.utility.timing import PipelineResult
+
+def render(original_img: np.ndarray,
+           face_xxyy: tuple | None,
+           eyes_xxyy: list,
+           hands_xxyy: list,
+           text: str,
+           keep_horizontal: float = 0.5) -> np.ndarray:
+    """
+    Draws the bounding boxes of face (green), eyes (red) and
+    hands (blue) and the text on a copy of the image, and returns
+    it next to the original one. Eye boxes are relative to the
+    face, hand boxes relative to the middle `keep_horizontal`
+    part of the image.
+    """
+    # Copy the original image to avoid modifying it directly
+    img_with_boxes = original_img.copy()
+
+    # Draw face bounding box
+    if face_xxyy is not None:
+        cv2.rectangle(img_with_boxes, (face_xxyy[0], face_xxyy[2]), (face_xxyy[1], face_xxyy[3]), (0, 255, 0), 2)
+
+    # Draw bounding boxes for eyes, given relative to the face
+    for eye_xxyy in eyes_xxyy:
+        xmin = eye_xxyy[0] + face_xxyy[0]
+        xmax = eye_xxyy[1] + face_xxyy[0]
+        ymin = eye_xxyy[2] + face_xxyy[2]
+        ymax = eye_xxyy[3] + face_xxyy[2]
+        cv2.rectangle(img_with_boxes, (xmin, ymin), (xmax, ymax), (0, 0, 255), 2)
+
+    # Draw bounding boxes for hands, given relative to the hand crop
+    x_off = original_img.shape[1] * (1 - keep_horizontal) / 2
+    for xmin, xmax, ymin, ymax in hands_xxyy:
+        cv2.rectangle(
+            img_with_boxes,
+            (int(xmin + x_off), int(ymin)),
+            (int(xmax + x_off), int(ymax)),
+            (255, 0, 0),
+            2
+        )
+
+    # Write each line of text with appropriate line spacing
+    for i, line in enumerate(text.split('\n')):
+        cv2.putText(
+            img_with_boxes, line, (20, 15 + i * 20),
+            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1, cv2.LINE_AA
+        )
+
+    # Concatenate the original image and the image with bounding boxes horizontally
+    return np.hstack((original_img, img_with_boxes))
+
+class VizSink:
+    """
+    Samples visualizations and writes them in the background.
+
+    Args:
+        output_dir: Directory the images are written to.
+        every: Keep one in `every` submitted frames (per key), 0
+            for none. Defaults to every frame, or to none with
+            `on_change`.
+        on_change: Keep frames whose state differs from the last
+            submitted state of the same key. Combined with an
+            explicit `every`, a frame is kept if either applies.
+        maxsize: Capacity of the queue; when it is full, the
+            oldest pending frame is dropped.
+        workers: Number of writer threads.
+    """
+    def __init__(self,
+                 output_dir: str | Path = "full_pipeline_eval",
+                 every: int | None = None,
+                 on_change: bool = False,
+                 maxsize: int = 32,
+                 workers: int = 1):
+
+        if every is None:
+            every = 0 if on_change else 1
+        if every < 0:
+            raise ValueError("'every' must not be negative.")
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.every = every
+        self.on_change = on_change
+        self.queue = DropOldestQueue(maxsize)
+
+        self._lock = threading.Lock()
+        self._seen: dict[Hashable, int] = {}
+        self._last_label: dict[Hashable, str] = {}
+        self.submitted = 0
+        self.sampled = 0
+        self.written = 0
+        self.failed = 0
+
+        self._threads = [
+            threading.Thread(target=self._write, name=f"viz-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _sample(self, label: str, key: Hashable) -> bool:
+        with self._lock:
+            self.submitted += 1
+            n = self._seen.get(key, 0)
+            self._seen[key] = n + 1
+            changed = self._last_label.get(key) != label
+            self._last_label[key] = label
+
+            if self.on_change and changed:
+                keep = True
+            else:
+                keep = self.every > 0 and n % self.every == 0
+            self.sampled += keep
+            return keep
+
+    def submit(self,
+               img: np.ndarray | Callable[[], np.ndarray],
+               label: str,
+               face_xxyy: tuple | None = None,
+               eyes_xxyy: list = (),
+               hands_xxyy: list = (),
+               text: str = "",
+               key: Hashable = None) -> bool:
+        """
+        Queues a visualization if it is sampled. The image must not
+        be modified afterwards. Returns whether it was queued.
+
+        Args:
+            img: The original image, or a function returning it,
+                which is only called for sampled frames, on a writer thread.
+            label: Prefix of the file name, e.g. the state.
+            face_xxyy, eyes_xxyy, hands_xxyy, text: See `render`.
+            key: Frames are sampled per key, e.g. per seat.
+        """
+        if not self._sample(label, key):
+            return False
+        try:
+            self.queue.put((img, label, face_xxyy, list(eyes_xxyy), list(hands_xxyy), text))
+        except Closed:
+            return False
+        return True
+
+    def submit_result(self,
+                      img: np.ndarray | Callable[[], np.ndarray],
+                      result: PipelineResult,
+                      key: Hashable = None) -> bool:
+        """
+        Queues the visualization of a `PipelineResult`.
+        """
+        text = f"{result.state}\nDecided by: {result.decided_by or 'default'}"
+        return self.submit(
+            img, result.state.name.lower(), result.face_xxyy,
+            result.eye_xxyy, result.hand_xxyy, text, key
+        )
+
+    def _write(self) -> None:
+        while True:
+            try:
+                img, label, face_xxyy, eyes_xxyy, hands_xxyy, text = self.queue.get()
+            except Closed:
+                return
+            try:
+                if callable(img):
+                    img = img()
+                combined_img = render(img, face_xxyy, eyes_xxyy, hands_xxyy, text)
+                path = self.output_dir / f"{label}_{uuid.uuid1()}.jpg"
+                if not cv2.imwrite(str(path), combined_img):
+                    raise OSError(f"Could not write {path}.")
+                with self._lock:
+                    self.written += 1
+            except Exception:
+                with self._lock:
+                    self.failed += 1
+
+    def close(self) -> None:
+        """
+        Writes all queued visualizations and stops the writers.
+        """
+        self.queue.close()
+        for thread in self._threads:
+            thread.join()
+
+    def __enter__(self) -> VizSink:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def stats(self) -> dict:
+        """
+        Returns the number of submitted, sampled, written, failed
+        and dropped visualizations and the current queue depth.
+        """
+        with self._lock:
+            return {
+                "submitted": self.submitted,
+                "sampled": self.sampled,
+                "written": self.written,
+                "failed": self.failed,
+                "dropped": self.queue.dropped,
+                "depth": len(self.queue),
+            }